@@ -0,0 +1,77 @@
+"""
+Broadcast latency vs. connection count for ConnectionManager.broadcast_to_room.
+
+Every simulated user sits in its own room plus one shared room of ROOM_SIZE
+members, so the work per broadcast should stay flat while the number of
+connected sockets grows.
+
+Run from the project root:
+    python -m benchmarks.bench_broadcast
+"""
+import asyncio
+import time
+
+from src.core.events import ClientConnection, ConnectionManager
+
+CONNECTION_COUNTS = (1_000, 10_000, 50_000)
+ROOM_SIZE = 50
+ROUNDS = 200
+HOT_ROOM = 0
+
+
+class FakeWebSocket:
+    async def send_text(self, data: str):
+        pass
+
+    async def close(self):
+        pass
+
+
+async def build_manager(connections: int) -> ConnectionManager:
+    manager = ConnectionManager()
+    for i in range(connections):
+        username = f"user{i}"
+        connection = ClientConnection(FakeWebSocket(), username)
+        connection.start()
+        manager.active_connections[username] = connection
+        await manager.join_room(username, i + 1)
+        if i < ROOM_SIZE:
+            await manager.join_room(username, HOT_ROOM)
+    return manager
+
+
+async def legacy_broadcast(manager: ConnectionManager, chat_id: int, message: dict):
+    """The pre-index implementation: scan every user's room set."""
+    for username, rooms in manager.user_rooms.items():
+        if chat_id in rooms and username in manager.active_connections:
+            manager.active_connections[username].enqueue(message)
+
+
+async def measure(broadcast, manager: ConnectionManager) -> float:
+    message = {"type": "new_message", "message": {"content": "hi"}}
+    start = time.perf_counter()
+    for _ in range(ROUNDS):
+        await broadcast(manager, HOT_ROOM, message)
+        # Let the writer tasks drain outside the timed section
+        elapsed = time.perf_counter() - start
+        await asyncio.sleep(0)
+        start = time.perf_counter() - elapsed
+    return (time.perf_counter() - start) / ROUNDS * 1e6
+
+
+async def main():
+    print(f"room size {ROOM_SIZE}, {ROUNDS} broadcasts per run")
+    print(f"{'connections':>12} {'indexed (us)':>14} {'scan (us)':>12}")
+    for connections in CONNECTION_COUNTS:
+        manager = await build_manager(connections)
+        indexed = await measure(
+            lambda m, chat_id, msg: m.broadcast_to_room(chat_id, msg), manager
+        )
+        scan = await measure(legacy_broadcast, manager)
+        print(f"{connections:>12} {indexed:>14.1f} {scan:>12.1f}")
+        for connection in list(manager.active_connections.values()):
+            await connection.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,82 @@
+"""
+Encoding CPU for broadcast fan-out, JSON vs. MessagePack.
+
+Each broadcast goes to every member of a room. "per recipient" encodes the
+frame once for every socket (what send_json did); "once" encodes a shared
+PreparedFrame once per broadcast; "once+overlay" additionally gives one
+member a personal field. Reported as CPU milliseconds per 1,000 fan-out
+deliveries, plus the size of one frame on the wire. With the shared frame
+the cost per delivery should shrink roughly in proportion to room size.
+
+Run from the project root:
+    python -m benchmarks.bench_codecs
+"""
+import time
+from datetime import datetime
+
+from src.core.codecs import CODECS, PreparedFrame
+
+ROOM_SIZES = (10, 100, 500)
+BROADCASTS = 200
+
+
+def sample_message(i: int) -> dict:
+    return {
+        "type": "new_message",
+        "message": {
+            "id": i,
+            "seq": i,
+            "chat_id": 42,
+            "sender": "alice",
+            "content": "See you at the station at half past six, the usual platform?",
+            "message_type": "text",
+            "media_url": None,
+            "timestamp": datetime(2026, 10, 18, 12, 0, i % 60).isoformat()
+        }
+    }
+
+
+def per_recipient(codec, messages, room_size):
+    for message in messages:
+        for _ in range(room_size):
+            codec.encode(message)
+
+
+def once(codec, messages, room_size):
+    for message in messages:
+        frame = PreparedFrame(message)
+        for _ in range(room_size):
+            frame.encode(codec)
+
+
+def once_with_overlay(codec, messages, room_size):
+    for message in messages:
+        frame = PreparedFrame(message)
+        frame.personalize({"client_id": "c1"}).encode(codec)
+        for _ in range(room_size - 1):
+            frame.encode(codec)
+
+
+def cpu_ms_per_1k(run, codec, messages, room_size) -> float:
+    start = time.process_time()
+    run(codec, messages, room_size)
+    return (time.process_time() - start) * 1e3 / (len(messages) * room_size / 1_000)
+
+
+def main():
+    messages = [sample_message(i) for i in range(BROADCASTS)]
+    print(f"{BROADCASTS} broadcasts per run, CPU ms per 1k deliveries")
+    print(f"{'codec':>8} {'bytes':>6} {'room':>5} {'per recipient':>14} {'once':>8} {'once+overlay':>13}")
+    for name, codec in CODECS.items():
+        size = len(codec.encode(messages[0]))
+        for room_size in ROOM_SIZES:
+            print(
+                f"{name:>8} {size:>6} {room_size:>5}"
+                f" {cpu_ms_per_1k(per_recipient, codec, messages, room_size):>14.2f}"
+                f" {cpu_ms_per_1k(once, codec, messages, room_size):>8.3f}"
+                f" {cpu_ms_per_1k(once_with_overlay, codec, messages, room_size):>13.3f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""
+Ratio, CPU and memory of WebSocket frame compression.
+
+For a few typical frames, compares sending them as is against deflating them
+with and without context takeover (see src/core/compression.py). Each frame
+is sent ROUNDS times on one connection, so the takeover column shows what the
+shared window buys on a stream of similar frames. The memory section
+measures the resident size of many idle compressors, which is what context
+takeover costs per socket.
+
+Run from the project root:
+    python -m benchmarks.bench_compression
+"""
+import resource
+import zlib
+
+from src.core.codecs import CODECS, PreparedFrame
+from src.core.compression import CompressionStats, FrameCompressor, context_memory
+
+ROUNDS = 200
+SOCKETS = 2_000
+PROJECTED_SOCKETS = 50_000
+
+
+def history(count: int) -> list:
+    return [
+        {
+            "id": 1000 + i,
+            "seq": i,
+            "chat_id": 42,
+            "sender": "alice" if i % 3 else "bob",
+            "content": f"Message {i}: running a bit late, see you at the usual place",
+            "message_type": "text",
+            "media_url": None,
+            "timestamp": f"2026-10-18T12:{i % 60:02d}:00"
+        }
+        for i in range(count)
+    ]
+
+
+FRAMES = {
+    "typing": {"type": "typing", "username": "alice", "chat_id": 42, "is_typing": True},
+    "new_message": {"type": "new_message", "message": history(1)[0]},
+    "replay (50)": {"type": "replay", "chat_id": 42, "last_seq": 50, "messages": history(50)},
+    "replay (500)": {"type": "replay", "chat_id": 42, "last_seq": 500, "messages": history(500)},
+}
+
+
+def run(message: dict, codec, context_takeover: bool):
+    stats = CompressionStats()
+    compressor = FrameCompressor(min_bytes=0, context_takeover=context_takeover, stats=stats)
+    for _ in range(ROUNDS):
+        # A fresh frame each round, as every broadcast is
+        compressor.prepare(PreparedFrame(message), codec)
+    return stats
+
+
+def rss_bytes() -> int:
+    with open("/proc/self/statm") as statm:
+        return int(statm.read().split()[1]) * resource.getpagesize()
+
+
+def main():
+    print(f"{ROUNDS} frames per row; ratio = compressed / original, CPU in us per frame")
+    print(f"{'codec':>8} {'frame':>13} {'bytes':>7} {'ratio':>7} {'cpu':>7} {'ratio (takeover)':>17} {'cpu':>7}")
+    for name, codec in CODECS.items():
+        for label, message in FRAMES.items():
+            size = len(codec.encode(message))
+            shared = run(message, codec, False)
+            takeover = run(message, codec, True)
+            print(
+                f"{name:>8} {label:>13} {size:>7} {shared.ratio:>7.3f}"
+                f" {shared.cpu_seconds / ROUNDS * 1e6:>7.1f} {takeover.ratio:>17.3f}"
+                f" {takeover.cpu_seconds / ROUNDS * 1e6:>7.1f}"
+            )
+
+    before = rss_bytes()
+    compressors = [FrameCompressor(context_takeover=True) for _ in range(SOCKETS)]
+    # zlib allocates its buffers lazily; touch every context once
+    for compressor in compressors:
+        compressor.prepare(PreparedFrame(FRAMES["replay (50)"]), CODECS["json"])
+    per_socket = (rss_bytes() - before) / SOCKETS
+    print()
+    print(f"context takeover: {per_socket / 1024:.0f} KiB resident per socket "
+          f"(zlib estimate {context_memory() / 1024:.0f} KiB), "
+          f"~{per_socket * PROJECTED_SOCKETS / 2**30:.1f} GiB at {PROJECTED_SOCKETS:,} sockets")
+    print("no context takeover: no per-socket zlib state")
+
+
+if __name__ == "__main__":
+    main()
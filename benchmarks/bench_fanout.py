@@ -0,0 +1,105 @@
+"""
+Fan-out latency with a few huge rooms and many small ones.
+
+BIG_ROOMS announcement channels of BIG_ROOM_SIZE members each get a
+broadcast every BIG_INTERVAL seconds while SMALL_ROOMS two-person DMs send
+every SMALL_INTERVAL seconds. A DM's delay is how late its sender got to run
+plus its own fan-out, so it shows how long the big sends hold the event
+loop. "inline" delivers every room in one loop on the publishing task (the
+old behaviour); "chunked" uses the FanoutScheduler defaults. Big-room
+latency is from the scheduler's own per-room samples.
+
+Run from the project root:
+    python -m benchmarks.bench_fanout
+"""
+import asyncio
+import time
+
+from src.core.config import settings
+from src.core.events import ClientConnection, ConnectionManager
+from src.core.fanout import FanoutScheduler, percentile
+
+BIG_ROOMS = 1
+BIG_ROOM_SIZE = 10_000
+SMALL_ROOMS = 200
+BIG_INTERVAL = 0.25
+SMALL_INTERVAL = 0.02
+DURATION = 3.0
+
+
+class FakeWebSocket:
+    async def send_text(self, data: str):
+        pass
+
+    async def close(self):
+        pass
+
+
+async def build_manager(chunk_size: int) -> ConnectionManager:
+    manager = ConnectionManager(fanout=FanoutScheduler(chunk_size=chunk_size))
+    for room in range(BIG_ROOMS):
+        for i in range(BIG_ROOM_SIZE):
+            await add_member(manager, f"big{room}-{i}", room)
+    for room in range(BIG_ROOMS, BIG_ROOMS + SMALL_ROOMS):
+        for i in range(2):
+            await add_member(manager, f"dm{room}-{i}", room)
+    return manager
+
+
+async def add_member(manager: ConnectionManager, username: str, chat_id: int):
+    connection = ClientConnection(FakeWebSocket(), username)
+    connection.start()
+    manager.active_connections[username] = connection
+    await manager.join_room(username, chat_id)
+
+
+async def sender(manager: ConnectionManager, chat_id: int, interval: float, deadline: float, delays=None):
+    loop = asyncio.get_running_loop()
+    message = {"type": "new_message", "message": {"chat_id": chat_id, "content": "hi"}}
+    while loop.time() < deadline:
+        due = loop.time() + interval
+        await asyncio.sleep(interval)
+        late = loop.time() - due
+        start = time.perf_counter()
+        await manager.broadcast_to_room(chat_id, message)
+        if delays is not None:
+            delays.append(late + time.perf_counter() - start)
+
+
+async def run(chunk_size: int):
+    manager = await build_manager(chunk_size)
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + DURATION
+    delays = []
+    await asyncio.gather(
+        *(sender(manager, room, BIG_INTERVAL, deadline) for room in range(BIG_ROOMS)),
+        *(
+            sender(manager, room, SMALL_INTERVAL, deadline, delays)
+            for room in range(BIG_ROOMS, BIG_ROOMS + SMALL_ROOMS)
+        )
+    )
+    await manager.fanout.stop()
+    big = [manager.fanout.latency(room) for room in range(BIG_ROOMS)]
+    for connection in list(manager.active_connections.values()):
+        await connection.close()
+    delays.sort()
+    return delays, big
+
+
+async def main():
+    print(
+        f"{BIG_ROOMS} rooms x {BIG_ROOM_SIZE} members every {BIG_INTERVAL * 1000:.0f} ms, "
+        f"{SMALL_ROOMS} DMs every {SMALL_INTERVAL * 1000:.0f} ms, {DURATION:.0f} s"
+    )
+    print(f"{'':>8} {'DM p50 (ms)':>12} {'DM p99 (ms)':>12} {'big p50 (ms)':>13} {'big p99 (ms)':>13} {'big sends':>10}")
+    for name, chunk_size in (("inline", 10 ** 9), ("chunked", settings.FANOUT_CHUNK_SIZE)):
+        delays, big = await run(chunk_size)
+        print(
+            f"{name:>8} {percentile(delays, 0.50) * 1000:>12.2f} {percentile(delays, 0.99) * 1000:>12.2f}"
+            f" {max(b['p50'] for b in big):>13.2f} {max(b['p99'] for b in big):>13.2f}"
+            f" {sum(b['count'] for b in big):>10}"
+        )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
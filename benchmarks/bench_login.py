@@ -0,0 +1,75 @@
+"""
+Login throughput and event-loop lag: bcrypt inline vs. PasswordHasher.
+
+Fires LOGINS concurrent password checks at the configured cost factor while
+a ticker measures how late the event loop wakes up, which is what every
+WebSocket on the worker would feel during a login burst. The pooled run also
+reports how many logins were turned away with 503 at the queue timeout.
+
+Run from the project root:
+    python -m benchmarks.bench_login [logins]
+"""
+import asyncio
+import sys
+import time
+
+from fastapi import HTTPException
+
+from src.core.config import settings
+from src.core.security import PasswordHasher, get_password_hash, verify_password
+
+LOGINS = int(sys.argv[1]) if len(sys.argv) > 1 else 40
+TICK = 0.005
+
+
+async def measure_loop_lag(stop: asyncio.Event) -> float:
+    loop = asyncio.get_running_loop()
+    worst = 0.0
+    while not stop.is_set():
+        expected = loop.time() + TICK
+        await asyncio.sleep(TICK)
+        worst = max(worst, loop.time() - expected)
+    return worst
+
+
+async def run(label: str, check) -> None:
+    stop = asyncio.Event()
+    lag = asyncio.create_task(measure_loop_lag(stop))
+    await asyncio.sleep(TICK * 2)
+
+    started = time.perf_counter()
+    results = await asyncio.gather(*(check() for _ in range(LOGINS)), return_exceptions=True)
+    elapsed = time.perf_counter() - started
+    stop.set()
+    worst_lag = await lag
+
+    accepted = sum(1 for result in results if result is True)
+    rejected = sum(1 for result in results if isinstance(result, HTTPException))
+    print(
+        f"{label:>8} {accepted / elapsed:>12.1f} {worst_lag * 1000:>14.1f} "
+        f"{accepted:>9} {rejected:>9}"
+    )
+
+
+async def main():
+    hashed = get_password_hash("correct horse battery staple")
+    hasher = PasswordHasher()
+
+    async def inline():
+        return verify_password("correct horse battery staple", hashed)
+
+    async def pooled():
+        return await hasher.verify("correct horse battery staple", hashed)
+
+    print(
+        f"{LOGINS} concurrent logins, bcrypt rounds={settings.PASSWORD_BCRYPT_ROUNDS}, "
+        f"workers={settings.PASSWORD_HASH_WORKERS}, queue timeout={settings.PASSWORD_HASH_QUEUE_TIMEOUT}s"
+    )
+    print(f"{'mode':>8} {'logins/s':>12} {'max lag (ms)':>14} {'accepted':>9} {'rejected':>9}")
+    await run("inline", inline)
+    await run("pool", pooled)
+    hasher.shutdown()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
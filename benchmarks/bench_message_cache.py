@@ -0,0 +1,131 @@
+"""
+Database reads for first-page history loads with and without the recent-message cache.
+
+Seeds a throwaway SQLite database with CHAT_COUNT chats, then replays the
+same skewed workload twice: first-page loads (ChatService.get_messages_page
+without a cursor) mixed with sends, the chat drawn from a Zipf-like
+distribution so a few chats take most of the traffic. The first pass clears
+recent_messages before every operation, the second lets it work; both count
+the statements that read the messages table.
+
+Run from the project root:
+    python -m benchmarks.bench_message_cache [chat_count] [operations]
+"""
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine, event, insert
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from src.core.cache import recent_messages
+from src.db.base import Base, to_async_url
+from src.models.associations import chat_users
+from src.models.user import User
+from src.models.chat import Chat
+from src.models.chat_summary import ChatSummary
+from src.models.message import Message, MessageType
+from src.models.call import Call
+from src.services.chat import ChatService
+
+CHAT_COUNT = int(sys.argv[1]) if len(sys.argv) > 1 else 2_000
+OPERATIONS = int(sys.argv[2]) if len(sys.argv) > 2 else 20_000
+MESSAGES_PER_CHAT = 60
+PAGE_SIZE = 50
+SEND_RATIO = 0.1
+ZIPF_EXPONENT = 1.1
+
+
+def seed(session_factory):
+    db = session_factory()
+    db.add(User(username="reader", email="reader@example.com", full_name="Reader", hashed_password="x"))
+    chats = [Chat(name=f"chat {i}", is_group=True, last_seq=MESSAGES_PER_CHAT) for i in range(CHAT_COUNT)]
+    db.add_all(chats)
+    db.flush()
+    chat_ids = [chat.id for chat in chats]
+    db.execute(insert(chat_users), [{"username": "reader", "chat_id": chat_id} for chat_id in chat_ids])
+    start = datetime(2024, 1, 1)
+    db.execute(insert(Message), [
+        {
+            "chat_id": chat_id,
+            "seq": seq,
+            "sender_user": "reader",
+            "content": f"message {seq}",
+            "message_type": MessageType.TEXT,
+            "created_at": start + timedelta(seconds=seq)
+        }
+        for chat_id in chat_ids
+        for seq in range(1, MESSAGES_PER_CHAT + 1)
+    ])
+    db.commit()
+    db.close()
+    return chat_ids
+
+
+def workload(chat_ids):
+    rng = random.Random(42)
+    weights = [1 / (rank + 1) ** ZIPF_EXPONENT for rank in range(len(chat_ids))]
+    picks = rng.choices(chat_ids, weights=weights, k=OPERATIONS)
+    return [(chat_id, rng.random() < SEND_RATIO) for chat_id in picks]
+
+
+async def replay(service, operations, cached):
+    statements = []
+    engine = service.db.bind.sync_engine
+    listener = lambda *args: statements.append(args[2])
+    event.listen(engine, "before_cursor_execute", listener)
+    loads = 0
+    started = time.perf_counter()
+    try:
+        for chat_id, send in operations:
+            if not cached:
+                recent_messages.clear()
+            if send:
+                await service.send_message(chat_id, "hi", "reader")
+            else:
+                await service.get_messages_page(chat_id, "reader", limit=PAGE_SIZE)
+                loads += 1
+    finally:
+        event.remove(engine, "before_cursor_execute", listener)
+    elapsed = time.perf_counter() - started
+    reads = sum(
+        1 for statement in statements
+        if statement.lstrip().upper().startswith("SELECT") and "FROM messages" in statement
+    )
+    return loads, reads, elapsed
+
+
+async def main():
+    directory = tempfile.mkdtemp()
+    url = f"sqlite:///{os.path.join(directory, 'bench.db')}"
+    engine = create_engine(url)
+    Base.metadata.create_all(engine)
+
+    started = time.perf_counter()
+    chat_ids = seed(sessionmaker(bind=engine))
+    print(f"seeded {CHAT_COUNT} chats x {MESSAGES_PER_CHAT} messages in {time.perf_counter() - started:.1f}s")
+    operations = workload(chat_ids)
+
+    async_engine = create_async_engine(to_async_url(url))
+    db = async_sessionmaker(bind=async_engine, expire_on_commit=False)()
+    service = ChatService(db)
+
+    print(f"{'cache':>6} {'page loads':>11} {'message reads':>14} {'db hit ratio':>13} {'time (s)':>9}")
+    for cached in (False, True):
+        recent_messages.clear()
+        recent_messages.hits = recent_messages.misses = 0
+        loads, reads, elapsed = await replay(service, operations, cached)
+        print(f"{'on' if cached else 'off':>6} {loads:>11} {reads:>14} {reads / loads:>13.3f} {elapsed:>9.2f}")
+    print(f"cache after the second pass: {recent_messages.stats()}")
+
+    await db.close()
+    await async_engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,107 @@
+"""
+Per-page latency of keyset vs. offset pagination over one large chat.
+
+Seeds a throwaway SQLite database with MESSAGE_COUNT messages in a single
+chat, then walks history page by page with ChatService.get_messages_page
+(keyset cursor) and samples ChatService.get_messages (offset) at the same
+depths.
+
+Run from the project root:
+    python -m benchmarks.bench_message_pagination [message_count]
+"""
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine, insert
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from src.db.base import Base, to_async_url
+from src.models.associations import chat_users
+from src.models.user import User
+from src.models.chat import Chat
+from src.models.chat_summary import ChatSummary
+from src.models.message import Message, MessageType
+from src.models.call import Call
+from src.services.chat import ChatService
+
+MESSAGE_COUNT = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+PAGE_SIZE = 50
+SAMPLES = 10
+INSERT_CHUNK = 50_000
+
+
+def seed(session_factory):
+    db = session_factory()
+    db.add(User(username="reader", email="reader@example.com", full_name="Reader", hashed_password="x"))
+    chat = Chat(name="history", is_group=True)
+    db.add(chat)
+    db.flush()
+    db.execute(insert(chat_users), [{"username": "reader", "chat_id": chat.id}])
+    start = datetime(2024, 1, 1)
+    for offset in range(0, MESSAGE_COUNT, INSERT_CHUNK):
+        db.execute(insert(Message), [
+            {
+                "chat_id": chat.id,
+                "sender_user": "reader",
+                "content": f"message {i}",
+                "message_type": MessageType.TEXT,
+                # Several messages per timestamp to exercise the id tie-breaker
+                "created_at": start + timedelta(seconds=i // 4)
+            }
+            for i in range(offset, min(offset + INSERT_CHUNK, MESSAGE_COUNT))
+        ])
+    db.commit()
+    chat_id = chat.id
+    db.close()
+    return chat_id
+
+
+async def main():
+    directory = tempfile.mkdtemp()
+    url = f"sqlite:///{os.path.join(directory, 'bench.db')}"
+    engine = create_engine(url)
+    Base.metadata.create_all(engine)
+    session_factory = sessionmaker(bind=engine)
+
+    started = time.perf_counter()
+    chat_id = seed(session_factory)
+    print(f"seeded {MESSAGE_COUNT} messages in {time.perf_counter() - started:.1f}s")
+
+    async_engine = create_async_engine(to_async_url(url))
+    db = async_sessionmaker(bind=async_engine, expire_on_commit=False)()
+    service = ChatService(db)
+    total_pages = MESSAGE_COUNT // PAGE_SIZE
+    sample_every = max(total_pages // SAMPLES, 1)
+
+    print(f"{'page':>8} {'depth':>10} {'keyset (ms)':>12} {'offset (ms)':>12}")
+    cursor = None
+    walk_started = time.perf_counter()
+    for page_number in range(total_pages):
+        started = time.perf_counter()
+        page = await service.get_messages_page(chat_id, "reader", cursor=cursor, limit=PAGE_SIZE)
+        keyset_ms = (time.perf_counter() - started) * 1000
+        cursor = page.next_cursor
+
+        if page_number % sample_every == 0 or cursor is None:
+            started = time.perf_counter()
+            await service.get_messages(
+                chat_id, "reader", skip=page_number * PAGE_SIZE, limit=PAGE_SIZE
+            )
+            offset_ms = (time.perf_counter() - started) * 1000
+            print(f"{page_number:>8} {page_number * PAGE_SIZE:>10} {keyset_ms:>12.2f} {offset_ms:>12.2f}")
+        if cursor is None:
+            break
+
+    elapsed = time.perf_counter() - walk_started
+    print(f"walked {page_number + 1} keyset pages in {elapsed:.1f}s")
+    await db.close()
+    await async_engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,34 @@
+"""message keyset index
+
+Revision ID: 5d0b9e4c7a21
+Revises: 613960057ce5
+Create Date: 2026-10-18 04:48:57.402118+00:00
+
+messages(chat_id, created_at, id) for the keyset cursor of history pages.
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = "5d0b9e4c7a21"
+down_revision: Union[str, None] = "613960057ce5"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    with op.batch_alter_table("messages", schema=None) as batch_op:
+        batch_op.create_index(
+            "ix_messages_chat_created_id",
+            ["chat_id", "created_at", "id"],
+            unique=False,
+        )
+
+
+def downgrade() -> None:
+    with op.batch_alter_table("messages", schema=None) as batch_op:
+        batch_op.drop_index("ix_messages_chat_created_id")
@@ -0,0 +1,186 @@
+"""initial schema
+
+Revision ID: 613960057ce5
+Revises:
+Create Date: 2026-10-18 04:48:52.271943+00:00
+
+The schema the application used to build with Base.metadata.create_all.
+Databases created that way are stamped with this revision on startup.
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = "613960057ce5"
+down_revision: Union[str, None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "users",
+        sa.Column("username", sa.String(), nullable=False),
+        sa.Column("email", sa.String(), nullable=False),
+        sa.Column("full_name", sa.String(), nullable=False),
+        sa.Column("hashed_password", sa.String(), nullable=False),
+        sa.Column("avatar", sa.String(), nullable=True),
+        sa.Column("is_active", sa.Boolean(), nullable=True),
+        sa.Column("is_verified", sa.Boolean(), nullable=True),
+        sa.Column("is_online", sa.Boolean(), nullable=True),
+        sa.Column("last_seen", sa.DateTime(), nullable=True),
+        sa.Column("created_at", sa.DateTime(), nullable=True),
+        sa.Column("updated_at", sa.DateTime(), nullable=True),
+        sa.Column("socket_id", sa.String(), nullable=True),
+        sa.Column("peer_id", sa.String(), nullable=True),
+        sa.PrimaryKeyConstraint("username"),
+    )
+    with op.batch_alter_table("users", schema=None) as batch_op:
+        batch_op.create_index(
+            batch_op.f("ix_users_email"), ["email"], unique=True
+        )
+        batch_op.create_index(
+            batch_op.f("ix_users_username"), ["username"], unique=False
+        )
+
+    op.create_table(
+        "chats",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("name", sa.String(), nullable=True),
+        sa.Column("admin_user", sa.String(), nullable=True),
+        sa.Column("created_at", sa.DateTime(), nullable=True),
+        sa.Column("updated_at", sa.DateTime(), nullable=True),
+        sa.Column("is_group", sa.Boolean(), nullable=True),
+        sa.Column("group_avatar", sa.String(), nullable=True),
+        sa.Column("description", sa.String(), nullable=True),
+        sa.ForeignKeyConstraint(
+            ["admin_user"],
+            ["users.username"],
+        ),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    with op.batch_alter_table("chats", schema=None) as batch_op:
+        batch_op.create_index(batch_op.f("ix_chats_id"), ["id"], unique=False)
+
+    op.create_table(
+        "calls",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column(
+            "call_type",
+            sa.Enum("VOICE", "VIDEO", name="calltype"),
+            nullable=True,
+        ),
+        sa.Column(
+            "status",
+            sa.Enum(
+                "RINGING",
+                "ONGOING",
+                "ENDED",
+                "MISSED",
+                "REJECTED",
+                name="callstatus",
+            ),
+            nullable=True,
+        ),
+        sa.Column("started_at", sa.DateTime(), nullable=True),
+        sa.Column("ended_at", sa.DateTime(), nullable=True),
+        sa.Column("duration", sa.Integer(), nullable=True),
+        sa.Column("caller_user", sa.String(), nullable=True),
+        sa.Column("receiver_user", sa.String(), nullable=True),
+        sa.Column("chat_id", sa.Integer(), nullable=True),
+        sa.ForeignKeyConstraint(
+            ["caller_user"],
+            ["users.username"],
+        ),
+        sa.ForeignKeyConstraint(
+            ["chat_id"],
+            ["chats.id"],
+        ),
+        sa.ForeignKeyConstraint(
+            ["receiver_user"],
+            ["users.username"],
+        ),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    with op.batch_alter_table("calls", schema=None) as batch_op:
+        batch_op.create_index(batch_op.f("ix_calls_id"), ["id"], unique=False)
+
+    op.create_table(
+        "chat_users",
+        sa.Column("username", sa.String(), nullable=False),
+        sa.Column("chat_id", sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(
+            ["chat_id"],
+            ["chats.id"],
+        ),
+        sa.ForeignKeyConstraint(
+            ["username"],
+            ["users.username"],
+        ),
+        sa.PrimaryKeyConstraint("username", "chat_id"),
+    )
+    op.create_table(
+        "messages",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("content", sa.String(), nullable=True),
+        sa.Column(
+            "message_type",
+            sa.Enum(
+                "TEXT",
+                "IMAGE",
+                "VIDEO",
+                "AUDIO",
+                "FILE",
+                "VOICE_NOTE",
+                name="messagetype",
+            ),
+            nullable=True,
+        ),
+        sa.Column("media_url", sa.String(), nullable=True),
+        sa.Column("media_thumbnail", sa.String(), nullable=True),
+        sa.Column("media_duration", sa.Integer(), nullable=True),
+        sa.Column("media_size", sa.Integer(), nullable=True),
+        sa.Column("created_at", sa.DateTime(), nullable=True),
+        sa.Column("delivered_at", sa.DateTime(), nullable=True),
+        sa.Column("read_at", sa.DateTime(), nullable=True),
+        sa.Column("chat_id", sa.Integer(), nullable=True),
+        sa.Column("sender_user", sa.String(), nullable=True),
+        sa.ForeignKeyConstraint(
+            ["chat_id"],
+            ["chats.id"],
+        ),
+        sa.ForeignKeyConstraint(
+            ["sender_user"],
+            ["users.username"],
+        ),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    with op.batch_alter_table("messages", schema=None) as batch_op:
+        batch_op.create_index(
+            batch_op.f("ix_messages_id"), ["id"], unique=False
+        )
+
+
+def downgrade() -> None:
+    with op.batch_alter_table("messages", schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f("ix_messages_id"))
+
+    op.drop_table("messages")
+    op.drop_table("chat_users")
+    with op.batch_alter_table("calls", schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f("ix_calls_id"))
+
+    op.drop_table("calls")
+    with op.batch_alter_table("chats", schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f("ix_chats_id"))
+
+    op.drop_table("chats")
+    with op.batch_alter_table("users", schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f("ix_users_username"))
+        batch_op.drop_index(batch_op.f("ix_users_email"))
+
+    op.drop_table("users")
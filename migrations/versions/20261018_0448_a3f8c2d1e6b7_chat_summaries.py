@@ -0,0 +1,93 @@
+"""chat summaries
+
+Revision ID: a3f8c2d1e6b7
+Revises: 5d0b9e4c7a21
+Create Date: 2026-10-18 04:48:59.716530+00:00
+
+Per-member inbox rows, filled the way ChatSummaryService.rebuild did when
+the table was introduced: the chat's latest message by (created_at, id) and
+the count of unread messages from other members.
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = "a3f8c2d1e6b7"
+down_revision: Union[str, None] = "5d0b9e4c7a21"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "chat_summaries",
+        sa.Column("chat_id", sa.Integer(), nullable=False),
+        sa.Column("username", sa.String(), nullable=False),
+        sa.Column("last_message_id", sa.Integer(), nullable=True),
+        sa.Column("last_message_preview", sa.String(), nullable=True),
+        sa.Column("last_message_sender", sa.String(), nullable=True),
+        sa.Column("last_activity_at", sa.DateTime(), nullable=False),
+        sa.Column("unread_count", sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(
+            ["chat_id"],
+            ["chats.id"],
+        ),
+        sa.ForeignKeyConstraint(
+            ["last_message_id"],
+            ["messages.id"],
+        ),
+        sa.ForeignKeyConstraint(
+            ["username"],
+            ["users.username"],
+        ),
+        sa.PrimaryKeyConstraint("chat_id", "username"),
+    )
+    with op.batch_alter_table("chat_summaries", schema=None) as batch_op:
+        batch_op.create_index(
+            "ix_chat_summaries_username_activity",
+            ["username", "last_activity_at"],
+            unique=False,
+        )
+
+    op.execute(
+        """
+        INSERT INTO chat_summaries (
+            chat_id, username, last_message_id, last_message_preview,
+            last_message_sender, last_activity_at, unread_count
+        )
+        SELECT
+            chat_users.chat_id,
+            chat_users.username,
+            last.id,
+            SUBSTR(last.content, 1, 100),
+            last.sender_user,
+            COALESCE(last.created_at, chats.created_at, CURRENT_TIMESTAMP),
+            (
+                SELECT COUNT(*) FROM messages
+                WHERE messages.chat_id = chat_users.chat_id
+                AND messages.sender_user != chat_users.username
+                AND messages.read_at IS NULL
+            )
+        FROM chat_users
+        JOIN chats ON chats.id = chat_users.chat_id
+        LEFT JOIN (
+            SELECT
+                id, chat_id, content, sender_user, created_at,
+                ROW_NUMBER() OVER (
+                    PARTITION BY chat_id ORDER BY created_at DESC, id DESC
+                ) AS position
+            FROM messages
+        ) AS last ON last.chat_id = chat_users.chat_id AND last.position = 1
+        """
+    )
+
+
+def downgrade() -> None:
+    with op.batch_alter_table("chat_summaries", schema=None) as batch_op:
+        batch_op.drop_index("ix_chat_summaries_username_activity")
+
+    op.drop_table("chat_summaries")
@@ -0,0 +1,74 @@
+"""hot query indexes
+
+Revision ID: 16e02e9c838a
+Revises: a3f8c2d1e6b7
+Create Date: 2026-10-18 04:49:08.014751+00:00
+
+Indexes for the predicates used by the queries in src/services:
+- chat_users(chat_id): members of a chat (the PK only serves username lookups)
+- messages(chat_id, sender_user) WHERE read_at IS NULL: unread recounts
+- messages(sender_user): messages by user
+- calls(caller_user), calls(receiver_user), calls(chat_id): call history
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = "16e02e9c838a"
+down_revision: Union[str, None] = "a3f8c2d1e6b7"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    with op.batch_alter_table("calls", schema=None) as batch_op:
+        batch_op.create_index(
+            batch_op.f("ix_calls_caller_user"), ["caller_user"], unique=False
+        )
+        batch_op.create_index(
+            batch_op.f("ix_calls_chat_id"), ["chat_id"], unique=False
+        )
+        batch_op.create_index(
+            batch_op.f("ix_calls_receiver_user"),
+            ["receiver_user"],
+            unique=False,
+        )
+
+    with op.batch_alter_table("chat_users", schema=None) as batch_op:
+        batch_op.create_index(
+            "ix_chat_users_chat_id", ["chat_id"], unique=False
+        )
+
+    with op.batch_alter_table("messages", schema=None) as batch_op:
+        batch_op.create_index(
+            "ix_messages_chat_unread",
+            ["chat_id", "sender_user"],
+            unique=False,
+            postgresql_where=sa.text("read_at IS NULL"),
+            sqlite_where=sa.text("read_at IS NULL"),
+        )
+        batch_op.create_index(
+            "ix_messages_sender_user", ["sender_user"], unique=False
+        )
+
+
+def downgrade() -> None:
+    with op.batch_alter_table("messages", schema=None) as batch_op:
+        batch_op.drop_index("ix_messages_sender_user")
+        batch_op.drop_index(
+            "ix_messages_chat_unread",
+            postgresql_where=sa.text("read_at IS NULL"),
+            sqlite_where=sa.text("read_at IS NULL"),
+        )
+
+    with op.batch_alter_table("chat_users", schema=None) as batch_op:
+        batch_op.drop_index("ix_chat_users_chat_id")
+
+    with op.batch_alter_table("calls", schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f("ix_calls_receiver_user"))
+        batch_op.drop_index(batch_op.f("ix_calls_chat_id"))
+        batch_op.drop_index(batch_op.f("ix_calls_caller_user"))
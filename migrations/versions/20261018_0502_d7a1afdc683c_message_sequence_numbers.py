@@ -0,0 +1,69 @@
+"""message sequence numbers
+
+Revision ID: d7a1afdc683c
+Revises: 16e02e9c838a
+Create Date: 2026-10-18 05:02:33.648056+00:00
+
+Per-chat message sequence numbers for WebSocket resume. Existing messages
+are numbered in (created_at, id) order and chats.last_seq is set to the
+highest number in each chat.
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = "d7a1afdc683c"
+down_revision: Union[str, None] = "16e02e9c838a"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    with op.batch_alter_table("chats", schema=None) as batch_op:
+        batch_op.add_column(
+            sa.Column(
+                "last_seq", sa.Integer(), server_default="0", nullable=False
+            )
+        )
+
+    with op.batch_alter_table("messages", schema=None) as batch_op:
+        batch_op.add_column(sa.Column("seq", sa.Integer(), nullable=True))
+
+    op.execute(
+        """
+        UPDATE messages SET seq = (
+            SELECT ranked.seq FROM (
+                SELECT id, row_number() OVER (
+                    PARTITION BY chat_id ORDER BY created_at, id
+                ) AS seq
+                FROM messages
+            ) AS ranked
+            WHERE ranked.id = messages.id
+        )
+        """
+    )
+    op.execute(
+        """
+        UPDATE chats SET last_seq = COALESCE(
+            (SELECT MAX(seq) FROM messages WHERE messages.chat_id = chats.id), 0
+        )
+        """
+    )
+
+    with op.batch_alter_table("messages", schema=None) as batch_op:
+        batch_op.create_index(
+            "ix_messages_chat_seq", ["chat_id", "seq"], unique=True
+        )
+
+
+def downgrade() -> None:
+    with op.batch_alter_table("messages", schema=None) as batch_op:
+        batch_op.drop_index("ix_messages_chat_seq")
+        batch_op.drop_column("seq")
+
+    with op.batch_alter_table("chats", schema=None) as batch_op:
+        batch_op.drop_column("last_seq")
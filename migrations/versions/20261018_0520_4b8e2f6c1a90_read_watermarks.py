@@ -0,0 +1,95 @@
+"""read watermarks
+
+Revision ID: 4b8e2f6c1a90
+Revises: d7a1afdc683c
+Create Date: 2026-10-18 05:20:41.118203+00:00
+
+Read state moves from messages.read_at to a per-member watermark,
+chat_summaries.last_read_seq. Each member's watermark starts just below
+the first message from someone else they had not read (or at the chat's
+last_seq if they had read everything); unread_count, which the watermark
+replaces, is dropped along with the partial index that served its recounts.
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = "4b8e2f6c1a90"
+down_revision: Union[str, None] = "d7a1afdc683c"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    with op.batch_alter_table("chat_summaries", schema=None) as batch_op:
+        batch_op.add_column(
+            sa.Column(
+                "last_read_seq",
+                sa.Integer(),
+                server_default="0",
+                nullable=False,
+            )
+        )
+
+    op.execute(
+        """
+        UPDATE chat_summaries SET last_read_seq = COALESCE(
+            (
+                SELECT MIN(messages.seq) - 1 FROM messages
+                WHERE messages.chat_id = chat_summaries.chat_id
+                AND messages.sender_user != chat_summaries.username
+                AND messages.read_at IS NULL
+            ),
+            (SELECT last_seq FROM chats WHERE chats.id = chat_summaries.chat_id)
+        )
+        """
+    )
+
+    with op.batch_alter_table("chat_summaries", schema=None) as batch_op:
+        batch_op.drop_column("unread_count")
+
+    with op.batch_alter_table("messages", schema=None) as batch_op:
+        batch_op.drop_index(
+            "ix_messages_chat_unread",
+            postgresql_where=sa.text("read_at IS NULL"),
+            sqlite_where=sa.text("read_at IS NULL"),
+        )
+
+
+def downgrade() -> None:
+    with op.batch_alter_table("messages", schema=None) as batch_op:
+        batch_op.create_index(
+            "ix_messages_chat_unread",
+            ["chat_id", "sender_user"],
+            unique=False,
+            postgresql_where=sa.text("read_at IS NULL"),
+            sqlite_where=sa.text("read_at IS NULL"),
+        )
+
+    with op.batch_alter_table("chat_summaries", schema=None) as batch_op:
+        batch_op.add_column(
+            sa.Column(
+                "unread_count",
+                sa.Integer(),
+                server_default="0",
+                nullable=False,
+            )
+        )
+
+    op.execute(
+        """
+        UPDATE chat_summaries SET unread_count = (
+            SELECT COUNT(*) FROM messages
+            WHERE messages.chat_id = chat_summaries.chat_id
+            AND messages.sender_user != chat_summaries.username
+            AND messages.seq > chat_summaries.last_read_seq
+        )
+        """
+    )
+
+    with op.batch_alter_table("chat_summaries", schema=None) as batch_op:
+        batch_op.drop_column("last_read_seq")
@@ -0,0 +1,43 @@
+"""pending deliveries
+
+Revision ID: 9c3d5e7a2b14
+Revises: 4b8e2f6c1a90
+Create Date: 2026-10-18 05:35:12.604417+00:00
+
+Per-member queue of messages stored while the member was offline, as
+(username, message_id) pairs; it is emptied into one frame when they
+next connect.
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = "9c3d5e7a2b14"
+down_revision: Union[str, None] = "4b8e2f6c1a90"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "pending_deliveries",
+        sa.Column("username", sa.String(), nullable=False),
+        sa.Column("message_id", sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(
+            ["message_id"],
+            ["messages.id"],
+        ),
+        sa.ForeignKeyConstraint(
+            ["username"],
+            ["users.username"],
+        ),
+        sa.PrimaryKeyConstraint("username", "message_id"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("pending_deliveries")
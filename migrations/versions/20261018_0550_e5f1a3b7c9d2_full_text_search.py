@@ -0,0 +1,104 @@
+"""full text search
+
+Revision ID: e5f1a3b7c9d2
+Revises: 9c3d5e7a2b14
+Create Date: 2026-10-18 05:50:27.331904+00:00
+
+FTS5 indexes over messages.content (messages_fts) and chats.name /
+description (chats_fts), kept in sync by triggers and filled from the
+existing rows. SQLite only; other databases get their own search backend.
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "e5f1a3b7c9d2"
+down_revision: Union[str, None] = "9c3d5e7a2b14"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+TOKENIZER = "unicode61 remove_diacritics 2"
+
+
+def upgrade() -> None:
+    if op.get_bind().dialect.name != "sqlite":
+        return
+
+    op.execute(
+        f"""
+        CREATE VIRTUAL TABLE messages_fts USING fts5(
+            content, content='messages', content_rowid='id',
+            tokenize='{TOKENIZER}', prefix='2 3'
+        )
+        """
+    )
+    op.execute(
+        """
+        CREATE TRIGGER messages_fts_insert AFTER INSERT ON messages BEGIN
+            INSERT INTO messages_fts(rowid, content) VALUES (new.id, new.content);
+        END
+        """
+    )
+    op.execute(
+        """
+        CREATE TRIGGER messages_fts_delete AFTER DELETE ON messages BEGIN
+            INSERT INTO messages_fts(messages_fts, rowid, content) VALUES ('delete', old.id, old.content);
+        END
+        """
+    )
+    op.execute(
+        """
+        CREATE TRIGGER messages_fts_update AFTER UPDATE OF content ON messages BEGIN
+            INSERT INTO messages_fts(messages_fts, rowid, content) VALUES ('delete', old.id, old.content);
+            INSERT INTO messages_fts(rowid, content) VALUES (new.id, new.content);
+        END
+        """
+    )
+    op.execute("INSERT INTO messages_fts(messages_fts) VALUES ('rebuild')")
+
+    op.execute(
+        f"""
+        CREATE VIRTUAL TABLE chats_fts USING fts5(
+            name, description, content='chats', content_rowid='id',
+            tokenize='{TOKENIZER}', prefix='2 3'
+        )
+        """
+    )
+    op.execute(
+        """
+        CREATE TRIGGER chats_fts_insert AFTER INSERT ON chats BEGIN
+            INSERT INTO chats_fts(rowid, name, description) VALUES (new.id, new.name, new.description);
+        END
+        """
+    )
+    op.execute(
+        """
+        CREATE TRIGGER chats_fts_delete AFTER DELETE ON chats BEGIN
+            INSERT INTO chats_fts(chats_fts, rowid, name, description)
+            VALUES ('delete', old.id, old.name, old.description);
+        END
+        """
+    )
+    op.execute(
+        """
+        CREATE TRIGGER chats_fts_update AFTER UPDATE OF name, description ON chats BEGIN
+            INSERT INTO chats_fts(chats_fts, rowid, name, description)
+            VALUES ('delete', old.id, old.name, old.description);
+            INSERT INTO chats_fts(rowid, name, description) VALUES (new.id, new.name, new.description);
+        END
+        """
+    )
+    op.execute("INSERT INTO chats_fts(chats_fts) VALUES ('rebuild')")
+
+
+def downgrade() -> None:
+    if op.get_bind().dialect.name != "sqlite":
+        return
+
+    for name in ("chats", "messages"):
+        for action in ("update", "delete", "insert"):
+            op.execute(f"DROP TRIGGER IF EXISTS {name}_fts_{action}")
+        op.execute(f"DROP TABLE IF EXISTS {name}_fts")
@@ -1,40 +1,48 @@
-from typing import Generator
+import math
+from typing import AsyncGenerator
 from datetime import datetime
 from fastapi import Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from jose import jwt, JWTError
+from ..core.cache import CachedUser, token_cache
+from ..core.ratelimit import rate_limiter
 from ..core.security import oauth2_scheme
-from ..db.base import SessionLocal
+from ..db.base import AsyncSessionLocal
 from ..models.user import User
 from ..core.config import settings
 
-def get_db() -> Generator:
+async def get_async_db() -> AsyncGenerator[AsyncSession, None]:
     """
-    Creates and yields a database session. Ensures proper closure after usage.
+    Creates and yields an async database session. Ensures proper closure after usage.
     """
-    db = SessionLocal()
-    try:
+    async with AsyncSessionLocal() as db:
         yield db
-    finally:
-        db.close()
 
 async def get_current_user(
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     token: str = Depends(oauth2_scheme)
-) -> User:
+) -> CachedUser:
     """
     Validates JWT token and returns current user.
+
+    Tokens seen recently are answered from token_cache without decoding
+    or touching the database.
     
     Args:
-        db: Database session
+        db: Async database session
         token: JWT token from request
         
     Returns:
-        User: Current authenticated user
+        CachedUser: Snapshot of the current authenticated user
         
     Raises:
         HTTPException: If token is invalid or user not found
     """
+    cached = token_cache.get(token)
+    if cached is not None:
+        return cached
+
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Invalid authentication credentials",
@@ -65,7 +73,7 @@ async def get_current_user(
     except JWTError:
         raise credentials_exception
         
-    user = db.query(User).filter(User.username == username).first()
+    user = await db.scalar(select(User).where(User.username == username))
     
     if user is None:
         raise HTTPException(
@@ -78,5 +86,24 @@ async def get_current_user(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="User is inactive"
         )
-        
-    return user
\ No newline at end of file
+
+    snapshot = CachedUser.from_model(user)
+    token_cache.set(token, snapshot, expires_at=expiration)
+    return snapshot
+
+def rate_limited_user(scope: str):
+    """
+    Dependency factory: the current user, once their scope quota allows the request.
+
+    Over-quota requests get 429 with a Retry-After header.
+    """
+    async def dependency(current_user: CachedUser = Depends(get_current_user)) -> CachedUser:
+        retry_after = rate_limiter.check(scope, current_user.username)
+        if retry_after is not None:
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail="Rate limit exceeded",
+                headers={"Retry-After": str(math.ceil(retry_after))}
+            )
+        return current_user
+    return dependency
@@ -1,23 +1,23 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordRequestForm
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 import logging
 
 from ...core.security import Token
 from ...services.auth import AuthService
 from ...schemas.user import UserCreate, User
-from ...api.dependencies import get_db, get_current_user  # Added import
+from ...api.dependencies import get_async_db, get_current_user  # Added import
 
 router = APIRouter(prefix="/auth", tags=["auth"])
 
 @router.post("/register", response_model=User)
-async def register(user_data: UserCreate, db: Session = Depends(get_db)):
+async def register(user_data: UserCreate, db: AsyncSession = Depends(get_async_db)):
     return await AuthService.create_user(db, user_data)
 
 @router.post("/login", response_model=Token)
 async def login(
     form_data: OAuth2PasswordRequestForm = Depends(),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     try:
         # Using form_data.username field for email since OAuth2PasswordRequestForm 
@@ -47,7 +47,7 @@ async def login(
 @router.post("/refresh-token", response_model=Token)
 async def refresh_token(
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     access_token = await AuthService.create_access_token_for_user(current_user)
     return Token(access_token=access_token, token_type="bearer")
\ No newline at end of file
@@ -1,18 +1,20 @@
 from fastapi import APIRouter, Depends, HTTPException, Query, Path
-from sqlalchemy.orm import Session
-from typing import Optional
-from ..dependencies import get_db, get_current_user
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Literal, Optional
+from ..dependencies import get_async_db, get_current_user, rate_limited_user
 from ...models.chat import Chat
 from ...services.chat import ChatService
 from ...schemas.chat import ChatResponse, ChatCreate, ChatUpdate
+from ...schemas.message import MessagePage, MessageSearchPage
+from ..websockets.chat import chat_ws
 
 router = APIRouter(prefix="/chats", tags=["chat"])
 
 @router.post("/", response_model=ChatResponse, status_code=201)
-def create_chat(
+async def create_chat(
     chat: ChatCreate, 
-    current_user = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user = Depends(rate_limited_user("rest_write")),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Create a new chat.
@@ -23,17 +25,19 @@ def create_chat(
     """
     try:
         chat_service = ChatService(db)
-        return chat_service.create_chat(
+        created = await chat_service.create_chat(
             chat_data=chat,
             created_by=current_user.username
         )
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
+    await chat_ws.membership_changed(created.id, added=created.members)
+    return created
 
 @router.get("/", response_model=list[ChatResponse])
-def get_chats(
+async def get_chats(
     current_user = Depends(get_current_user),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     limit: int = Query(20, ge=1, le=100),
     search: Optional[str] = None,
     is_group: Optional[bool] = None,
@@ -44,13 +48,13 @@ def get_chats(
 
     Parameters:
     - limit: Maximum number of chats to return
-    - search: Search chats by name
+    - search: Words to find in chat names and descriptions (the last one may be a prefix)
     - is_group: Filter by group/direct chats
     - unread_only: Show only chats with unread messages
     """
     try:
         chat_service = ChatService(db)
-        return chat_service.get_user_chats(
+        return await chat_service.get_user_chats(
             username=current_user.username,
             limit=limit,
             search=search,
@@ -60,27 +64,82 @@ def get_chats(
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
+@router.get("/search/messages", response_model=MessageSearchPage)
+async def search_messages(
+    q: str = Query(..., min_length=1, max_length=200),
+    chat_id: Optional[int] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(20, ge=1, le=100),
+    current_user = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Full-text search over messages in the user's chats, best match first.
+
+    Parameters:
+    - q: Words that must all appear (the last one may be a prefix)
+    - chat_id: Only search this chat
+    - cursor: next_cursor from a previous page
+    - limit: Maximum number of results to return
+    """
+    return await ChatService(db).search_messages(
+        current_user.username, q, chat_id=chat_id, cursor=cursor, limit=limit
+    )
+
 @router.get("/{chat_id}", response_model=ChatResponse)
 async def get_chat(
     chat_id: int = Path(..., description="The ID of the chat to get"),
     current_user = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Get a specific chat by ID"""
     chat_service = ChatService(db)
-    chat = await chat_service.get_chat(chat_id)
-    if chat is None:
-        raise HTTPException(status_code=404, detail="Chat not found")
-    if current_user.username not in [member.username for member in chat.users]:
-        raise HTTPException(status_code=403, detail="Not a member of this chat")
-    return chat
+    await chat_service.require_member(chat_id, current_user.username)
+    return chat_service.to_response(await chat_service.get_chat(chat_id))
+
+@router.get("/{chat_id}/messages", response_model=MessagePage)
+async def get_messages(
+    chat_id: int,
+    current_user = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db),
+    cursor: Optional[str] = None,
+    direction: Literal["older", "newer"] = "older",
+    limit: int = Query(50, ge=1, le=100),
+    skip: int = Query(
+        0,
+        ge=0,
+        deprecated=True,
+        description="Offset pagination; slow for deep pages, use cursor instead"
+    )
+):
+    """
+    Get a page of messages, newest first.
+
+    Parameters:
+    - cursor: next_cursor (with direction=older) or prev_cursor (with direction=newer) from a previous page
+    - direction: older to scroll back, newer to fetch messages after the cursor
+    - limit: Maximum number of messages to return
+    """
+    chat_service = ChatService(db)
+    if skip:
+        messages = await chat_service.get_messages(
+            chat_id, current_user.username, skip=skip, limit=limit
+        )
+        return MessagePage(messages=messages)
+    return await chat_service.get_messages_page(
+        chat_id,
+        current_user.username,
+        cursor=cursor,
+        direction=direction,
+        limit=limit
+    )
 
 @router.patch("/{chat_id}", response_model=ChatResponse)
 async def update_chat(
     chat_id: int,
     chat_update: ChatUpdate,
-    current_user = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user = Depends(rate_limited_user("rest_write")),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Update chat settings (group chats only)"""
     chat_service = ChatService(db)
@@ -93,8 +152,8 @@ async def update_chat(
 async def add_members(
     chat_id: int,
     member_usernames: list[str],
-    current_user = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user = Depends(rate_limited_user("rest_write")),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Add new members to a group chat"""
     chat_service = ChatService(db)
@@ -103,14 +162,16 @@ async def add_members(
         raise HTTPException(status_code=400, detail="Cannot add members to direct chat")
     if chat.admin_user != current_user.username:
         raise HTTPException(status_code=403, detail="Only admin can add members")
-    return await chat_service.add_members(chat_id, member_usernames)
+    response = await chat_service.add_members(chat_id, member_usernames)
+    await chat_ws.membership_changed(chat_id, added=member_usernames)
+    return response
 
 @router.delete("/{chat_id}/members/{username}")
 async def remove_member(
     chat_id: int,
     username: str,
-    current_user = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user = Depends(rate_limited_user("rest_write")),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Remove a member from a group chat"""
     chat_service = ChatService(db)
@@ -120,4 +181,22 @@ async def remove_member(
     if chat.admin_user != current_user.username:
         raise HTTPException(status_code=403, detail="Only admin can remove members")
     await chat_service.remove_member(chat_id, username)
-    return {"message": "Member removed successfully"}
\ No newline at end of file
+    # Every worker drops the member from the room and from its membership cache
+    await chat_ws.membership_changed(chat_id, removed=[username])
+    return {"message": "Member removed successfully"}
+
+@router.post("/{chat_id}/read")
+async def mark_chat_read(
+    chat_id: int,
+    message_id: Optional[int] = None,
+    seq: Optional[int] = None,
+    current_user = Depends(rate_limited_user("rest_write")),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Mark messages as read up to seq or message_id (all messages if both are omitted)"""
+    chat_service = ChatService(db)
+    await chat_service.require_member(chat_id, current_user.username)
+    watermark = await chat_service.mark_as_read(chat_id, current_user.username, message_id, seq)
+    # Already stored; the batcher only announces it with the chat's other receipts
+    chat_ws.receipts.update(chat_id, current_user.username, watermark, persisted=True)
+    return {"message": "Chat marked as read", "last_read_seq": watermark}
@@ -1,19 +1,35 @@
-from fastapi import APIRouter, Depends, UploadFile, File, HTTPException
-from sqlalchemy.orm import Session
+from typing import Dict, List
+from fastapi import APIRouter, Depends, UploadFile, File, HTTPException, Query
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from ...models.user import User
-from ...schemas.user import UserResponse
+from ...schemas.user import UserPresence, UserResponse
+from ...core.cache import token_cache
 from ...core.security import get_current_user
-from ..dependencies import get_db
+from ..dependencies import get_async_db
+from ..websockets.chat import chat_ws
 from ...utils.image_handler import ImageHandler
 
 router = APIRouter(prefix="/users", tags=["users"])
 
+MAX_PRESENCE_LOOKUP = 500
+
+@router.get("/presence", response_model=Dict[str, UserPresence])
+async def get_presence(
+    usernames: List[str] = Query(...),
+    current_user = Depends(get_current_user)
+):
+    """Online status and last seen time of up to MAX_PRESENCE_LOOKUP users"""
+    if len(usernames) > MAX_PRESENCE_LOOKUP:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_PRESENCE_LOOKUP} usernames per request")
+    return await chat_ws.presence_registry.lookup(usernames)
+
 # Adding profile picture of user 
 @router.post("/profile-picture", response_model=UserResponse)
 async def upload_profile_picture(
     file: UploadFile = File(...),
     token_data = Depends(get_current_user),  # Changed parameter name
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Uploads a profile picture for the current user.
@@ -21,7 +37,7 @@ async def upload_profile_picture(
     Args:
         file (UploadFile): The image file to upload.
         token_data (TokenData): Token data containing username.
-        db (Session): Database session dependency.
+        db (AsyncSession): Database session dependency.
         
     Returns:
         User: The updated user object with the new profile picture URL.
@@ -34,7 +50,7 @@ async def upload_profile_picture(
         username = token_data.username
         
         # Fetch user from database
-        user = db.query(User).filter(User.username == username).first()
+        user = await db.scalar(select(User).where(User.username == username))
         if not user:
             raise HTTPException(status_code=404, detail="User not found")
 
@@ -47,8 +63,9 @@ async def upload_profile_picture(
         # Update user profile picture URL
         user.avatar = image_url
         db.add(user)
-        db.commit()
-        db.refresh(user)
+        await db.commit()
+        token_cache.invalidate_user(username)
+        await db.refresh(user)
         
         return user
     except Exception as e:
@@ -1,9 +1,9 @@
 from fastapi import APIRouter, WebSocket, Depends, WebSocketDisconnect, HTTPException
 from ..websockets.chat import chat_ws
-from ...schemas.message import MessageCreate, MessageType
-from ..dependencies import get_db, get_current_user
-import json
-from datetime import datetime
+from ..dependencies import get_current_user
+from ...core.codecs import FrameDecodeError, negotiate
+from ...core.compression import negotiate_compression
+from ...db.base import AsyncSessionLocal
 
 router = APIRouter(prefix="/ws", tags=["websocket"])
 
@@ -13,6 +13,10 @@ async def websocket_endpoint(
 ):
     """
     Single WebSocket endpoint for handling all chats
+
+    Frames are JSON text unless the client negotiates MessagePack binary
+    frames, via the "msgpack" subprotocol or ?format=msgpack, and can ask for
+    large outbound frames to be deflated with ?compress=deflate.
     """
     try:
         # Get token from query parameters
@@ -24,12 +28,10 @@ async def websocket_endpoint(
         if access_token.startswith('Bearer '):
             access_token = access_token.replace('Bearer ', '')
 
-        # Get database session
-        db = next(get_db())
-
         try:
-            # Authenticate user
-            user = await get_current_user(db=db, token=access_token)
+            # Authenticate user; the session is only held for the lookup
+            async with AsyncSessionLocal() as db:
+                user = await get_current_user(db=db, token=access_token)
             if not user:
                 await websocket.close(code=4003, reason="Authentication failed")
                 return
@@ -37,36 +39,70 @@ async def websocket_endpoint(
             username = user.username
             print(f"User authenticated: {username}")
 
-            # Accept connection
-            await websocket.accept()
+            # Accept connection and register it for room broadcasts
+            codec, subprotocol = negotiate(websocket)
+            connection = await chat_ws.connection_manager.connect(
+                websocket,
+                username,
+                codec=codec,
+                subprotocol=subprotocol,
+                compressor=negotiate_compression(websocket)
+            )
 
             # Set up WebSocket connection
             await chat_ws.handle_connection(websocket, access_token, username)
 
-            # Send connection confirmation
-            await websocket.send_json({
+            # Send connection confirmation to this socket only, not the user's other devices
+            connection.enqueue({
                 "type": "connected",
                 "username": username,
                 "status": "connected"
             })
+            # Then whatever was stored for them while they were away
+            await chat_ws.deliveries.deliver_pending(username, connection)
 
             # Handle incoming messages
             while True:
                 try:
-                    raw_message = await websocket.receive_text()
-                    data = json.loads(raw_message)
-                    
+                    if codec.binary:
+                        raw_message = await websocket.receive_bytes()
+                    else:
+                        raw_message = await websocket.receive_text()
+                    data = codec.decode(raw_message)
+                    # Any frame proves the connection is alive
+                    connection.mark_alive()
+                    await chat_ws.presence_registry.heartbeat(username)
+                    retry_after = connection.take_frame()
+                    if retry_after:
+                        await chat_ws.send_rate_limited(username, data, retry_after)
+                        continue
+                    if data.get("type") in ("heartbeat", "pong"):
+                        continue
+
+                    # Resume spans several chats, so it comes before the chat_id check
+                    if data.get("type") == "resume":
+                        await chat_ws.handle_resume(data, username)
+                        continue
+
                     # Each message must include chat_id
                     if "chat_id" not in data:
-                        await websocket.send_json({
+                        await chat_ws.connection_manager.send_personal_message(username, {
                             "type": "error",
                             "message": "Missing chat_id in message"
                         })
                         continue
 
-                    # Join chat room if not already joined
+                    # Join chat room if not already joined; only members may
                     chat_id = data["chat_id"]
-                    await chat_ws.connection_manager.join_room(username, chat_id)
+                    if not await chat_ws.join_chat(username, chat_id):
+                        await chat_ws.connection_manager.send_personal_message(username, {
+                            "type": "error",
+                            "code": "forbidden",
+                            "chat_id": chat_id,
+                            "client_id": data.get("client_id"),
+                            "message": "Not a member of this chat"
+                        })
+                        continue
                     
                     print(f"Received message from {username} in chat {chat_id}: {data}")
                     await chat_ws.handle_message(data, websocket, username)
@@ -74,15 +110,18 @@ async def websocket_endpoint(
                 except WebSocketDisconnect:
                     print(f"Client disconnected normally: {username}")
                     break
-                except json.JSONDecodeError:
-                    print(f"Invalid JSON received from {username}")
-                    await websocket.send_json({
+                except FrameDecodeError:
+                    print(f"Invalid {codec.name} frame received from {username}")
+                    await chat_ws.connection_manager.send_personal_message(username, {
                         "type": "error",
                         "message": "Invalid message format"
                     })
                 except Exception as e:
                     print(f"Message handling error: {str(e)}")
-                    await websocket.send_json({
+                    if connection.closed:
+                        # Dropped by its writer (send failure or queue overflow)
+                        break
+                    await chat_ws.connection_manager.send_personal_message(username, {
                         "type": "error",
                         "message": "Failed to process message"
                     })
@@ -101,100 +140,6 @@ async def websocket_endpoint(
         if 'username' in locals():
             try:
                 # Disconnect from all rooms
-                await chat_ws.connection_manager.disconnect(username)
+                await chat_ws.handle_disconnect(username, websocket)
             except Exception as e:
                 print(f"Cleanup error: {str(e)}")
-
-async def handle_message(data: dict, websocket: WebSocket, username: str):
-    """Handle real-time WebSocket messages"""
-    message_type = data.get("type")
-    
-    handlers = {
-        # Real-time features only
-        "new_message": handle_chat_message,
-        "typing": handle_typing_indicator,
-        "presence": handle_user_presence,
-        "read_receipt": handle_mark_as_read
-    }
-
-    handler = handlers.get(message_type)
-    if handler:
-        await handler(data, websocket, username)
-    else:
-        await websocket.send_json({
-            "type": "error",
-            "message": "Unknown message type"
-        })
-
-async def handle_chat_message(data: dict, websocket: WebSocket, username: str):
-    """Handle sending chat messages"""
-    try:
-        message = MessageCreate(
-            chat_id=data["chat_id"],
-            content=data["content"],
-            message_type=MessageType(data.get("message_type", "text")),
-            media_url=data.get("media_url")
-        )
-        
-        # Send message through WebSocket
-        await chat_ws.broadcast_to_chat(data["chat_id"], {
-            "type": "new_message",
-            "message": {
-                "content": message.content,
-                "sender": username,
-                "chat_id": message.chat_id,
-                "message_type": message.message_type,
-                "timestamp": datetime.utcnow().isoformat()
-            }
-        })
-        
-        # Send delivery receipt
-        await websocket.send_json({
-            "type": "message_sent",
-            "chat_id": message.chat_id,
-            "timestamp": datetime.utcnow().isoformat()
-        })
-    except Exception as e:
-        await websocket.send_json({
-            "type": "error",
-            "message": str(e)
-        })
-
-async def handle_typing_indicator(data: dict, websocket: WebSocket, username: str):
-    """Handle typing indicators"""
-    chat_id = data["chat_id"]
-    is_typing = data["is_typing"]
-    
-    await chat_ws.broadcast_to_chat(chat_id, {
-        "type": "typing_indicator",
-        "username": username,
-        "chat_id": chat_id,
-        "is_typing": is_typing
-    }, exclude_user=username)
-
-async def handle_user_presence(data: dict, websocket: WebSocket, username: str):
-    """Handle online/offline status"""
-    status = data["status"]
-    await chat_ws.broadcast_presence({
-        "type": "presence",
-        "username": username,
-        "status": status
-    })
-
-async def handle_mark_as_read(data: dict, websocket: WebSocket, username: str):
-    """Handle real-time read receipts"""
-    try:
-        chat_id = data["chat_id"]
-        message_id = data["message_id"]
-        
-        await chat_ws.broadcast_to_chat(chat_id, {
-            "type": "read_receipt",
-            "username": username,
-            "message_id": message_id,
-            "timestamp": datetime.utcnow().isoformat()
-        })
-    except Exception as e:
-        await websocket.send_json({
-            "type": "error",
-            "message": str(e)
-        })
\ No newline at end of file
@@ -1,16 +1,74 @@
 from fastapi import WebSocket, Depends, HTTPException
 from typing import Dict, Any
+import asyncio
+from sqlalchemy import and_, select
 from sqlalchemy.orm import Session
 from datetime import datetime
 
+from ...core.cache import membership_cache
+from ...core.coalescer import TypingCoalescer
+from ...core.config import settings
 from ...core.events import ConnectionManager
+from ...core.heartbeat import HeartbeatWheel
+from ...core.ratelimit import FRAME_SCOPES, rate_limiter
+from ...core.replay import ReplayBuffer
 from ...core.security import get_current_user
+from ...db.base import AsyncSessionLocal
 from ...models.message import Message
 from ...services.chat import ChatService
+from ...services.delivery import DeliveryQueue
+from ...services.message_writer import message_payload, message_writer
+from ...services.presence import PresenceBatcher, PresenceRegistry
+from ...services.receipts import ReadReceiptBatcher
+
+# Every worker listens here so membership changes reach its caches and rooms
+MEMBERSHIP_CHANNEL = "membership"
 
 class ChatWebSocket:
-    def __init__(self):
-        self.connection_manager = ConnectionManager()
+    def __init__(
+        self, session_factory=AsyncSessionLocal, writer=message_writer, limiter=rate_limiter, backend=None
+    ):
+        self.presence_registry = PresenceRegistry(session_factory)
+        self.heartbeat = HeartbeatWheel()
+        self.connection_manager = ConnectionManager(
+            backend, presence=self.presence_registry, heartbeat=self.heartbeat
+        )
+        self.replay = ReplayBuffer()
+        self.session_factory = session_factory
+        self.writer = writer
+        self.limiter = limiter
+        self.typing = TypingCoalescer(self.connection_manager)
+        self.presence = PresenceBatcher(self.connection_manager, session_factory)
+        self.receipts = ReadReceiptBatcher(self.connection_manager, session_factory)
+        self.deliveries = DeliveryQueue(self.connection_manager, session_factory)
+        # Connects, disconnects and expiries reach contacts as presence diffs
+        self.presence_registry.on_change = self.presence.update
+        self._listening = False
+
+    async def start(self):
+        """Start listening for membership changes made on any worker"""
+        if not self._listening:
+            self._listening = True
+            await self.connection_manager.backend.start()
+            await self.connection_manager.add_channel_handler(
+                MEMBERSHIP_CHANNEL, self._apply_membership_change
+            )
+
+    async def membership_changed(self, chat_id: int, added=(), removed=()):
+        """Tell every worker, this one included, that a chat gained or lost members"""
+        await self.start()
+        await self.connection_manager.backend.publish(MEMBERSHIP_CHANNEL, {
+            "chat_id": chat_id,
+            "added": list(added),
+            "removed": list(removed)
+        })
+
+    async def _apply_membership_change(self, message: dict):
+        chat_id = message["chat_id"]
+        membership_cache.invalidate(chat_id, message["added"] + message["removed"])
+        # Removed members stop receiving the room's broadcasts and can't post to it
+        for username in message["removed"]:
+            await self.connection_manager.leave_room(username, chat_id)
 
     async def handle_connection(self, websocket: WebSocket, token: str, username: str):
         """Handle WebSocket connection lifecycle"""
@@ -22,7 +80,7 @@ class ChatWebSocket:
                 return
 
             # Send initial connection success message
-            await websocket.send_json({
+            await self.connection_manager.send_personal_message(username, {
                 "type": "connection_established",
                 "username": username
             })
@@ -48,70 +106,204 @@ class ChatWebSocket:
             "read_receipt": self.handle_read_receipt
         }
 
+        scope = FRAME_SCOPES.get(message_type)
+        if scope is not None:
+            retry_after = self.limiter.check(scope, username)
+            if retry_after is not None:
+                await self.send_rate_limited(username, data, retry_after)
+                return
+
         handler = handlers.get(message_type)
         if handler:
             await handler(data, username)
         else:
-            await websocket.send_json({
+            await self.connection_manager.send_personal_message(username, {
                 "type": "error",
                 "message": "Unknown message type"
             })
 
+    async def send_rate_limited(self, username: str, data: dict, retry_after: float):
+        """Tell a client that a frame was dropped for exceeding its quota"""
+        await self.connection_manager.send_personal_message(username, {
+            "type": "error",
+            "code": "rate_limited",
+            "frame_type": data.get("type"),
+            "client_id": data.get("client_id"),
+            "retry_after": round(retry_after, 3),
+            "message": "Rate limit exceeded"
+        })
+
     async def handle_new_message(self, data: dict, username: str):
         """Handle new chat message"""
+        chat_id = data["chat_id"]
+        if not await self.is_member(username, chat_id):
+            await self.connection_manager.send_personal_message(username, {
+                "type": "error",
+                "client_id": data.get("client_id"),
+                "message": "Not a member of this chat"
+            })
+            return
+        durable = self.writer.submit(
+            chat_id=chat_id,
+            sender_username=username,
+            content=data["content"],
+            message_type=data.get("message_type", "text"),
+            media_url=data.get("media_url")
+        )
+        # Don't hold up this client's receive loop while the batch is committed
+        asyncio.create_task(
+            self._deliver_when_durable(durable, username, data.get("client_id"))
+        )
+
+    async def _deliver_when_durable(self, durable: asyncio.Future, username: str, client_id):
+        """Broadcast a message and ack the sender once it has been stored"""
+        try:
+            message = await durable
+        except Exception as e:
+            print(f"Error persisting message: {str(e)}")
+            await self.connection_manager.send_personal_message(username, {
+                "type": "error",
+                "client_id": client_id,
+                "message": "Failed to store message"
+            })
+            return
+
         try:
-            chat_id = data["chat_id"]
-            content = data["content"]
-            
+            self.replay.append(message["chat_id"], message)
             # Broadcast message to all users in the chat room
-            await self.connection_manager.broadcast_to_room(chat_id, {
-                "type": "new_message",
-                "message": {
-                    "content": content,
-                    "sender": username,
-                    "chat_id": chat_id,
-                    "timestamp": datetime.utcnow().isoformat()
-                }
+            # The sender's copy echoes its client_id so it can replace the pending bubble
+            await self.connection_manager.broadcast_to_room(
+                message["chat_id"],
+                {"type": "new_message", "message": message},
+                personal={username: {"client_id": client_id}} if client_id is not None else None
+            )
+            # Members connected outside the room get it directly, offline ones when they connect
+            async with self.session_factory() as db:
+                members = await ChatService(db).get_members(message["chat_id"])
+            self.deliveries.message_sent(message, members - {username})
+            await self.connection_manager.send_personal_message(username, {
+                "type": "message_ack",
+                "client_id": client_id,
+                "message_id": message["id"],
+                "seq": message["seq"],
+                "chat_id": message["chat_id"],
+                "timestamp": message["timestamp"]
             })
         except Exception as e:
             print(f"Error broadcasting message: {str(e)}")
 
+    async def handle_resume(self, data: dict, username: str):
+        """
+        Replay what a reconnecting client missed.
+
+        The frame carries the last seq the client saw per chat:
+        {"type": "resume", "chats": {"<chat_id>": <last_seq>, ...}}. Each chat
+        the user belongs to gets one "replay" frame with the messages after
+        that seq, then a single "resumed" frame closes the exchange. Gaps
+        longer than WS_REPLAY_MAX_MESSAGES come back with truncated=true and no
+        messages, and the client should reload that chat's history instead.
+        """
+        try:
+            requested = {int(chat_id): int(seq) for chat_id, seq in data.get("chats", {}).items()}
+        except (AttributeError, TypeError, ValueError):
+            await self.connection_manager.send_personal_message(username, {
+                "type": "error",
+                "message": "Invalid resume frame"
+            })
+            return
+
+        async with self.session_factory() as db:
+            chat_service = ChatService(db)
+            member_chats = await chat_service.get_last_seqs(username, list(requested))
+            # Join first, then read where each chat stands: anything stored later is
+            # broadcast after the join and arrives live (clients drop duplicates by seq)
+            for chat_id in member_chats:
+                await self.connection_manager.join_room(username, chat_id)
+            last_seqs = await chat_service.get_last_seqs(username, list(member_chats))
+
+            for chat_id, last_seq in last_seqs.items():
+                after_seq = requested[chat_id]
+                frame = {"type": "replay", "chat_id": chat_id, "last_seq": last_seq, "messages": []}
+                if last_seq - after_seq > settings.WS_REPLAY_MAX_MESSAGES:
+                    frame["truncated"] = True
+                elif last_seq > after_seq:
+                    messages = self.replay.since(chat_id, after_seq, last_seq)
+                    if messages is None:
+                        rows = await chat_service.get_messages_after_seq(
+                            chat_id, after_seq, last_seq - after_seq
+                        )
+                        messages = [message_payload(row) for row in rows]
+                    frame["messages"] = messages
+                await self.connection_manager.send_personal_message(username, frame)
+
+        await self.connection_manager.send_personal_message(username, {
+            "type": "resumed",
+            "chats": {str(chat_id): last_seq for chat_id, last_seq in last_seqs.items()}
+        })
+
     async def handle_typing_indicator(self, data: dict, username: str):
         """Handle typing status"""
-        chat_id = data["chat_id"]
-        is_typing = data["is_typing"]
-        
-        await self.connection_manager.broadcast_to_chat(chat_id, {
-            "type": "typing",
-            "username": username,
-            "chat_id": chat_id,
-            "is_typing": is_typing
-        }, exclude_user=username)
+        await self.typing.update(username, data["chat_id"], bool(data.get("is_typing", True)))
 
     async def handle_presence_update(self, data: dict, username: str):
         """Handle online/offline status"""
-        status = data["status"]
-        await self.connection_manager.broadcast_presence({
-            "type": "presence",
-            "username": username,
-            "status": status
-        })
+        await self.presence.update(username, data["status"])
 
     async def handle_read_receipt(self, data: dict, username: str):
-        """Handle message read receipts"""
+        """Handle read receipts: {"seq": n} reads everything in the chat up to n"""
         chat_id = data["chat_id"]
-        message_id = data["message_id"]
-        
-        await self.connection_manager.broadcast_to_chat(chat_id, {
-            "type": "read_receipt",
-            "username": username,
-            "message_id": message_id,
-            "timestamp": datetime.utcnow().isoformat()
-        })
+        seq = data.get("seq")
+        if seq is None:
+            # Older clients send the id of the last message they read
+            async with self.session_factory() as db:
+                seq = await db.scalar(
+                    select(Message.seq).where(
+                        and_(Message.id == data["message_id"], Message.chat_id == chat_id)
+                    )
+                )
+            if seq is None:
+                return
+        self.receipts.update(chat_id, username, int(seq))
+
+    async def handle_disconnect(self, username: str, websocket: WebSocket):
+        """Clear a leaving user's transient state, then drop the connection"""
+        await self.typing.clear_user(username)
+        await self.connection_manager.disconnect(username, websocket)
+
+    async def is_member(self, username: str, chat_id: int) -> bool:
+        """Membership check for frames; free while the user is in the chat's room"""
+        if chat_id in self.connection_manager.user_rooms.get(username, ()):
+            return True
+        async with self.session_factory() as db:
+            return chat_id in await ChatService(db).get_chat_ids(username)
+
+    async def join_chat(self, username: str, chat_id: int) -> bool:
+        """Join a chat's room if username is a member; free once they are in it"""
+        if chat_id in self.connection_manager.user_rooms.get(username, ()):
+            return True
+        chat_ids = membership_cache.chats(username)
+        if chat_ids is None or chat_id not in chat_ids:
+            # Re-read before refusing: the user may just have been added on another worker
+            membership_cache.invalidate(chat_id, [username])
+            async with self.session_factory() as db:
+                chat_ids = await ChatService(db).get_chat_ids(username)
+            if chat_id not in chat_ids:
+                return False
+        await self.connection_manager.join_room(username, chat_id)
+        return True
 
     async def leave_room(self, username: str, chat_id: int):
         """Remove a user from a chat room"""
-        if username in self.connection_manager.user_rooms:
-            self.connection_manager.user_rooms[username].remove(chat_id)
+        await self.connection_manager.leave_room(username, chat_id)
+
+    async def shutdown(self):
+        self.typing.close()
+        await self.heartbeat.stop()
+        await self.presence_registry.stop()
+        await self.presence.stop()
+        await self.receipts.stop()
+        await self.deliveries.stop()
+        await self.connection_manager.fanout.stop()
+        await self.connection_manager.backend.stop()
 
 chat_ws = ChatWebSocket()
\ No newline at end of file
@@ -0,0 +1,340 @@
+import hashlib
+import time
+from collections import OrderedDict, deque
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Callable, Deque, Dict, FrozenSet, Hashable, Iterable, List, Optional, Set, Tuple
+
+from .config import settings
+
+
+class TTLCache:
+    """
+    Bounded LRU cache whose entries also expire after a time-to-live.
+
+    Not thread-safe; meant to be used from the event loop.
+    """
+
+    def __init__(
+        self,
+        maxsize: int,
+        ttl: float,
+        clock: Callable[[], float] = time.monotonic,
+        on_evict: Optional[Callable[[Hashable, Any], None]] = None
+    ):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.clock = clock
+        self.on_evict = on_evict
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        expires_at, value = entry
+        if expires_at <= self.clock():
+            self._remove(key)
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+        if key in self._entries:
+            self._entries.pop(key)
+        self._entries[key] = (self.clock() + (self.ttl if ttl is None else ttl), value)
+        while len(self._entries) > self.maxsize:
+            self._remove(next(iter(self._entries)))
+
+    def pop(self, key: Hashable) -> Optional[Any]:
+        entry = self._entries.pop(key, None)
+        return entry[1] if entry is not None else None
+
+    def clear(self):
+        self._entries.clear()
+
+    def _remove(self, key: Hashable):
+        _, value = self._entries.pop(key)
+        if self.on_evict is not None:
+            self.on_evict(key, value)
+
+    def stats(self) -> Dict[str, int]:
+        return {"size": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+@dataclass(frozen=True)
+class CachedUser:
+    """The fields request handlers need from an authenticated user"""
+    username: str
+    email: str
+    full_name: str
+    avatar: Optional[str]
+    is_active: bool
+    is_verified: bool
+
+    @classmethod
+    def from_model(cls, user) -> "CachedUser":
+        return cls(
+            username=user.username,
+            email=user.email,
+            full_name=user.full_name,
+            avatar=user.avatar,
+            is_active=bool(user.is_active),
+            is_verified=bool(user.is_verified)
+        )
+
+
+class TokenCache:
+    """
+    Validated access tokens, keyed by a SHA-256 of the token.
+
+    Entries never outlive the token's own expiry. invalidate_user drops every
+    token of a user after their account changes.
+    """
+
+    def __init__(
+        self,
+        maxsize: int = settings.AUTH_CACHE_SIZE,
+        ttl: float = settings.AUTH_CACHE_TTL_SECONDS
+    ):
+        self._cache = TTLCache(maxsize, ttl, on_evict=self._forget)
+        self._by_user: Dict[str, Set[str]] = {}
+
+    @staticmethod
+    def key_for(token: str) -> str:
+        return hashlib.sha256(token.encode()).hexdigest()
+
+    @property
+    def hits(self) -> int:
+        return self._cache.hits
+
+    @property
+    def misses(self) -> int:
+        return self._cache.misses
+
+    def get(self, token: str) -> Optional[CachedUser]:
+        return self._cache.get(self.key_for(token))
+
+    def set(self, token: str, user: CachedUser, expires_at: Optional[float] = None):
+        ttl = self._cache.ttl
+        if expires_at is not None:
+            ttl = min(ttl, expires_at - time.time())
+            if ttl <= 0:
+                return
+        key = self.key_for(token)
+        self._cache.set(key, user, ttl)
+        self._by_user.setdefault(user.username, set()).add(key)
+
+    def invalidate_user(self, username: str):
+        for key in self._by_user.pop(username, ()):
+            self._cache.pop(key)
+
+    def clear(self):
+        self._cache.clear()
+        self._by_user.clear()
+
+    def stats(self) -> Dict[str, int]:
+        return self._cache.stats()
+
+    def _forget(self, key: str, user: CachedUser):
+        keys = self._by_user.get(user.username)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._by_user[user.username]
+
+
+token_cache = TokenCache()
+
+
+class MembershipCache:
+    """
+    Chat membership in both directions: chat_id -> usernames, username -> chat ids.
+
+    ChatService fills entries on first use; membership changes made through
+    it drop the affected chat and users. The endpoints that change membership
+    also publish on MEMBERSHIP_CHANNEL, so every worker drops the same
+    entries; the TTL only bounds staleness if such a message is lost.
+    """
+
+    def __init__(
+        self,
+        maxsize: int = settings.MEMBERSHIP_CACHE_SIZE,
+        ttl: float = settings.MEMBERSHIP_CACHE_TTL_SECONDS
+    ):
+        self._members = TTLCache(maxsize, ttl)
+        self._chats = TTLCache(maxsize, ttl)
+
+    def members(self, chat_id: int) -> Optional[FrozenSet[str]]:
+        return self._members.get(chat_id)
+
+    def set_members(self, chat_id: int, usernames: Iterable[str]) -> FrozenSet[str]:
+        usernames = frozenset(usernames)
+        self._members.set(chat_id, usernames)
+        return usernames
+
+    def chats(self, username: str) -> Optional[FrozenSet[int]]:
+        return self._chats.get(username)
+
+    def set_chats(self, username: str, chat_ids: Iterable[int]) -> FrozenSet[int]:
+        chat_ids = frozenset(chat_ids)
+        self._chats.set(username, chat_ids)
+        return chat_ids
+
+    def invalidate(self, chat_id: int, usernames: Iterable[str] = ()):
+        """Forget a chat's members and the chat lists of users who joined or left it"""
+        self._members.pop(chat_id)
+        for username in usernames:
+            self._chats.pop(username)
+
+    def clear(self):
+        self._members.clear()
+        self._chats.clear()
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        return {"members": self._members.stats(), "chats": self._chats.stats()}
+
+
+membership_cache = MembershipCache()
+
+
+class MessageRing:
+    """One chat's newest messages, oldest first"""
+    __slots__ = ("messages", "expires_at")
+
+    def __init__(self, expires_at: float):
+        self.messages: Deque = deque()
+        self.expires_at = expires_at
+
+
+class RecentMessageCache:
+    """
+    The newest messages of recently used chats, for first-page history loads.
+
+    Each chat's ring holds up to per_chat messages (MessageResponse) with
+    consecutive seqs ending at the chat's latest message. ChatService fills
+    it from the first page it reads, and every stored message is appended as
+    it is written. A message whose seq doesn't follow the ring's newest was
+    stored without passing through here, so the ring starts over from it.
+    Rings expire after ttl, which bounds how stale a chat written to by
+    another worker can look. At most max_messages are kept in all; the least
+    recently used chats are evicted first.
+    """
+
+    def __init__(
+        self,
+        per_chat: int = settings.RECENT_MESSAGES_PER_CHAT,
+        max_messages: int = settings.RECENT_MESSAGES_MAX_TOTAL,
+        ttl: float = settings.RECENT_MESSAGES_TTL_SECONDS,
+        clock: Callable[[], float] = time.monotonic
+    ):
+        self.per_chat = per_chat
+        self.max_messages = max_messages
+        self.ttl = ttl
+        self.clock = clock
+        self.hits = 0
+        self.misses = 0
+        self.total = 0
+        self._rings: "OrderedDict[int, MessageRing]" = OrderedDict()
+
+    def latest(self, chat_id: int, limit: int) -> Optional[Tuple[List, bool]]:
+        """(newest-first page of up to limit messages, whether older ones exist), or None on a miss"""
+        ring = self._ring(chat_id)
+        if ring is not None:
+            messages = ring.messages
+            # seq 1 at the bottom means the ring holds the chat's whole history
+            whole = messages[0].seq == 1
+            if len(messages) >= limit or whole:
+                self.hits += 1
+                self._rings.move_to_end(chat_id)
+                page = [messages[i] for i in range(len(messages) - 1, max(len(messages) - limit, 0) - 1, -1)]
+                return page, len(messages) > limit or not whole
+        self.misses += 1
+        return None
+
+    def fill(self, chat_id: int, page: List):
+        """Cache a newest-first first page just read from the database"""
+        ordered = page[::-1]
+        if not ordered or any(message.seq is None for message in ordered):
+            return
+        if any(newer.seq != older.seq + 1 for older, newer in zip(ordered, ordered[1:])):
+            return
+        ring = self._ring(chat_id)
+        if ring is not None:
+            newest = ring.messages[-1].seq
+            # Written to since this page was read, or already holds at least as much
+            if newest > ordered[-1].seq or (newest == ordered[-1].seq and len(ring.messages) >= len(ordered)):
+                return
+        self._drop(chat_id)
+        ring = self._rings[chat_id] = MessageRing(self.clock() + self.ttl)
+        ring.messages.extend(ordered[-self.per_chat:])
+        self.total += len(ring.messages)
+        self._evict()
+
+    def append(self, message):
+        """Write-through for a message that has just been stored"""
+        if message.seq is None:
+            self._drop(message.chat_id)
+            return
+        ring = self._ring(message.chat_id)
+        if ring is not None and message.seq <= ring.messages[-1].seq:
+            return
+        if ring is None or message.seq != ring.messages[-1].seq + 1:
+            self._drop(message.chat_id)
+            ring = self._rings[message.chat_id] = MessageRing(self.clock() + self.ttl)
+        else:
+            self._rings.move_to_end(message.chat_id)
+        ring.messages.append(message)
+        self.total += 1
+        if len(ring.messages) > self.per_chat:
+            ring.messages.popleft()
+            self.total -= 1
+        self._evict()
+
+    def mark_delivered(self, chat_id: int, message_ids: Iterable[int], delivered_at: datetime):
+        """Keep cached copies in step with the delivered_at stamps in the database"""
+        ring = self._rings.get(chat_id)
+        if ring is None:
+            return
+        message_ids = set(message_ids)
+        for message in ring.messages:
+            if message.id in message_ids and message.delivered_at is None:
+                message.delivered_at = delivered_at
+
+    def invalidate(self, chat_id: int):
+        self._drop(chat_id)
+
+    def clear(self):
+        self._rings.clear()
+        self.total = 0
+
+    def stats(self) -> Dict[str, int]:
+        return {"chats": len(self._rings), "messages": self.total, "hits": self.hits, "misses": self.misses}
+
+    def _ring(self, chat_id: int) -> Optional[MessageRing]:
+        ring = self._rings.get(chat_id)
+        if ring is not None and ring.expires_at <= self.clock():
+            self._drop(chat_id)
+            return None
+        return ring
+
+    def _drop(self, chat_id: int):
+        ring = self._rings.pop(chat_id, None)
+        if ring is not None:
+            self.total -= len(ring.messages)
+
+    def _evict(self):
+        while self.total > self.max_messages and len(self._rings) > 1:
+            _, ring = self._rings.popitem(last=False)
+            self.total -= len(ring.messages)
+
+
+recent_messages = RecentMessageCache()
@@ -0,0 +1,92 @@
+import asyncio
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+
+from .config import settings
+
+
+@dataclass
+class TypingState:
+    last_sent_at: float
+    expiry: asyncio.TimerHandle
+
+
+class TypingCoalescer:
+    """
+    Turns a client's stream of typing events into a few room broadcasts.
+
+    "Started typing" is forwarded at once; repeats are forwarded at most once
+    per throttle window to keep the indicator alive. "Stopped typing" is only
+    forwarded if a start was, and is sent automatically when no event arrives
+    for timeout_ms (the client may simply have gone away).
+    """
+
+    def __init__(
+        self,
+        connection_manager,
+        throttle_ms: int = settings.TYPING_THROTTLE_MS,
+        timeout_ms: int = settings.TYPING_TIMEOUT_MS
+    ):
+        self.connection_manager = connection_manager
+        self.throttle = throttle_ms / 1000
+        self.timeout = timeout_ms / 1000
+        self.received = 0
+        self.forwarded = 0
+        self._typing: Dict[Tuple[str, int], TypingState] = {}
+
+    def is_typing(self, username: str, chat_id: int) -> bool:
+        return (username, chat_id) in self._typing
+
+    async def update(self, username: str, chat_id: int, is_typing: bool):
+        self.received += 1
+        key = (username, chat_id)
+        state = self._typing.get(key)
+        if not is_typing:
+            if state is not None:
+                await self._stop(key)
+            return
+
+        loop = asyncio.get_running_loop()
+        now = loop.time()
+        expiry = loop.call_later(self.timeout, self._expire, key)
+        if state is None:
+            self._typing[key] = TypingState(last_sent_at=now, expiry=expiry)
+            await self._broadcast(username, chat_id, True)
+            return
+
+        state.expiry.cancel()
+        state.expiry = expiry
+        if now - state.last_sent_at >= self.throttle:
+            state.last_sent_at = now
+            await self._broadcast(username, chat_id, True)
+
+    async def clear_user(self, username: str):
+        """Stop every indicator of a user, e.g. when they disconnect"""
+        for key in [key for key in self._typing if key[0] == username]:
+            await self._stop(key)
+
+    def close(self):
+        for state in self._typing.values():
+            state.expiry.cancel()
+        self._typing.clear()
+
+    def _expire(self, key: Tuple[str, int]):
+        # Drop the state right away so a start arriving meanwhile begins afresh
+        if self._typing.pop(key, None) is not None:
+            asyncio.create_task(self._broadcast(key[0], key[1], False))
+
+    async def _stop(self, key: Tuple[str, int]):
+        state: Optional[TypingState] = self._typing.pop(key, None)
+        if state is None:
+            return
+        state.expiry.cancel()
+        await self._broadcast(key[0], key[1], False)
+
+    async def _broadcast(self, username: str, chat_id: int, is_typing: bool):
+        self.forwarded += 1
+        await self.connection_manager.broadcast_to_room(chat_id, {
+            "type": "typing",
+            "username": username,
+            "chat_id": chat_id,
+            "is_typing": is_typing
+        }, exclude_user=username)
@@ -0,0 +1,164 @@
+"""
+Wire formats for /ws/chat frames.
+
+Every codec carries the same message schema; they differ only in how a frame
+dict is turned into bytes on the socket. A client picks one by offering it as
+a WebSocket subprotocol (Sec-WebSocket-Protocol: msgpack) or with the
+?format= query parameter; without either it gets JSON text frames.
+"""
+import json
+from typing import Any, Dict, List, Optional, Tuple
+
+try:
+    import msgpack
+except ImportError:  # optional: only needed for clients that ask for it
+    msgpack = None
+
+try:
+    import orjson
+except ImportError:  # optional: faster JSON encoding
+    orjson = None
+
+
+class FrameDecodeError(ValueError):
+    """An inbound frame could not be decoded"""
+
+
+class JsonCodec:
+    name = "json"
+    binary = False
+
+    def encode(self, message: dict) -> str:
+        if orjson is not None:
+            return orjson.dumps(message, option=orjson.OPT_NON_STR_KEYS).decode()
+        return json.dumps(message, separators=(",", ":"), ensure_ascii=False)
+
+    def entries(self, mapping: dict) -> str:
+        """The encoded key/value pairs of mapping, without the enclosing object"""
+        return self.encode(mapping)[1:-1]
+
+    def join(self, count: int, parts: List[str]) -> str:
+        return "{" + ",".join(part for part in parts if part) + "}"
+
+    def decode(self, data: str) -> Any:
+        try:
+            return json.loads(data)
+        except ValueError as e:
+            raise FrameDecodeError(str(e)) from e
+
+
+class MsgpackCodec:
+    name = "msgpack"
+    binary = True
+
+    def encode(self, message: dict) -> bytes:
+        return msgpack.packb(message, use_bin_type=True)
+
+    def entries(self, mapping: dict) -> bytes:
+        """The encoded key/value pairs of mapping, without the map header"""
+        count = len(mapping)
+        header = 1 if count < 16 else 3 if count < 0x10000 else 5
+        return self.encode(mapping)[header:]
+
+    def join(self, count: int, parts: List[bytes]) -> bytes:
+        return msgpack.Packer().pack_map_header(count) + b"".join(parts)
+
+    def decode(self, data: bytes) -> Any:
+        try:
+            return msgpack.unpackb(data, raw=False)
+        except Exception as e:
+            raise FrameDecodeError(str(e)) from e
+
+
+JSON = JsonCodec()
+
+CODECS: Dict[str, Any] = {JSON.name: JSON}
+if msgpack is not None:
+    CODECS[MsgpackCodec.name] = MsgpackCodec()
+
+
+def negotiate(websocket) -> Tuple[Any, Optional[str]]:
+    """
+    Pick the codec for a connection.
+
+    Returns the codec and the subprotocol to confirm in the handshake (None
+    when the choice came from the query string or fell back to JSON).
+    """
+    offered = websocket.headers.get("sec-websocket-protocol", "")
+    for name in (part.strip() for part in offered.split(",")):
+        if name in CODECS:
+            return CODECS[name], name
+    return CODECS.get(websocket.query_params.get("format", JSON.name), JSON), None
+
+
+class PreparedFrame:
+    """
+    A frame plus its encodings, computed at most once per codec.
+
+    A broadcast wraps its message once and hands the same object to every
+    recipient's queue, so a room of N members costs one encode per wire
+    format in use instead of N.
+    """
+
+    __slots__ = ("message", "_encoded", "_entries")
+
+    def __init__(self, message: dict):
+        self.message = message
+        self._encoded: Dict[str, Any] = {}
+        self._entries: Dict[str, Any] = {}
+
+    def encode(self, codec) -> Any:
+        data = self._encoded.get(codec.name)
+        if data is None:
+            data = self._encoded[codec.name] = codec.encode(self.message)
+        return data
+
+    def cached(self, key: str) -> Any:
+        return self._encoded.get(key)
+
+    def cache(self, key: str, data: Any) -> Any:
+        """Keep another representation (e.g. a compressed encoding) with the frame"""
+        self._encoded[key] = data
+        return data
+
+    def entries(self, codec) -> Any:
+        data = self._entries.get(codec.name)
+        if data is None:
+            data = self._entries[codec.name] = codec.entries(self.message)
+        return data
+
+    def personalize(self, overlay: Optional[dict]):
+        """This frame plus a few top-level fields for one recipient"""
+        return PersonalFrame(self, overlay) if overlay else self
+
+
+class PersonalFrame:
+    """
+    A shared PreparedFrame with per-recipient top-level fields added.
+
+    Only the overlay is encoded per recipient; the shared entries are spliced
+    in as already-encoded bytes. Overlay keys must not appear in the base
+    message.
+    """
+
+    __slots__ = ("base", "overlay")
+
+    def __init__(self, base: PreparedFrame, overlay: dict):
+        self.base = base
+        self.overlay = overlay
+
+    @property
+    def message(self) -> dict:
+        return {**self.base.message, **self.overlay}
+
+    def cached(self, key: str) -> Any:
+        return None
+
+    def cache(self, key: str, data: Any) -> Any:
+        return data
+
+    def encode(self, codec) -> Any:
+        return codec.join(
+            len(self.base.message) + len(self.overlay),
+            [self.base.entries(codec), codec.entries(self.overlay)]
+        )
@@ -0,0 +1,130 @@
+"""
+Deflate compression for large outbound /ws/chat frames.
+
+Compression is done by the application rather than through the
+permessage-deflate extension, which compresses every frame of a socket and
+cannot be skipped for small ones from inside an ASGI app. A client opts in
+with ?compress=deflate. Frames whose encoding is at least
+WS_COMPRESSION_MIN_BYTES long are then sent as binary frames holding the
+marker byte 0xC1 (never the first byte of a JSON or MessagePack frame)
+followed by raw deflate data with the trailing 00 00 FF FF removed, the same
+block format permessage-deflate uses. Clients inflate them with one raw
+deflate stream (wbits=-15) per connection, appending 00 00 FF FF to each
+frame; everything smaller arrives exactly as before.
+
+WS_COMPRESSION_CONTEXT_TAKEOVER picks the memory trade-off. Off, every frame
+is compressed on its own, so no zlib state is kept per socket and a
+broadcast frame is compressed once for all its recipients. On, each socket
+keeps a compressor whose window lets later frames refer back to earlier
+ones, for a better ratio at the cost of about context_memory() bytes per
+connection and one compression per recipient.
+"""
+import time
+import zlib
+from typing import Optional
+
+from .config import settings
+
+MARKER = b"\xc1"
+_SYNC_TAIL = b"\x00\x00\xff\xff"
+_WINDOW_BITS = 15
+_MEM_LEVEL = 8
+
+
+def context_memory(window_bits: int = _WINDOW_BITS, mem_level: int = _MEM_LEVEL) -> int:
+    """Approximate bytes zlib allocates for one compressor (from zlib's zconf.h)"""
+    return (1 << (window_bits + 2)) + (1 << (mem_level + 9))
+
+
+class CompressionStats:
+    """Process-wide counters; ratio is compressed size over original size"""
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.compressed = 0
+        self.skipped = 0
+        self.shared = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.cpu_seconds = 0.0
+
+    @property
+    def ratio(self) -> float:
+        return self.bytes_out / self.bytes_in if self.bytes_in else 1.0
+
+    def snapshot(self) -> dict:
+        return {
+            "compressed": self.compressed,
+            "skipped": self.skipped,
+            "shared": self.shared,
+            "bytes_in": self.bytes_in,
+            "bytes_out": self.bytes_out,
+            "ratio": round(self.ratio, 4),
+            "cpu_seconds": round(self.cpu_seconds, 6)
+        }
+
+
+compression_stats = CompressionStats()
+
+
+class FrameCompressor:
+    """Compression policy and (with context takeover) zlib state of one connection"""
+
+    def __init__(
+        self,
+        min_bytes: int = settings.WS_COMPRESSION_MIN_BYTES,
+        level: int = settings.WS_COMPRESSION_LEVEL,
+        context_takeover: bool = settings.WS_COMPRESSION_CONTEXT_TAKEOVER,
+        stats: CompressionStats = compression_stats
+    ):
+        self.min_bytes = min_bytes
+        self.level = level
+        self.stats = stats
+        self._context = self._compressobj() if context_takeover else None
+
+    def prepare(self, frame, codec):
+        """The bytes or text to send for frame: its encoding, or a compressed copy"""
+        data = frame.encode(codec)
+        if len(data) < self.min_bytes:
+            self.stats.skipped += 1
+            return data
+        if self._context is not None:
+            return self._compress(self._context, data)
+        # Independent of any earlier frame, so every recipient can share it
+        key = codec.name + "+deflate"
+        compressed = frame.cached(key)
+        if compressed is None:
+            compressed = frame.cache(key, self._compress(self._compressobj(), data))
+        else:
+            self.stats.shared += 1
+        return compressed
+
+    def _compressobj(self):
+        return zlib.compressobj(self.level, zlib.DEFLATED, -_WINDOW_BITS, _MEM_LEVEL)
+
+    def _compress(self, compressor, data) -> bytes:
+        raw = data.encode() if isinstance(data, str) else data
+        start = time.perf_counter()
+        body = compressor.compress(raw) + compressor.flush(zlib.Z_SYNC_FLUSH)
+        self.stats.cpu_seconds += time.perf_counter() - start
+        self.stats.compressed += 1
+        self.stats.bytes_in += len(raw)
+        self.stats.bytes_out += len(body) - len(_SYNC_TAIL)
+        return MARKER + body[:-len(_SYNC_TAIL)]
+
+
+def negotiate_compression(websocket) -> Optional[FrameCompressor]:
+    """A compressor if the server allows it and the client asked for ?compress=deflate"""
+    if settings.WS_COMPRESSION and websocket.query_params.get("compress") == "deflate":
+        return FrameCompressor()
+    return None
+
+
+def inflate(data: bytes, decompressor=None) -> bytes:
+    """Client side of the scheme, for tests and tools"""
+    if not data.startswith(MARKER):
+        return data
+    decompressor = decompressor or zlib.decompressobj(-_WINDOW_BITS)
+    return decompressor.decompress(data[len(MARKER):] + _SYNC_TAIL)
@@ -8,11 +8,61 @@ class Settings(BaseSettings):
     SECRET_KEY: str = "your-super-secret-key"  # Change this in production!
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 3000000
+    PASSWORD_BCRYPT_ROUNDS: int = 12  # Existing hashes are upgraded on next login when this changes
+    PASSWORD_HASH_WORKERS: int = 4  # Threads running bcrypt; also the cap on concurrent hashes
+    PASSWORD_HASH_QUEUE_TIMEOUT: float = 2.0  # Seconds to wait for a free worker before answering 503
+    AUTH_CACHE_SIZE: int = 10_000  # Validated tokens kept in memory
+    AUTH_CACHE_TTL_SECONDS: float = 60  # Upper bound on how stale a cached user can be
+    MEMBERSHIP_CACHE_SIZE: int = 10_000  # Chats (and, separately, users) whose membership is kept in memory
+    MEMBERSHIP_CACHE_TTL_SECONDS: float = 300  # Bounds staleness from membership changes made by other workers
+    RECENT_MESSAGES_PER_CHAT: int = 100  # Newest messages kept per chat for first-page history loads
+    RECENT_MESSAGES_MAX_TOTAL: int = 100_000  # Across all chats; least recently used chats go first
+    RECENT_MESSAGES_TTL_SECONDS: float = 60.0  # Bounds staleness when other workers write to the chat
+    # Token bucket quotas as "tokens per second/burst"
+    RATE_LIMIT_WS_FRAME: str = "30/60"  # Any inbound WebSocket frame, per connection
+    RATE_LIMIT_WS_MESSAGE: str = "5/20"  # new_message frames, per user
+    RATE_LIMIT_WS_TYPING: str = "2/10"  # typing frames, per user
+    RATE_LIMIT_WS_RECEIPT: str = "5/30"  # read_receipt frames, per user
+    RATE_LIMIT_REST_WRITE: str = "2/20"  # Chat create/update/membership/read requests, per user
+    RATE_LIMIT_MAX_KEYS: int = 100_000  # Buckets kept in memory; least recently used are dropped
     DATABASE_URL: str = "sqlite:///./chat.db"
 
     # Database settings
     SQLALCHEMY_DATABASE_URI: str = "sqlite:///./chat.db"
+    # Async driver URL; derived from SQLALCHEMY_DATABASE_URI (aiosqlite/asyncpg) when unset
+    ASYNC_DATABASE_URI: Optional[str] = None
     DB_ECHO_LOG: bool = False
+    AUTO_MIGRATE: bool = True  # Run Alembic migrations to head on startup
+    MESSAGE_BATCH_MAX_SIZE: int = 100  # Messages per write transaction
+    MESSAGE_BATCH_MAX_DELAY_MS: int = 20  # Max wait before flushing a partial batch
+
+    # WebSocket settings
+    WS_SEND_QUEUE_SIZE: int = 256  # Max queued outbound frames per connection
+    WS_BACKPRESSURE_POLICY: str = "coalesce"  # drop_oldest | coalesce | disconnect
+    WS_REPLAY_BUFFER_SIZE: int = 200  # Recent messages kept per chat for resume
+    WS_REPLAY_MAX_CHATS: int = 1000  # Chats with a replay buffer; least recently active are dropped
+    WS_REPLAY_MAX_MESSAGES: int = 500  # Longer gaps are not replayed; the client reloads history instead
+    WS_HEARTBEAT_INTERVAL_SECONDS: float = 25.0  # Each connection is pinged this often
+    WS_HEARTBEAT_MAX_MISSED: int = 2  # Connections silent for this many pings in a row are closed
+    WS_COMPRESSION: bool = True  # Allow clients to opt into deflated frames with ?compress=deflate
+    WS_COMPRESSION_MIN_BYTES: int = 1024  # Smaller frames (typing, presence, acks) are sent as is
+    WS_COMPRESSION_LEVEL: int = 6  # zlib level, 1 (fastest) to 9 (smallest)
+    WS_COMPRESSION_CONTEXT_TAKEOVER: bool = False  # True: better ratio, ~256 KiB of zlib state per socket
+    TYPING_THROTTLE_MS: int = 2000  # Repeated "typing" events are forwarded at most this often
+    TYPING_TIMEOUT_MS: int = 6000  # "Stopped typing" is sent after this long without an event
+    PRESENCE_BATCH_INTERVAL_MS: int = 1000  # Presence changes are sent as one diff per interval
+    PRESENCE_FLUSH_INTERVAL_MS: int = 5000  # is_online/last_seen are written to users this often
+    PRESENCE_HEARTBEAT_TIMEOUT_SECONDS: float = 60.0  # A user with no frames for this long counts as offline
+    READ_RECEIPT_FLUSH_INTERVAL_MS: int = 1000  # Read watermarks are written and broadcast once per interval
+    PENDING_DELIVERY_FLUSH_INTERVAL_MS: int = 500  # Offline members' queue entries and delivered_at stamps are written this often
+    PENDING_DELIVERY_BATCH_SIZE: int = 500  # Messages per "pending_messages" frame sent on connect
+    BROADCAST_BACKEND: str = "memory"  # memory (single worker) | sqlite (several workers on one host)
+    BROADCAST_SQLITE_PATH: str = "./broadcast.db"  # Shared by all workers when BROADCAST_BACKEND=sqlite
+    BROADCAST_POLL_INTERVAL_MS: int = 10  # How often each worker checks for messages from the others
+    FANOUT_CHUNK_SIZE: int = 256  # Rooms with more local members are delivered in chunks of this many
+    FANOUT_WORKERS: int = 4  # Tasks delivering queued chunks, round-robin across rooms
+    SEARCH_BACKEND: str = "fts5"  # fts5 (SQLite); message and chat-name search go through it
+    SEARCH_SNIPPET_TOKENS: int = 12  # Approximate length of the highlighted excerpt in search results
 
     MEDIA_ROOT: str = "media"
     PROFILE_IMAGES_DIR: str = "profile_images"
@@ -1,44 +1,395 @@
-from typing import Dict, Set, List
+from typing import Awaitable, Callable, Deque, Dict, Hashable, Optional, Set, List
+from collections import deque
 from fastapi import WebSocket
+import asyncio
 import json
+import time
 from datetime import datetime
 
+from .codecs import JSON, PreparedFrame
+from .config import settings
+from .fanout import FanoutScheduler
+from .pubsub import PubSubBackend, create_backend, room_channel, user_channel
+from .ratelimit import TokenBucket, parse_quota
+
+# Frames that only describe transient state; safe to shed or coalesce under backpressure
+EPHEMERAL_TYPES = {"typing", "typing_indicator", "presence", "ping"}
+
+# Inbound frames a single connection may send: tokens per second, burst
+FRAME_QUOTA = parse_quota(settings.RATE_LIMIT_WS_FRAME)
+
+class BackpressurePolicy:
+    DROP_OLDEST = "drop_oldest"
+    COALESCE = "coalesce"
+    DISCONNECT = "disconnect"
+
+def coalesce_key(message: dict) -> Optional[Hashable]:
+    """Key under which a newer ephemeral frame supersedes an older queued one"""
+    message_type = message.get("type")
+    if message_type not in EPHEMERAL_TYPES:
+        return None
+    return (message_type, message.get("username"), message.get("chat_id"))
+
+class ClientConnection:
+    """
+    A WebSocket plus its bounded outbound queue.
+
+    Senders only enqueue; a dedicated writer task drains the queue, so a slow
+    receiver never blocks the handler loop of whoever produced the message.
+    Frames are encoded with the connection's codec only when they are sent,
+    and large ones are deflated if the client negotiated compression.
+    """
+
+    def __init__(
+        self,
+        websocket: WebSocket,
+        username: str,
+        max_queue_size: int = settings.WS_SEND_QUEUE_SIZE,
+        policy: str = settings.WS_BACKPRESSURE_POLICY,
+        on_close=None,
+        codec=JSON,
+        compressor=None
+    ):
+        self.websocket = websocket
+        self.username = username
+        self.codec = codec
+        self.compressor = compressor
+        self.max_queue_size = max_queue_size
+        self.policy = policy
+        self.queue: Deque[PreparedFrame] = deque()
+        self.dropped_count = 0
+        self.closed = False
+        self.last_received = time.monotonic()
+        self.last_ping_at = self.last_received
+        self.missed_pings = 0
+        self.heartbeat_slot: Optional[int] = None
+        self.frame_bucket = TokenBucket(FRAME_QUOTA[1], self.last_received)
+        self._on_close = on_close
+        self._pending = asyncio.Event()
+        self._writer: Optional[asyncio.Task] = None
+        # id(frame) -> future resolved once that frame has been written, or not
+        self._waiters: Dict[int, asyncio.Future] = {}
+
+    @property
+    def queue_depth(self) -> int:
+        return len(self.queue)
+
+    def start(self):
+        self._writer = asyncio.create_task(self._drain())
+
+    def mark_alive(self):
+        """Record that the client sent something; it answers any outstanding ping"""
+        self.last_received = time.monotonic()
+
+    def take_frame(self) -> float:
+        """Charge one inbound frame to this connection; returns seconds to wait if over quota"""
+        return self.frame_bucket.take(*FRAME_QUOTA, time.monotonic())
+
+    def enqueue(self, message) -> bool:
+        """
+        Queue a frame (a dict, or a shared PreparedFrame/PersonalFrame) without
+        blocking. Returns False if it was not queued.
+        """
+        if self.closed:
+            return False
+        frame = PreparedFrame(message) if isinstance(message, dict) else message
+
+        if self.policy == BackpressurePolicy.COALESCE:
+            key = coalesce_key(frame.message)
+            if key is not None and self._replace_queued(key, frame):
+                return True
+
+        if len(self.queue) >= self.max_queue_size and not self._make_room(frame.message):
+            return False
+
+        self.queue.append(frame)
+        self._pending.set()
+        return True
+
+    async def send(self, message: dict) -> bool:
+        """
+        Queue a frame and wait until the writer task has put it on the socket.
+
+        Returns False if it was not queued, was shed, or the connection closed
+        before it went out.
+        """
+        frame = PreparedFrame(message)
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters[id(frame)] = waiter
+        if not self.enqueue(frame):
+            self._settle(frame, False)
+        return await waiter
+
+    def _settle(self, frame, sent: bool):
+        waiter = self._waiters.pop(id(frame), None)
+        if waiter is not None and not waiter.done():
+            waiter.set_result(sent)
+
+    def _replace_queued(self, key: Hashable, frame) -> bool:
+        for index, queued in enumerate(self.queue):
+            if coalesce_key(queued.message) == key:
+                self._settle(queued, False)
+                self.queue[index] = frame
+                return True
+        return False
+
+    def _make_room(self, message: dict) -> bool:
+        """Apply the backpressure policy to a full queue"""
+        if self.policy != BackpressurePolicy.DISCONNECT:
+            for queued in self.queue:
+                if queued.message.get("type") in EPHEMERAL_TYPES:
+                    self.queue.remove(queued)
+                    self._settle(queued, False)
+                    self.dropped_count += 1
+                    return True
+            if message.get("type") in EPHEMERAL_TYPES:
+                self.dropped_count += 1
+                return False
+
+        # Nothing left to shed: the client cannot keep up, cut it loose
+        print(f"Send queue overflow for {self.username}, disconnecting")
+        asyncio.create_task(self.close())
+        return False
+
+    async def _drain(self):
+        try:
+            while not self.closed:
+                if not self.queue:
+                    self._pending.clear()
+                    await self._pending.wait()
+                    continue
+                frame = self.queue.popleft()
+                if self.compressor is not None:
+                    data = self.compressor.prepare(frame, self.codec)
+                else:
+                    data = frame.encode(self.codec)
+                if isinstance(data, str):
+                    await self.websocket.send_text(data)
+                else:
+                    await self.websocket.send_bytes(data)
+                if self._waiters:
+                    self._settle(frame, True)
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            print(f"Send error for {self.username}: {str(e)}")
+            await self.close()
+
+    async def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        self.queue.clear()
+        for waiter in self._waiters.values():
+            if not waiter.done():
+                waiter.set_result(False)
+        self._waiters.clear()
+        if self._writer is not None and self._writer is not asyncio.current_task():
+            self._writer.cancel()
+        try:
+            await self.websocket.close()
+        except Exception:
+            pass
+        if self._on_close is not None:
+            await self._on_close(self)
+
 class ConnectionManager:
-    def __init__(self):
-        self.active_connections: Dict[str, WebSocket] = {}
+    """
+    Sockets connected to this worker, and the rooms they are in.
+
+    Broadcasts go through a pub/sub backend so that members connected to
+    other workers receive them too; the backend hands every message for a room
+    this worker is subscribed to back to _dispatch for local fan-out.
+    A user may have several connections (one per device); each receives
+    everything sent to the user, and the user stays in their rooms until the
+    last one closes. Every opened and closed connection is reported to the
+    optional presence registry, so such a user stays online until then too.
+    With a heartbeat wheel, connections that stop answering pings are closed.
+    Deliveries to large rooms are chunked by the fan-out scheduler.
+    """
+
+    def __init__(
+        self,
+        backend: Optional[PubSubBackend] = None,
+        presence=None,
+        heartbeat=None,
+        fanout: Optional[FanoutScheduler] = None
+    ):
+        # username -> that user's open connections, oldest first
+        self.active_connections: Dict[str, List[ClientConnection]] = {}
         self.user_rooms: Dict[str, Set[int]] = {}
+        # Reverse index of user_rooms so a broadcast only touches the room's members
+        self.room_members: Dict[int, Set[str]] = {}
+        self.channel_handlers: Dict[str, Callable[[dict], Awaitable[None]]] = {}
+        self.backend = backend or create_backend()
+        self.backend.on_message = self._dispatch
+        self.presence = presence
+        self.heartbeat = heartbeat
+        self.fanout = fanout or FanoutScheduler()
         
-    async def connect(self, websocket: WebSocket, username: str):
-        await websocket.accept()
-        self.active_connections[username] = websocket
-        
-    async def disconnect(self, username: str):
-        """Safely handle disconnection"""
-        if username in self.active_connections:
-            websocket = self.active_connections.pop(username)
-            try:
-                await websocket.close()
-            except Exception:
-                pass
-        self.user_rooms.pop(username, None)
+    async def connect(
+        self,
+        websocket: WebSocket,
+        username: str,
+        codec=JSON,
+        subprotocol: Optional[str] = None,
+        compressor=None
+    ):
+        if subprotocol is not None:
+            await websocket.accept(subprotocol=subprotocol)
+        else:
+            await websocket.accept()
+        await self.backend.start()
+        connection = ClientConnection(
+            websocket, username, on_close=self._connection_closed, codec=codec, compressor=compressor
+        )
+        self.active_connections.setdefault(username, []).append(connection)
+        connection.start()
+        if self.heartbeat is not None:
+            self.heartbeat.add(connection)
+        if self.presence is not None:
+            await self.presence.connected(username)
+        # One reference per connection; the node subscribes on the first
+        await self.backend.subscribe(user_channel(username))
+        return connection
+
+    async def disconnect(self, username: str, websocket: Optional[WebSocket] = None):
+        """Close one of a user's sockets, or all of them if websocket is not given"""
+        connections = self.active_connections.get(username)
+        if not connections:
+            await self._forget_rooms(username)
+            return
+        for connection in list(connections):
+            if websocket is None or connection.websocket is websocket:
+                await connection.close()
+
+    async def _connection_closed(self, connection: ClientConnection):
+        if self.heartbeat is not None:
+            self.heartbeat.remove(connection)
+        if self.presence is not None:
+            await self.presence.disconnected(connection.username)
+        connections = self.active_connections.get(connection.username, [])
+        if connection in connections:
+            connections.remove(connection)
+            await self.backend.unsubscribe(user_channel(connection.username))
+            if not connections:
+                del self.active_connections[connection.username]
+                await self._forget_rooms(connection.username)
+
+    async def _forget_rooms(self, username: str):
+        for chat_id in self.user_rooms.pop(username, ()):
+            await self._remove_room_member(chat_id, username)
         
     async def join_room(self, username: str, chat_id: int):
-        if username not in self.user_rooms:
-            self.user_rooms[username] = set()
-        self.user_rooms[username].add(chat_id)
+        rooms = self.user_rooms.setdefault(username, set())
+        if chat_id in rooms:
+            return
+        rooms.add(chat_id)
+        self.room_members.setdefault(chat_id, set()).add(username)
+        # One reference per local member; the node subscribes on the first
+        await self.backend.subscribe(room_channel(chat_id))
         
     async def leave_room(self, username: str, chat_id: int):
         if username in self.user_rooms:
-            self.user_rooms[username].remove(chat_id)
+            self.user_rooms[username].discard(chat_id)
+        await self._remove_room_member(chat_id, username)
+
+    async def _remove_room_member(self, chat_id: int, username: str):
+        members = self.room_members.get(chat_id)
+        if members is None or username not in members:
+            return
+        members.discard(username)
+        if not members:
+            del self.room_members[chat_id]
+        await self.backend.unsubscribe(room_channel(chat_id))
             
-    async def broadcast_to_room(self, chat_id: int, message: dict):
-        for username, rooms in self.user_rooms.items():
-            if chat_id in rooms and username in self.active_connections:
-                await self.active_connections[username].send_json(message)
+    async def broadcast_to_room(
+        self,
+        chat_id: int,
+        message: dict,
+        exclude_user: Optional[str] = None,
+        personal: Optional[Dict[str, dict]] = None
+    ):
+        """
+        Deliver to the room's members on every worker, optionally skipping one user.
+
+        personal maps usernames to extra top-level fields only they receive;
+        the shared part of the frame is still encoded once.
+        """
+        envelope = {"message": message, "exclude_user": exclude_user}
+        if personal:
+            envelope["personal"] = personal
+        await self.backend.publish(room_channel(chat_id), envelope)
 
     async def send_personal_message(self, username: str, message: dict):
-        if username in self.active_connections:
-            await self.active_connections[username].send_json(message)
+        connections = self.active_connections.get(username)
+        if connections:
+            frame = PreparedFrame(message)
+            for connection in connections:
+                connection.enqueue(frame)
+        else:
+            # The user may be connected to another worker
+            await self.backend.publish(user_channel(username), message)
+
+    async def add_channel_handler(self, channel: str, handler):
+        """Route a custom channel's messages to handler(message) instead of to sockets"""
+        self.channel_handlers[channel] = handler
+        await self.backend.subscribe(channel)
+
+    async def _dispatch(self, channel: str, message: dict):
+        """
+        Fan a message from the backend out to the sockets on this worker.
+
+        Room channels carry {"message": ..., "exclude_user": ..., "personal": ...}
+        envelopes; user channels carry the frame itself.
+        """
+        handler = self.channel_handlers.get(channel)
+        if handler is not None:
+            await handler(message)
+            return
+        kind, _, target = channel.partition(":")
+        if kind == "room":
+            self._deliver_to_room(
+                int(target), message["message"], message.get("exclude_user"), message.get("personal")
+            )
+        elif kind == "user":
+            frame = PreparedFrame(message)
+            for connection in self.active_connections.get(target, ()):
+                connection.enqueue(frame)
+
+    def _deliver_to_room(
+        self,
+        chat_id: int,
+        message: dict,
+        exclude_user: Optional[str] = None,
+        personal: Optional[Dict[str, dict]] = None
+    ):
+        members = self.room_members.get(chat_id)
+        if not members:
+            return
+        # Enqueue only; each connection's writer task does the actual send,
+        # encoding the shared frame at most once per codec
+        frame = PreparedFrame(message)
+
+        def deliver(usernames):
+            for username in usernames:
+                if username == exclude_user:
+                    continue
+                connections = self.active_connections.get(username)
+                if not connections:
+                    continue
+                user_frame = frame.personalize(personal[username]) if personal and username in personal else frame
+                for connection in connections:
+                    connection.enqueue(user_frame)
+
+        self.fanout.submit(chat_id, members, deliver)
+
+    def queue_depths(self) -> Dict[str, int]:
+        """Outbound queue depth per connected user, summed over their connections"""
+        return {
+            username: sum(connection.queue_depth for connection in connections)
+            for username, connections in self.active_connections.items()
+        }
 
 class CallManager:
     def __init__(self):
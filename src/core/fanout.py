@@ -0,0 +1,164 @@
+import asyncio
+import time
+from collections import OrderedDict, deque
+from typing import Callable, Collection, Deque, Dict, List, Optional
+
+from .config import settings
+
+# deliver(usernames) enqueues the broadcast for those local members
+Deliver = Callable[[List[str]], None]
+
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    """Nearest-rank percentile of an already sorted list"""
+    index = min(len(sorted_values) - 1, max(0, round(fraction * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+class FanoutJob:
+    __slots__ = ("chat_id", "members", "deliver", "started", "offset")
+
+    def __init__(self, chat_id: int, members: List[str], deliver: Deliver, started: float):
+        self.chat_id = chat_id
+        self.members = members
+        self.deliver = deliver
+        self.started = started
+        self.offset = 0
+
+
+class FanoutScheduler:
+    """
+    Spreads broadcasts to big rooms over a pool of worker tasks.
+
+    A room with at most chunk_size local members is delivered inline, as
+    before. A bigger one is split into chunks of chunk_size members and
+    queued under its room; workers serve the rooms with queued work in
+    round-robin order, one chunk per turn, and yield to the event loop after
+    each chunk. A 10k-member channel then advances alongside every other busy
+    room instead of holding the loop for the whole send, and small rooms
+    never wait behind it. Broadcasts to the same room keep their order: once
+    a room has queued work, smaller sends to it queue behind that work.
+
+    Fan-out latency, from submission until the last chunk is enqueued, is
+    sampled per room for the most recently active max_rooms rooms.
+    """
+
+    def __init__(
+        self,
+        chunk_size: int = settings.FANOUT_CHUNK_SIZE,
+        workers: int = settings.FANOUT_WORKERS,
+        max_rooms: int = 1000,
+        samples_per_room: int = 256,
+        clock=time.perf_counter
+    ):
+        self.chunk_size = chunk_size
+        self.worker_count = workers
+        self.max_rooms = max_rooms
+        self.samples_per_room = samples_per_room
+        self.clock = clock
+        self.inline = 0
+        self.queued = 0
+        self.chunks = 0
+        self._rooms: Dict[int, Deque[FanoutJob]] = {}
+        self._ready: Deque[int] = deque()
+        self._latencies: "OrderedDict[int, Deque[float]]" = OrderedDict()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._workers: List[asyncio.Task] = []
+
+    @property
+    def backlog(self) -> int:
+        """Members still waiting across all queued broadcasts"""
+        return sum(len(job.members) - job.offset for jobs in self._rooms.values() for job in jobs)
+
+    def submit(self, chat_id: int, members: Collection[str], deliver: Deliver):
+        started = self.clock()
+        if len(members) <= self.chunk_size and chat_id not in self._rooms:
+            deliver(members)
+            self.inline += 1
+            self._record(chat_id, started)
+            return
+        jobs = self._rooms.get(chat_id)
+        if jobs is None:
+            jobs = self._rooms[chat_id] = deque()
+            self._ready.append(chat_id)
+        # A snapshot: members joining or leaving meanwhile don't disturb the chunking
+        jobs.append(FanoutJob(chat_id, list(members), deliver, started))
+        self.queued += 1
+        self._start()
+        self._wakeup.set()
+
+    def run_chunk(self) -> bool:
+        """Deliver the next chunk of the room whose turn it is; False if there was none"""
+        if not self._ready:
+            return False
+        chat_id = self._ready.popleft()
+        jobs = self._rooms[chat_id]
+        job = jobs[0]
+        end = job.offset + self.chunk_size
+        chunk = job.members[job.offset:end]
+        job.offset = end
+        try:
+            job.deliver(chunk)
+        except Exception as e:
+            print(f"Fan-out error in chat {chat_id}: {str(e)}")
+        self.chunks += 1
+        if job.offset >= len(job.members):
+            jobs.popleft()
+            self._record(chat_id, job.started)
+        if jobs:
+            self._ready.append(chat_id)
+        else:
+            del self._rooms[chat_id]
+        return True
+
+    async def stop(self):
+        """Finish every queued broadcast, then stop the workers"""
+        while self.run_chunk():
+            pass
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    def latency(self, chat_id: Optional[int] = None) -> Dict[str, float]:
+        """Fan-out latency percentiles in milliseconds for one room, or over all sampled rooms"""
+        if chat_id is None:
+            values = [value for samples in self._latencies.values() for value in samples]
+        else:
+            values = list(self._latencies.get(chat_id, ()))
+        if not values:
+            return {"count": 0}
+        values.sort()
+        return {
+            "count": len(values),
+            "p50": round(percentile(values, 0.50) * 1000, 3),
+            "p95": round(percentile(values, 0.95) * 1000, 3),
+            "p99": round(percentile(values, 0.99) * 1000, 3),
+            "max": round(values[-1] * 1000, 3)
+        }
+
+    def _record(self, chat_id: int, started: float):
+        samples = self._latencies.get(chat_id)
+        if samples is None:
+            samples = self._latencies[chat_id] = deque(maxlen=self.samples_per_room)
+            if len(self._latencies) > self.max_rooms:
+                self._latencies.popitem(last=False)
+        else:
+            self._latencies.move_to_end(chat_id)
+        samples.append(self.clock() - started)
+
+    def _start(self):
+        self._workers = [worker for worker in self._workers if not worker.done()]
+        if not self._workers:
+            self._wakeup = asyncio.Event()
+        while len(self._workers) < self.worker_count:
+            self._workers.append(asyncio.create_task(self._run()))
+
+    async def _run(self):
+        while True:
+            if not self.run_chunk():
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+            # Let receive loops, inline sends and the other workers run between chunks
+            await asyncio.sleep(0)
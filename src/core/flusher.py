@@ -0,0 +1,53 @@
+import asyncio
+from abc import ABC, abstractmethod
+from typing import Optional
+
+
+class DebouncedFlusher(ABC):
+    """
+    Buffers work in memory and writes it out at most once per interval.
+
+    Subclasses keep their own buffer, call schedule() whenever something is
+    added to it and implement flush(). The first schedule() after a flush
+    starts the interval; everything that arrives before it ends goes out in
+    the same flush. A flush that raises is logged and the loop carries on, so
+    flush() should put back whatever it could not write.
+    """
+
+    def __init__(self, interval_ms: int):
+        self.interval = interval_ms / 1000
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+
+    def schedule(self):
+        """Flush at the end of the current interval, starting one if none is running"""
+        self.start()
+        self._wakeup.set()
+
+    async def stop(self):
+        """Stop the background task and flush whatever is still buffered"""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await self.flush()
+
+    @abstractmethod
+    async def flush(self):
+        """Write out everything buffered so far"""
+
+    async def _run(self):
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+            # Let the rest of the interval's work pile up first
+            await asyncio.sleep(self.interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                print(f"{type(self).__name__} flush error: {str(e)}")
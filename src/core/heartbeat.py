@@ -0,0 +1,89 @@
+import asyncio
+import time
+from typing import List, Optional, Set
+
+from .config import settings
+
+
+class HeartbeatWheel:
+    """
+    Pings every connection once per interval and reaps the ones that stop answering.
+
+    Connections are spread over the slots of a single timer wheel that one
+    task advances every interval / slots seconds, checking only the slot it
+    lands on; there is no per-socket timer. At its turn a connection that has
+    sent nothing since its previous ping counts a miss, and after max_missed
+    misses in a row it is closed, which removes it from the connection tables
+    like any other disconnect. Any inbound frame (including the client's
+    {"type": "pong"}) counts as an answer.
+    """
+
+    def __init__(
+        self,
+        interval: float = settings.WS_HEARTBEAT_INTERVAL_SECONDS,
+        max_missed: int = settings.WS_HEARTBEAT_MAX_MISSED,
+        slots: int = 50
+    ):
+        self.interval = interval
+        self.max_missed = max_missed
+        self.tick = interval / slots
+        self.slots: List[Set] = [set() for _ in range(slots)]
+        self.position = 0
+        self.pings = 0
+        self.reaped = 0
+        self._task: Optional[asyncio.Task] = None
+
+    def __len__(self) -> int:
+        return sum(len(slot) for slot in self.slots)
+
+    def add(self, connection):
+        # The slot just behind the hand comes round last: a full interval from now
+        slot = (self.position - 1) % len(self.slots)
+        self.slots[slot].add(connection)
+        connection.heartbeat_slot = slot
+        # Nothing is owed before the first ping
+        connection.last_ping_at = connection.last_received = time.monotonic()
+        connection.missed_pings = 0
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    def remove(self, connection):
+        if connection.heartbeat_slot is not None:
+            self.slots[connection.heartbeat_slot].discard(connection)
+            connection.heartbeat_slot = None
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def advance(self) -> int:
+        """Move the hand one slot and check its connections; returns how many were reaped"""
+        self.position = (self.position + 1) % len(self.slots)
+        now = time.monotonic()
+        reaped = 0
+        for connection in list(self.slots[self.position]):
+            if connection.last_received >= connection.last_ping_at:
+                connection.missed_pings = 0
+            else:
+                connection.missed_pings += 1
+                if connection.missed_pings >= self.max_missed:
+                    print(f"Reaping {connection.username}: {connection.missed_pings} heartbeats missed")
+                    self.remove(connection)
+                    await connection.close()
+                    reaped += 1
+                    continue
+            connection.last_ping_at = now
+            connection.enqueue({"type": "ping"})
+            self.pings += 1
+        self.reaped += reaped
+        return reaped
+
+    async def _run(self):
+        while any(self.slots):
+            await asyncio.sleep(self.tick)
+            try:
+                await self.advance()
+            except Exception as e:
+                print(f"Heartbeat error: {str(e)}")
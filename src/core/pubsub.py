@@ -0,0 +1,205 @@
+import asyncio
+import json
+import time
+import uuid
+from abc import ABC, abstractmethod
+from typing import Awaitable, Callable, Dict, Optional, Set
+
+import aiosqlite
+
+from .config import settings
+
+MessageHandler = Callable[[str, dict], Awaitable[None]]
+
+
+def room_channel(chat_id: int) -> str:
+    return f"room:{chat_id}"
+
+
+def user_channel(username: str) -> str:
+    return f"user:{username}"
+
+
+class PubSubBackend(ABC):
+    """
+    Broadcast bus between the worker processes of one deployment.
+
+    The interface mirrors Redis pub/sub (publish / subscribe / unsubscribe by
+    channel name) so a Redis backend can be dropped in later. Subscriptions
+    are reference-counted: every local socket in a room takes a reference, but
+    the node subscribes to the room's channel once and receives each message
+    once, then fans it out locally through on_message.
+    """
+
+    def __init__(self, node_id: Optional[str] = None):
+        self.node_id = node_id or uuid.uuid4().hex
+        self.on_message: Optional[MessageHandler] = None
+        self._refcounts: Dict[str, int] = {}
+
+    @property
+    def channels(self) -> Set[str]:
+        return set(self._refcounts)
+
+    def subscribed(self, channel: str) -> bool:
+        return channel in self._refcounts
+
+    async def subscribe(self, channel: str):
+        count = self._refcounts.get(channel, 0)
+        self._refcounts[channel] = count + 1
+        if count == 0:
+            await self._subscribe_channel(channel)
+
+    async def unsubscribe(self, channel: str):
+        count = self._refcounts.get(channel)
+        if count is None:
+            return
+        if count > 1:
+            self._refcounts[channel] = count - 1
+            return
+        del self._refcounts[channel]
+        await self._unsubscribe_channel(channel)
+
+    @abstractmethod
+    async def publish(self, channel: str, message: dict):
+        """Deliver message to every node subscribed to channel, this one included"""
+
+    async def start(self):
+        pass
+
+    async def stop(self):
+        pass
+
+    async def _subscribe_channel(self, channel: str):
+        pass
+
+    async def _unsubscribe_channel(self, channel: str):
+        pass
+
+    async def _dispatch(self, channel: str, message: dict):
+        if self.on_message is not None and channel in self._refcounts:
+            await self.on_message(channel, message)
+
+
+class MemoryBackend(PubSubBackend):
+    """Single-process bus: publishing hands the message straight to this node"""
+
+    async def publish(self, channel: str, message: dict):
+        await self._dispatch(channel, message)
+
+
+class SQLiteBackend(PubSubBackend):
+    """
+    Multi-process bus on a shared SQLite file, for deployments without Redis.
+
+    Every node appends to one table and polls it for rows written by other
+    nodes since its last read; rows for channels the node is not subscribed to
+    are skipped. Local subscribers are served immediately on publish.
+    """
+
+    def __init__(
+        self,
+        path: str = settings.BROADCAST_SQLITE_PATH,
+        poll_interval_ms: int = settings.BROADCAST_POLL_INTERVAL_MS,
+        retention_seconds: float = 60,
+        node_id: Optional[str] = None
+    ):
+        super().__init__(node_id)
+        self.path = path
+        self.poll_interval = poll_interval_ms / 1000
+        self.retention_seconds = retention_seconds
+        self.published = 0
+        self.received = 0
+        self._db: Optional[aiosqlite.Connection] = None
+        self._last_id = 0
+        self._poller: Optional[asyncio.Task] = None
+        self._started: Optional[asyncio.Future] = None
+
+    async def start(self):
+        if self._started is None:
+            self._started = asyncio.get_running_loop().create_future()
+            try:
+                await self._open()
+            except Exception as e:
+                self._started.set_exception(e)
+                self._started = None
+                raise
+            self._started.set_result(None)
+        await self._started
+
+    async def _open(self):
+        self._db = await aiosqlite.connect(self.path)
+        await self._db.execute("PRAGMA journal_mode=WAL")
+        await self._db.execute("PRAGMA busy_timeout=5000")
+        await self._db.execute(
+            "CREATE TABLE IF NOT EXISTS pubsub_messages ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, "
+            "channel TEXT NOT NULL, "
+            "origin TEXT NOT NULL, "
+            "payload TEXT NOT NULL, "
+            "created_at REAL NOT NULL)"
+        )
+        await self._db.commit()
+        # Only messages published after this node came up are of interest
+        async with self._db.execute("SELECT COALESCE(MAX(id), 0) FROM pubsub_messages") as cursor:
+            self._last_id = (await cursor.fetchone())[0]
+        self._poller = asyncio.create_task(self._poll())
+
+    async def stop(self):
+        if self._poller is not None:
+            self._poller.cancel()
+            await asyncio.gather(self._poller, return_exceptions=True)
+            self._poller = None
+        if self._db is not None:
+            await self._db.close()
+            self._db = None
+        self._started = None
+
+    async def publish(self, channel: str, message: dict):
+        await self.start()
+        await self._db.execute(
+            "INSERT INTO pubsub_messages (channel, origin, payload, created_at) VALUES (?, ?, ?, ?)",
+            (channel, self.node_id, json.dumps(message, default=str), time.time())
+        )
+        await self._db.commit()
+        self.published += 1
+        await self._dispatch(channel, message)
+
+    async def _poll(self):
+        polls = 0
+        while True:
+            try:
+                async with self._db.execute(
+                    "SELECT id, channel, payload FROM pubsub_messages "
+                    "WHERE id > ? AND origin != ? ORDER BY id",
+                    (self._last_id, self.node_id)
+                ) as cursor:
+                    rows = await cursor.fetchall()
+                for row_id, channel, payload in rows:
+                    self._last_id = row_id
+                    if self.subscribed(channel):
+                        self.received += 1
+                        await self._dispatch(channel, json.loads(payload))
+
+                polls += 1
+                if polls % 1000 == 0:
+                    await self._prune()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Pub/sub poll error: {str(e)}")
+            await asyncio.sleep(self.poll_interval)
+
+    async def _prune(self):
+        await self._db.execute(
+            "DELETE FROM pubsub_messages WHERE created_at < ?",
+            (time.time() - self.retention_seconds,)
+        )
+        await self._db.commit()
+
+
+def create_backend(name: str = settings.BROADCAST_BACKEND) -> PubSubBackend:
+    if name == "memory":
+        return MemoryBackend()
+    if name == "sqlite":
+        return SQLiteBackend()
+    raise ValueError(f"Unknown broadcast backend: {name}")
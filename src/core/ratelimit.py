@@ -0,0 +1,88 @@
+import time
+from collections import OrderedDict
+from typing import Dict, Hashable, Optional, Tuple
+
+from .config import settings
+
+
+def parse_quota(spec: str) -> Tuple[float, float]:
+    """ "rate/burst" -> (tokens per second, bucket size)"""
+    rate, _, burst = spec.partition("/")
+    return float(rate), float(burst or rate)
+
+
+class TokenBucket:
+    """Refills at rate tokens per second up to burst; each allowed event takes one"""
+
+    __slots__ = ("tokens", "updated")
+
+    def __init__(self, burst: float, now: float):
+        self.tokens = burst
+        self.updated = now
+
+    def take(self, rate: float, burst: float, now: float, cost: float = 1.0) -> float:
+        """0 if the event is allowed, else how many seconds until it would be"""
+        self.tokens = min(burst, self.tokens + (now - self.updated) * rate)
+        self.updated = now
+        if self.tokens >= cost:
+            self.tokens -= cost
+            return 0.0
+        return (cost - self.tokens) / rate
+
+
+class RateLimiter:
+    """
+    Token buckets per (scope, key), e.g. ("ws_message", username).
+
+    A check is a dict lookup and a little arithmetic. At most max_keys
+    buckets are kept; the least recently used is dropped first, which at
+    worst lets an idle key start over with a full bucket.
+    """
+
+    def __init__(
+        self,
+        quotas: Dict[str, Tuple[float, float]],
+        max_keys: int = settings.RATE_LIMIT_MAX_KEYS,
+        clock=time.monotonic
+    ):
+        self.quotas = quotas
+        self.max_keys = max_keys
+        self.clock = clock
+        self.limited: Dict[str, int] = {scope: 0 for scope in quotas}
+        self._buckets: "OrderedDict[Tuple[str, Hashable], TokenBucket]" = OrderedDict()
+
+    def check(self, scope: str, key: Hashable, cost: float = 1.0) -> Optional[float]:
+        """None if allowed, else the seconds to wait before retrying"""
+        quota = self.quotas.get(scope)
+        if quota is None:
+            return None
+        rate, burst = quota
+        now = self.clock()
+        bucket_key = (scope, key)
+        bucket = self._buckets.get(bucket_key)
+        if bucket is None:
+            bucket = self._buckets[bucket_key] = TokenBucket(burst, now)
+            if len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(bucket_key)
+        retry_after = bucket.take(rate, burst, now, cost)
+        if retry_after:
+            self.limited[scope] += 1
+            return retry_after
+        return None
+
+
+# WebSocket frame types that count against a per-user quota
+FRAME_SCOPES = {
+    "new_message": "ws_message",
+    "typing": "ws_typing",
+    "read_receipt": "ws_receipt",
+}
+
+rate_limiter = RateLimiter({
+    "ws_message": parse_quota(settings.RATE_LIMIT_WS_MESSAGE),
+    "ws_typing": parse_quota(settings.RATE_LIMIT_WS_TYPING),
+    "ws_receipt": parse_quota(settings.RATE_LIMIT_WS_RECEIPT),
+    "rest_write": parse_quota(settings.RATE_LIMIT_REST_WRITE),
+})
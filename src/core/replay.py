@@ -0,0 +1,49 @@
+from collections import OrderedDict, deque
+from typing import Deque, List, Optional
+
+from .config import settings
+
+
+class ReplayBuffer:
+    """
+    Ring buffer of the latest message frames of each recently active chat.
+
+    Resuming clients are served from here when the buffer still holds every
+    message they missed; otherwise since() returns None and the caller reads
+    the gap from the database.
+    """
+
+    def __init__(
+        self,
+        per_chat: int = settings.WS_REPLAY_BUFFER_SIZE,
+        max_chats: int = settings.WS_REPLAY_MAX_CHATS
+    ):
+        self.per_chat = per_chat
+        self.max_chats = max_chats
+        self.hits = 0
+        self.misses = 0
+        self._chats: "OrderedDict[int, Deque[dict]]" = OrderedDict()
+
+    def append(self, chat_id: int, message: dict):
+        """Record a new_message payload; payloads must carry their seq"""
+        ring = self._chats.get(chat_id)
+        if ring is None:
+            ring = self._chats[chat_id] = deque(maxlen=self.per_chat)
+            while len(self._chats) > self.max_chats:
+                self._chats.popitem(last=False)
+        else:
+            self._chats.move_to_end(chat_id)
+            if ring and message["seq"] != ring[-1]["seq"] + 1:
+                # Something was stored without passing through here; start over from this one
+                ring.clear()
+        ring.append(message)
+
+    def since(self, chat_id: int, after_seq: int, up_to_seq: int) -> Optional[List[dict]]:
+        """Messages after_seq < seq <= up_to_seq, or None unless all of them are buffered"""
+        ring = self._chats.get(chat_id)
+        if not ring or ring[0]["seq"] > after_seq + 1 or ring[-1]["seq"] < up_to_seq:
+            self.misses += 1
+            return None
+        self.hits += 1
+        start = after_seq + 1 - ring[0]["seq"]
+        return [ring[i] for i in range(max(start, 0), up_to_seq - ring[0]["seq"] + 1)]
@@ -1,9 +1,25 @@
 from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from typing import Generator
 from ..core.config import settings
 
+# Async drivers for the sync URLs we accept in settings
+ASYNC_DRIVERS = {
+    "sqlite": "sqlite+aiosqlite",
+    "postgresql": "postgresql+asyncpg",
+}
+
+def to_async_url(url: str) -> str:
+    """Swap a sync database URL onto its async driver (sqlite -> aiosqlite, postgresql -> asyncpg)"""
+    parsed = make_url(url)
+    backend = parsed.get_backend_name()
+    if parsed.drivername in ASYNC_DRIVERS.values() or backend not in ASYNC_DRIVERS:
+        return url
+    return parsed.set(drivername=ASYNC_DRIVERS[backend]).render_as_string(hide_password=False)
+
 # Create SQLAlchemy engine
 engine = create_engine(
     settings.SQLALCHEMY_DATABASE_URI,
@@ -14,6 +30,20 @@ engine = create_engine(
 # Create SessionLocal class
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Async engine used by request handlers, so queries never block the event loop
+async_engine = create_async_engine(
+    settings.ASYNC_DATABASE_URI or to_async_url(settings.SQLALCHEMY_DATABASE_URI),
+    pool_pre_ping=True,
+    echo=settings.DB_ECHO_LOG
+)
+
+# Objects stay usable after commit; lazy refreshes are not possible on AsyncSession
+AsyncSessionLocal = async_sessionmaker(
+    bind=async_engine,
+    autoflush=False,
+    expire_on_commit=False
+)
+
 # Create declarative base
 Base = declarative_base()
 
@@ -0,0 +1,35 @@
+from pathlib import Path
+from typing import Optional
+
+from alembic import command
+from alembic.config import Config
+from sqlalchemy import create_engine, inspect
+
+from ..core.config import settings
+from .base import engine
+
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+
+# Revision matching the schema that Base.metadata.create_all used to produce
+INITIAL_REVISION = "613960057ce5"
+
+
+def get_alembic_config(url: Optional[str] = None) -> Config:
+    config = Config(str(PROJECT_ROOT / "alembic.ini"))
+    config.set_main_option("script_location", str(PROJECT_ROOT / "migrations"))
+    config.attributes["url"] = url or settings.SQLALCHEMY_DATABASE_URI
+    config.attributes["configure_logger"] = False
+    return config
+
+
+def run_migrations(url: Optional[str] = None):
+    """Bring the database schema up to the latest migration"""
+    config = get_alembic_config(url)
+
+    target = engine if url is None else create_engine(url)
+    tables = set(inspect(target).get_table_names())
+    if "users" in tables and "alembic_version" not in tables:
+        # Database was created by create_all before migrations existed
+        command.stamp(config, INITIAL_REVISION)
+
+    command.upgrade(config, "head")
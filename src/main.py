@@ -2,22 +2,25 @@ from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from .core.config import settings
 from .api.endpoints import auth, ws, users, chat
-from .db.base import Base, engine
+from .db.migrations import run_migrations
 from .models.associations import chat_users
 from .models.user import User
 from .models.chat import Chat
+from .models.chat_summary import ChatSummary
 from .models.message import Message
+from .models.pending_delivery import PendingDelivery
 from .models.call import Call
+from .core.security import password_hasher
+from .services.message_writer import message_writer
+from .api.websockets.chat import chat_ws
 from fastapi.staticfiles import StaticFiles
 
 
-# Create database tables
 app = FastAPI(
     title=settings.PROJECT_NAME,
     version=settings.VERSION,
 )
 
-Base.metadata.create_all(bind=engine)
 # Configure CORS
 app.add_middleware(
     CORSMiddleware,
@@ -41,6 +44,27 @@ app.mount("/static", StaticFiles(directory="static", html=True), name="static")
 import os
 os.makedirs("uploads", exist_ok=True)
 os.makedirs("static", exist_ok=True)
+@app.on_event("startup")
+def apply_migrations():
+    if settings.AUTO_MIGRATE:
+        run_migrations()
+
+@app.on_event("startup")
+async def start_chat_websocket():
+    await chat_ws.start()
+
+@app.on_event("shutdown")
+async def flush_message_writer():
+    await message_writer.stop()
+
+@app.on_event("shutdown")
+def stop_password_hasher():
+    password_hasher.shutdown()
+
+@app.on_event("shutdown")
+async def stop_chat_websocket():
+    await chat_ws.shutdown()
+
 @app.get("/")
 async def root():
     return {"message": "Welcome to FastAPI Chat API"}
@@ -1,9 +1,11 @@
-from sqlalchemy import Column, Integer, ForeignKey, Table, String
+from sqlalchemy import Column, Integer, ForeignKey, Table, String, Index
 from ..db.base import Base
 
 chat_users = Table(
     'chat_users',
     Base.metadata,
     Column('username', String, ForeignKey('users.username'), primary_key=True),
-    Column('chat_id', Integer, ForeignKey('chats.id'), primary_key=True)
+    Column('chat_id', Integer, ForeignKey('chats.id'), primary_key=True),
+    # The primary key only serves lookups by username; members of a chat need their own index
+    Index('ix_chat_users_chat_id', 'chat_id')
 )
\ No newline at end of file
@@ -25,9 +25,9 @@ class Call(Base):
     ended_at = Column(DateTime, nullable=True)
     duration = Column(Integer, nullable=True)  # Duration in seconds
     
-    caller_user = Column(String, ForeignKey("users.username"))
-    receiver_user = Column(String, ForeignKey("users.username"))
-    chat_id = Column(Integer, ForeignKey("chats.id"))
+    caller_user = Column(String, ForeignKey("users.username"), index=True)
+    receiver_user = Column(String, ForeignKey("users.username"), index=True)
+    chat_id = Column(Integer, ForeignKey("chats.id"), index=True)
     
     caller = relationship("User", foreign_keys=[caller_user])
     receiver = relationship("User", foreign_keys=[receiver_user])
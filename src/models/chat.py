@@ -16,6 +16,8 @@ class Chat(Base):
     is_group = Column(Boolean, default=False)
     group_avatar = Column(String, nullable=True)
     description = Column(String, nullable=True)
+    # Sequence number of the chat's latest message (0 before the first one)
+    last_seq = Column(Integer, nullable=False, default=0, server_default="0")
 
     # For group chats
 
@@ -0,0 +1,26 @@
+from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, Index
+from sqlalchemy.orm import relationship
+from datetime import datetime
+from ..db.base import Base
+
+
+class ChatSummary(Base):
+    """Per-member inbox row, maintained on write so the inbox never aggregates messages"""
+    __tablename__ = "chat_summaries"
+
+    chat_id = Column(Integer, ForeignKey("chats.id"), primary_key=True)
+    username = Column(String, ForeignKey("users.username"), primary_key=True)
+    last_message_id = Column(Integer, ForeignKey("messages.id"), nullable=True)
+    last_message_preview = Column(String, nullable=True)
+    last_message_sender = Column(String, nullable=True)
+    last_activity_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    # Read watermark: the member has read everything up to this seq;
+    # unread count is chats.last_seq - last_read_seq
+    last_read_seq = Column(Integer, default=0, server_default="0", nullable=False)
+
+    chat = relationship("Chat")
+
+    __table_args__ = (
+        # Inbox page: WHERE username = ? ORDER BY last_activity_at DESC
+        Index("ix_chat_summaries_username_activity", "username", "last_activity_at"),
+    )
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, Enum
+from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, Enum, Index
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from ..db.base import Base
@@ -16,6 +16,8 @@ class Message(Base):
     __tablename__ = "messages"
 
     id = Column(Integer, primary_key=True, index=True)
+    # Position within the chat, 1, 2, 3...; allocated from chats.last_seq when the message is stored
+    seq = Column(Integer, nullable=True)
     content = Column(String)
     message_type = Column(Enum(MessageType), default=MessageType.TEXT)
     media_url = Column(String, nullable=True)
@@ -30,4 +32,12 @@ class Message(Base):
     sender_user = Column(String, ForeignKey("users.username"))
     
     chat = relationship("Chat", back_populates="messages")
-    sender = relationship("User")
\ No newline at end of file
+    sender = relationship("User")
+
+    __table_args__ = (
+        # Keyset pagination: WHERE chat_id = ? AND (created_at, id) < (?, ?) ORDER BY created_at DESC, id DESC
+        Index("ix_messages_chat_created_id", "chat_id", "created_at", "id"),
+        Index("ix_messages_sender_user", "sender_user"),
+        # Resume / replay: WHERE chat_id = ? AND seq > ? ORDER BY seq
+        Index("ix_messages_chat_seq", "chat_id", "seq", unique=True),
+    )
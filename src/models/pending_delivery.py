@@ -0,0 +1,11 @@
+from sqlalchemy import Column, Integer, String, ForeignKey
+from ..db.base import Base
+
+
+class PendingDelivery(Base):
+    """A stored message a member was offline for; deleted once it has been sent to them"""
+    __tablename__ = "pending_deliveries"
+
+    # Primary key order serves the flush on connect: WHERE username = ? ORDER BY message_id
+    username = Column(String, ForeignKey("users.username"), primary_key=True)
+    message_id = Column(Integer, ForeignKey("messages.id"), primary_key=True)
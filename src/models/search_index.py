@@ -0,0 +1,76 @@
+from sqlalchemy import DDL, column, event, table
+
+from .chat import Chat
+from .message import Message
+
+# FTS5 indexes over messages.content and chats.name/description (SQLite only).
+# Both are external-content tables: they store just the inverted index and
+# read the text back from the source rows, which triggers keep them in sync
+# with. A migration that rebuilds messages or chats through batch_alter_table
+# drops the triggers along with the old table and must create them again.
+FTS_TOKENIZER = "unicode61 remove_diacritics 2"
+
+MESSAGES_FTS_DDL = [
+    f"""
+    CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts USING fts5(
+        content, content='messages', content_rowid='id',
+        tokenize='{FTS_TOKENIZER}', prefix='2 3'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS messages_fts_insert AFTER INSERT ON messages BEGIN
+        INSERT INTO messages_fts(rowid, content) VALUES (new.id, new.content);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS messages_fts_delete AFTER DELETE ON messages BEGIN
+        INSERT INTO messages_fts(messages_fts, rowid, content) VALUES ('delete', old.id, old.content);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS messages_fts_update AFTER UPDATE OF content ON messages BEGIN
+        INSERT INTO messages_fts(messages_fts, rowid, content) VALUES ('delete', old.id, old.content);
+        INSERT INTO messages_fts(rowid, content) VALUES (new.id, new.content);
+    END
+    """,
+]
+
+CHATS_FTS_DDL = [
+    f"""
+    CREATE VIRTUAL TABLE IF NOT EXISTS chats_fts USING fts5(
+        name, description, content='chats', content_rowid='id',
+        tokenize='{FTS_TOKENIZER}', prefix='2 3'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS chats_fts_insert AFTER INSERT ON chats BEGIN
+        INSERT INTO chats_fts(rowid, name, description) VALUES (new.id, new.name, new.description);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS chats_fts_delete AFTER DELETE ON chats BEGIN
+        INSERT INTO chats_fts(chats_fts, rowid, name, description)
+        VALUES ('delete', old.id, old.name, old.description);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS chats_fts_update AFTER UPDATE OF name, description ON chats BEGIN
+        INSERT INTO chats_fts(chats_fts, rowid, name, description)
+        VALUES ('delete', old.id, old.name, old.description);
+        INSERT INTO chats_fts(rowid, name, description) VALUES (new.id, new.name, new.description);
+    END
+    """,
+]
+
+# Query-side handles; "rank" is FTS5's bm25() score, lower is better
+messages_fts = table("messages_fts", column("rowid"), column("content"), column("rank"))
+chats_fts = table("chats_fts", column("rowid"), column("name"), column("description"), column("rank"))
+
+# Databases built with create_all (tests, scripts) get the same indexes as migrated ones
+for source, name, statements in (
+    (Message.__table__, "messages_fts", MESSAGES_FTS_DDL),
+    (Chat.__table__, "chats_fts", CHATS_FTS_DDL),
+):
+    for statement in statements:
+        event.listen(source, "after_create", DDL(statement).execute_if(dialect="sqlite"))
+    event.listen(source, "before_drop", DDL(f"DROP TABLE IF EXISTS {name}").execute_if(dialect="sqlite"))
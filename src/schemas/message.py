@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import Optional
+from typing import List, Optional
 from datetime import datetime
 from enum import Enum
 
@@ -25,6 +25,7 @@ class MessageUpdate(BaseModel):
 
 class MessageInDB(MessageBase):
     id: int
+    seq: Optional[int] = None
     sender_user: str
     created_at: datetime
     updated_at: Optional[datetime] = None
@@ -63,4 +64,20 @@ class MessageResponse(MessageInDB):
                 "media_url": None,
                 "media_thumbnail": None
             }
-        }
\ No newline at end of file
+        }
+
+class MessagePage(BaseModel):
+    """Newest-first page of messages with keyset cursors for both directions"""
+    messages: List[MessageResponse]
+    next_cursor: Optional[str] = None  # Pass with direction=older to scroll back
+    prev_cursor: Optional[str] = None  # Pass with direction=newer to catch up
+
+class MessageSearchHit(BaseModel):
+    message: MessageResponse
+    snippet: str  # HTML-escaped excerpt with the matched terms wrapped in <mark>...</mark>
+    rank: float  # Lower is a better match
+
+class MessageSearchPage(BaseModel):
+    """Best-match-first page of search results"""
+    results: List[MessageSearchHit]
+    next_cursor: Optional[str] = None  # Pass back as cursor for the next page
@@ -47,3 +47,8 @@ class UserResponse(BaseModel):
 
     class Config:
         from_attributes = True
+
+
+class UserPresence(BaseModel):
+    is_online: bool
+    last_seen: Optional[datetime] = None
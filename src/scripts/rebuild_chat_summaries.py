@@ -0,0 +1,35 @@
+"""
+Backfill chat_summaries from existing chats, members and messages.
+
+Usage:
+    python -m src.scripts.rebuild_chat_summaries
+"""
+import asyncio
+
+from ..db.base import AsyncSessionLocal
+from ..models.associations import chat_users
+from ..models.user import User
+from ..models.chat import Chat
+from ..models.chat_summary import ChatSummary
+from ..models.message import Message
+from ..models.call import Call
+from ..services.chat_summary import ChatSummaryService
+
+
+async def rebuild():
+    async with AsyncSessionLocal() as db:
+        try:
+            rows = await ChatSummaryService(db).rebuild()
+            await db.commit()
+            print(f"Rebuilt {rows} chat summary rows")
+        except Exception:
+            await db.rollback()
+            raise
+
+
+def main():
+    asyncio.run(rebuild())
+
+
+if __name__ == "__main__":
+    main()
@@ -1,31 +1,39 @@
 from datetime import timedelta
 from typing import Optional
 import logging
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from fastapi import HTTPException, status
 
-from ..core.security import verify_password, get_password_hash, create_access_token
+from ..core.security import create_access_token, password_hasher, password_needs_rehash
 from ..models.user import User
 from ..schemas.user import UserCreate, UserLogin
 from ..core.config import settings
 
 class AuthService:
     @staticmethod
-    async def authenticate_user(db: Session, email: str, password: str) -> Optional[User]:
+    async def authenticate_user(db: AsyncSession, email: str, password: str) -> Optional[User]:
         try:
-            user = db.query(User).filter(User.email == email).first()
+            user = await db.scalar(select(User).where(User.email == email))
             if not user:
                 logging.warning(f"Authentication failed: User not found for email {email}")
                 return None
             
-            if not verify_password(password, user.hashed_password):
+            if not await password_hasher.verify(password, user.hashed_password):
                 logging.warning(f"Authentication failed: Invalid password for user {email}")
                 return None
-            # 
+
+            # Upgrade hashes made with an older cost factor while we have the plaintext
+            if password_needs_rehash(user.hashed_password):
+                user.hashed_password = await password_hasher.hash(password)
+                await db.commit()
+                logging.info(f"Rehashed password for user {email}")
 
             logging.info(f"User {email} authenticated successfully")
             return user
             
+        except HTTPException:
+            raise
         except Exception as e:
             logging.error(f"Authentication error: {str(e)}")
             raise HTTPException(
@@ -34,11 +42,13 @@ class AuthService:
             )
 
     @staticmethod
-    async def create_user(db: Session, user_data: UserCreate) -> User:
+    async def create_user(db: AsyncSession, user_data: UserCreate) -> User:
         # Check if user exists
-        existing_user = db.query(User).filter(
-            (User.email == user_data.email) | (User.username == user_data.username)
-        ).first()
+        existing_user = await db.scalar(
+            select(User).where(
+                (User.email == user_data.email) | (User.username == user_data.username)
+            )
+        )
         if existing_user:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
@@ -46,7 +56,7 @@ class AuthService:
             )
 
         # Create new user
-        hashed_password = get_password_hash(user_data.password)
+        hashed_password = await password_hasher.hash(user_data.password)
         db_user = User(
             email=user_data.email,
             username=user_data.username,
@@ -55,8 +65,8 @@ class AuthService:
         )
         
         db.add(db_user)
-        db.commit()
-        db.refresh(db_user)
+        await db.commit()
+        await db.refresh(db_user)
         return db_user
 
     @staticmethod
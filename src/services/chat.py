@@ -1,26 +1,149 @@
-from typing import List, Optional
-from sqlalchemy.orm import Session
+from typing import Dict, FrozenSet, List, Optional
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import aliased, contains_eager, selectinload
 from fastapi import HTTPException
 from datetime import datetime
-from sqlalchemy import or_, and_, desc
+from sqlalchemy import or_, and_, desc, func, select, tuple_, update
 
+from ..core.cache import membership_cache, recent_messages
+from ..models.associations import chat_users
 from ..models.chat import Chat as ChatModel
+from ..models.chat_summary import ChatSummary
 from ..models.user import User as UserModel
-from ..models.message import Message as MessageModel
+from ..models.message import Message as MessageModel, MessageType as MessageTypeModel
 from ..schemas.chat import ChatCreate, ChatUpdate, ChatResponse
-from ..schemas.message import MessageCreate, MessageResponse
+from ..schemas.message import MessageCreate, MessagePage, MessageResponse, MessageSearchHit, MessageSearchPage
+from ..utils.cursor import decode_cursor, decode_rank_cursor, encode_cursor, encode_rank_cursor
+from .chat_summary import ChatSummaryService
+from .search import SearchBackend, search_backend
+
+async def advance_chat(db: AsyncSession, chat_id: int, count: int, activity_at: datetime) -> int:
+    """
+    Reserve count sequence numbers in a chat and bump its updated_at.
+
+    Returns the chat's new last_seq; the reserved numbers end there. The row
+    lock taken by the UPDATE keeps concurrent writers from interleaving, so
+    messages stamped with created_at after this returns sort by (created_at,
+    id) in seq order, which history pages and recent_messages rely on.
+    """
+    last_seq = await db.scalar(
+        update(ChatModel)
+        .where(ChatModel.id == chat_id)
+        .values(last_seq=ChatModel.last_seq + count, updated_at=activity_at)
+        .returning(ChatModel.last_seq)
+        .execution_options(synchronize_session=False)
+    )
+    if last_seq is None:
+        raise HTTPException(status_code=404, detail="Chat not found")
+    return last_seq
 
 class ChatService:
-    def __init__(self, db: Session):
+    def __init__(self, db: AsyncSession, search: SearchBackend = search_backend):
         self.db = db
+        self.search = search
 
-    def get_chat(self, chat_id: int) -> ChatModel:
-        chat = self.db.query(ChatModel).filter(ChatModel.id == chat_id).first()
+    async def get_chat(self, chat_id: int) -> ChatModel:
+        chat = await self.db.scalar(
+            select(ChatModel)
+            .where(ChatModel.id == chat_id)
+            .options(selectinload(ChatModel.users))
+        )
         if not chat:
             raise HTTPException(status_code=404, detail="Chat not found")
         return chat
 
-    def get_user_chats(
+    async def get_members(self, chat_id: int) -> FrozenSet[str]:
+        """Usernames in the chat, from membership_cache when possible"""
+        members = membership_cache.members(chat_id)
+        if members is not None:
+            return members
+        rows = (
+            await self.db.execute(
+                select(ChatModel.id, chat_users.c.username)
+                .outerjoin(chat_users, chat_users.c.chat_id == ChatModel.id)
+                .where(ChatModel.id == chat_id)
+            )
+        ).all()
+        if not rows:
+            raise HTTPException(status_code=404, detail="Chat not found")
+        return membership_cache.set_members(chat_id, (username for _, username in rows if username is not None))
+
+    async def require_member(self, chat_id: int, username: str):
+        if username not in await self.get_members(chat_id):
+            raise HTTPException(status_code=403, detail="Not a member of this chat")
+
+    async def get_chat_ids(self, username: str) -> FrozenSet[int]:
+        """Ids of the chats username belongs to, from membership_cache when possible"""
+        chat_ids = membership_cache.chats(username)
+        if chat_ids is None:
+            chat_ids = membership_cache.set_chats(
+                username,
+                await self.db.scalars(
+                    select(chat_users.c.chat_id).where(chat_users.c.username == username)
+                )
+            )
+        return chat_ids
+
+    async def create_chat(self, chat_data: ChatCreate, created_by: str) -> ChatResponse:
+        """Create a group or direct chat and seed its members' inbox rows"""
+        usernames = set(chat_data.member_usernames) | {created_by}
+        members = (
+            await self.db.scalars(
+                select(UserModel).where(UserModel.username.in_(usernames))
+            )
+        ).all()
+        missing = usernames - {member.username for member in members}
+        if missing:
+            raise HTTPException(status_code=404, detail=f"Users not found: {', '.join(sorted(missing))}")
+        if not chat_data.is_group and len(members) != 2:
+            raise HTTPException(status_code=400, detail="Direct chats need exactly one other member")
+
+        chat = ChatModel(
+            name=chat_data.name,
+            description=chat_data.description,
+            is_group=chat_data.is_group,
+            admin_user=created_by if chat_data.is_group else None,
+            users=list(members)
+        )
+        self.db.add(chat)
+        await self.db.flush()
+
+        await ChatSummaryService(self.db).add_members(chat.id, usernames, chat.created_at)
+        await self.db.commit()
+        membership_cache.invalidate(chat.id, usernames)
+        return self.to_response(chat)
+
+    async def update_chat(self, chat_id: int, chat_update: ChatUpdate) -> ChatResponse:
+        chat = await self.get_chat(chat_id)
+        for field, value in chat_update.dict(exclude_unset=True).items():
+            setattr(chat, field, value)
+        await self.db.commit()
+        return self.to_response(chat)
+
+    async def add_members(self, chat_id: int, member_usernames: List[str]) -> ChatResponse:
+        chat = await self.get_chat(chat_id)
+        current = {user.username for user in chat.users}
+        new_members = (
+            await self.db.scalars(
+                select(UserModel).where(UserModel.username.in_(set(member_usernames) - current))
+            )
+        ).all()
+        chat.users.extend(new_members)
+        await ChatSummaryService(self.db).add_members(
+            chat_id, [member.username for member in new_members]
+        )
+        await self.db.commit()
+        membership_cache.invalidate(chat_id, [member.username for member in new_members])
+        return self.to_response(chat)
+
+    async def remove_member(self, chat_id: int, username: str):
+        chat = await self.get_chat(chat_id)
+        chat.users = [user for user in chat.users if user.username != username]
+        await ChatSummaryService(self.db).remove_member(chat_id, username)
+        await self.db.commit()
+        membership_cache.invalidate(chat_id, [username])
+
+    async def get_user_chats(
         self, 
         username: str,
         limit: int = 20,
@@ -28,75 +151,59 @@ class ChatService:
         is_group: Optional[bool] = None,
         unread_only: bool = False
     ) -> List[ChatResponse]:
-        """Get user's chats with filtering and pagination"""
+        """Get user's chats with filtering and pagination, newest activity first"""
+        # Served from the per-member summary rows: cost depends on the page, not on history
         query = (
-            self.db.query(ChatModel)
-            .filter(ChatModel.users.any(username=username))
+            select(ChatSummary)
+            .join(ChatSummary.chat)
+            .where(ChatSummary.username == username)
+            .options(
+                contains_eager(ChatSummary.chat).selectinload(ChatModel.users)
+            )
+            # Summaries and last_seq are maintained with Core UPDATEs; don't serve stale copies
+            .execution_options(populate_existing=True)
         )
 
         # Apply filters
         if search:
-            query = query.filter(
-                or_(
-                    ChatModel.name.ilike(f"%{search}%"),
-                    ChatModel.description.ilike(f"%{search}%")
-                )
-            )
+            # Name/description words through the full-text index, not a '%...%' scan
+            matches = self.search.chat_filter(search)
+            if matches is None:
+                return []
+            query = query.where(matches)
 
         if is_group is not None:
-            query = query.filter(ChatModel.is_group == is_group)
-
-        # Get latest message for each chat
-        chats = query.limit(limit).all()
-        
-        # Prepare response with additional data
-        chat_responses = []
-        for chat in chats:
-            # Get last message
-            last_message = (
-                self.db.query(MessageModel)
-                .filter(MessageModel.chat_id == chat.id)
-                .order_by(desc(MessageModel.created_at))
-                .first()
-            )
+            query = query.where(ChatModel.is_group == is_group)
 
-            # Get unread count
-            unread_count = (
-                self.db.query(MessageModel)
-                .filter(
-                    and_(
-                        MessageModel.chat_id == chat.id,
-                        MessageModel.sender_user != username,
-                        MessageModel.read_at.is_(None)
-                    )
-                )
-                .count()
-            )
+        if unread_only:
+            query = query.where(ChatModel.last_seq > ChatSummary.last_read_seq)
 
-            # Skip if unread_only is True and no unread messages
-            if unread_only and unread_count == 0:
-                continue
-
-            # Convert to response model
-            chat_response = ChatResponse(
-                id=chat.id,
-                name=chat.name,
-                description=chat.description,
-                is_group=chat.is_group,
-                admin_user=chat.admin_user,
-                created_at=chat.created_at,
-                updated_at=chat.updated_at,
-                members=[user.username for user in chat.users],
-                last_message={
-                    "content": last_message.content if last_message else None,
-                    "sender_username": last_message.sender_user if last_message else None,
-                    "sent_at": last_message.created_at if last_message else None
-                } if last_message else None,
-                unread_count=unread_count
+        summaries = (
+            await self.db.scalars(
+                query.order_by(desc(ChatSummary.last_activity_at), desc(ChatSummary.chat_id))
+                .limit(limit)
             )
-            chat_responses.append(chat_response)
+        ).all()
+        return [self.to_response(summary.chat, summary) for summary in summaries]
 
-        return chat_responses
+    def to_response(self, chat: ChatModel, summary: Optional[ChatSummary] = None) -> ChatResponse:
+        has_message = summary is not None and summary.last_message_id is not None
+        return ChatResponse(
+            id=chat.id,
+            name=chat.name,
+            description=chat.description,
+            is_group=chat.is_group,
+            admin_user=chat.admin_user,
+            created_at=chat.created_at,
+            updated_at=chat.updated_at,
+            members=[user.username for user in chat.users],
+            last_message={
+                "content": summary.last_message_preview,
+                "sender_username": summary.last_message_sender,
+                "sent_at": summary.last_activity_at
+            } if has_message else None,
+            unread_count=max(chat.last_seq - summary.last_read_seq, 0) if summary is not None else 0
+        )
 
     async def send_message(
         self,
@@ -108,29 +215,29 @@ class ChatService:
     ) -> MessageResponse:
         """Send a new message in the chat"""
         # Verify chat exists and user is member
-        chat = self.get_chat(chat_id)
-        if not any(user.username == sender_username for user in chat.users):
-            raise HTTPException(status_code=403, detail="Not a member of this chat")
+        await self.require_member(chat_id, sender_username)
 
-        # Create message
+        # Create message; its seq, chat's updated_at and the inbox rows change in one transaction
+        seq = await advance_chat(self.db, chat_id, 1, datetime.utcnow())
+        created_at = datetime.utcnow()
         message = MessageModel(
+            seq=seq,
             content=content,
             chat_id=chat_id,
             sender_user=sender_username,
-            message_type=message_type,
+            message_type=MessageTypeModel(message_type),
             media_url=media_url,
-            created_at=datetime.utcnow()
+            created_at=created_at
         )
 
         self.db.add(message)
-        self.db.commit()
-        self.db.refresh(message)
-
-        # Update chat's updated_at timestamp
-        chat.updated_at = datetime.utcnow()
-        self.db.commit()
+        await self.db.flush()
+        await ChatSummaryService(self.db).record_messages([message])
+        await self.db.commit()
 
-        return MessageResponse.from_orm(message)
+        response = MessageResponse.from_orm(message)
+        recent_messages.append(response)
+        return response
 
     async def get_messages(
         self,
@@ -140,26 +247,226 @@ class ChatService:
         limit: int = 50,
         before: Optional[datetime] = None
     ) -> List[MessageResponse]:
-        """Get chat messages with pagination"""
+        """
+        Get chat messages with offset pagination.
+
+        Slow for deep pages (the database still walks every skipped row) and
+        unstable when messages share a timestamp; prefer get_messages_page.
+        """
         # Verify chat exists and user is member
-        chat = self.get_chat(chat_id)
-        if not any(user.username == username for user in chat.users):
-            raise HTTPException(status_code=403, detail="Not a member of this chat")
+        await self.require_member(chat_id, username)
+
+        if not skip and before is None:
+            cached = recent_messages.latest(chat_id, limit)
+            if cached is not None:
+                return cached[0]
 
         # Build query
-        query = (
-            self.db.query(MessageModel)
-            .filter(MessageModel.chat_id == chat_id)
-        )
+        query = select(MessageModel).where(MessageModel.chat_id == chat_id)
 
         if before:
-            query = query.filter(MessageModel.created_at < before)
+            query = query.where(MessageModel.created_at < before)
 
         messages = (
-            query.order_by(desc(MessageModel.created_at))
-            .offset(skip)
-            .limit(limit)
-            .all()
+            await self.db.scalars(
+                query.order_by(desc(MessageModel.created_at), desc(MessageModel.id))
+                .offset(skip)
+                .limit(limit)
+            )
+        ).all()
+
+        responses = [MessageResponse.from_orm(msg) for msg in messages]
+        if not skip and before is None:
+            recent_messages.fill(chat_id, responses)
+        return responses
+
+    async def get_messages_page(
+        self,
+        chat_id: int,
+        username: str,
+        cursor: Optional[str] = None,
+        direction: str = "older",
+        limit: int = 50
+    ) -> MessagePage:
+        """
+        Get a newest-first page of messages using a (created_at, id) keyset cursor.
+
+        Without a cursor the latest messages are returned, from memory when the
+        chat is in recent_messages. direction="older" scrolls back from the
+        cursor, direction="newer" fetches what came after it.
+        """
+        # Verify chat exists and user is member
+        await self.require_member(chat_id, username)
+
+        if not cursor:
+            cached = recent_messages.latest(chat_id, limit)
+            if cached is not None:
+                messages, more_older = cached
+                newest, oldest = messages[0], messages[-1]
+                return MessagePage(
+                    messages=messages,
+                    next_cursor=encode_cursor(oldest.created_at, oldest.id) if more_older else None,
+                    prev_cursor=encode_cursor(newest.created_at, newest.id)
+                )
+
+        position = tuple_(MessageModel.created_at, MessageModel.id)
+        query = select(MessageModel).where(MessageModel.chat_id == chat_id)
+
+        newer = direction == "newer" and cursor is not None
+        if newer:
+            query = query.where(position > tuple_(*decode_cursor(cursor)))
+            order = (MessageModel.created_at, MessageModel.id)
+        else:
+            if cursor:
+                query = query.where(position < tuple_(*decode_cursor(cursor)))
+            order = (desc(MessageModel.created_at), desc(MessageModel.id))
+
+        # One extra row tells us whether another page exists
+        messages = list((await self.db.scalars(query.order_by(*order).limit(limit + 1))).all())
+        has_more = len(messages) > limit
+        messages = messages[:limit]
+        if newer:
+            messages.reverse()
+
+        if not messages:
+            # Nothing new yet: hand the cursor back so the client can poll again
+            return MessagePage(messages=[], prev_cursor=cursor if newer else None)
+
+        newest, oldest = messages[0], messages[-1]
+        # Scrolling forward from a cursor always leaves older messages behind it
+        more_older = has_more or newer
+        responses = [MessageResponse.from_orm(msg) for msg in messages]
+        if not cursor:
+            recent_messages.fill(chat_id, responses)
+        return MessagePage(
+            messages=responses,
+            next_cursor=encode_cursor(oldest.created_at, oldest.id) if more_older else None,
+            prev_cursor=encode_cursor(newest.created_at, newest.id)
+        )
+
+    async def search_messages(
+        self,
+        username: str,
+        query: str,
+        chat_id: Optional[int] = None,
+        cursor: Optional[str] = None,
+        limit: int = 20
+    ) -> MessageSearchPage:
+        """
+        Messages matching query in username's chats (or only chat_id), best match first.
+
+        Pages are keyed on (rank, id); pass next_cursor back to get the next one.
+        The first page fixes the newest message id a search covers, so messages
+        sent while paging don't show up on later pages. bm25 ranks shift as the
+        index grows, so a cursor is compared with its message's current rank
+        rather than the one it was issued with.
+        """
+        if chat_id is not None:
+            await self.require_member(chat_id, username)
+            chat_ids = [chat_id]
+        else:
+            chat_ids = list(await self.get_chat_ids(username))
+        matches = self.search.message_matches(query)
+        if matches is None or not chat_ids:
+            return MessageSearchPage(results=[])
+
+        search_query = (
+            select(MessageModel, matches.c.rank, matches.c.snippet)
+            .join(matches, matches.c.id == MessageModel.id)
+            .where(MessageModel.chat_id.in_(chat_ids))
+        )
+        if cursor:
+            rank, message_id, through_id = decode_rank_cursor(cursor)
+            anchor = self.search.message_matches(query)
+            # Falls back to the issued rank if the message was deleted or edited away
+            anchor_rank = func.coalesce(
+                select(anchor.c.rank).where(anchor.c.id == message_id).scalar_subquery(), rank
+            )
+            search_query = search_query.where(
+                and_(
+                    MessageModel.id <= through_id,
+                    or_(
+                        matches.c.rank > anchor_rank,
+                        and_(matches.c.rank == anchor_rank, MessageModel.id < message_id)
+                    )
+                )
+            )
+        else:
+            newest = aliased(MessageModel)
+            through_id = None
+            search_query = search_query.add_columns(select(func.max(newest.id)).scalar_subquery())
+        # One extra row tells us whether another page exists
+        rows = (
+            await self.db.execute(
+                search_query.order_by(matches.c.rank, desc(MessageModel.id)).limit(limit + 1)
+            )
+        ).all()
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        if not rows:
+            return MessageSearchPage(results=[])
+        if through_id is None:
+            through_id = rows[0][3]
+        last_message, last_rank = rows[-1][:2]
+        return MessageSearchPage(
+            results=[
+                MessageSearchHit(
+                    message=MessageResponse.from_orm(message),
+                    snippet=self.search.highlight(snippet),
+                    rank=rank
+                )
+                for message, rank, snippet, *_ in rows
+            ],
+            next_cursor=encode_rank_cursor(last_rank, last_message.id, through_id) if has_more else None
         )
 
-        return [MessageResponse.from_orm(msg) for msg in messages]
\ No newline at end of file
+    async def get_last_seqs(self, username: str, chat_ids: List[int]) -> Dict[int, int]:
+        """last_seq of each of the given chats that username is a member of"""
+        rows = await self.db.execute(
+            select(ChatModel.id, ChatModel.last_seq)
+            .join(chat_users, chat_users.c.chat_id == ChatModel.id)
+            .where(and_(chat_users.c.username == username, ChatModel.id.in_(chat_ids)))
+        )
+        return {chat_id: last_seq for chat_id, last_seq in rows}
+
+    async def get_messages_after_seq(self, chat_id: int, after_seq: int, limit: int) -> List[MessageModel]:
+        """Messages with seq > after_seq in order; membership must be checked by the caller"""
+        return (
+            await self.db.scalars(
+                select(MessageModel)
+                .where(and_(MessageModel.chat_id == chat_id, MessageModel.seq > after_seq))
+                .order_by(MessageModel.seq)
+                .limit(limit)
+            )
+        ).all()
+
+    async def mark_as_read(
+        self,
+        chat_id: int,
+        username: str,
+        message_id: Optional[int] = None,
+        seq: Optional[int] = None
+    ) -> int:
+        """
+        Move username's read watermark up to seq, or to message_id's seq, or
+        to the newest message if neither is given. Returns the watermark as
+        stored, which never moves back or past the chat's last_seq.
+        """
+        if seq is None:
+            if message_id is not None:
+                seq = await self.db.scalar(
+                    select(MessageModel.seq).where(
+                        and_(MessageModel.id == message_id, MessageModel.chat_id == chat_id)
+                    )
+                )
+                if seq is None:
+                    raise HTTPException(status_code=404, detail="Message not found")
+            else:
+                seq = await self.db.scalar(select(ChatModel.last_seq).where(ChatModel.id == chat_id))
+        summaries = ChatSummaryService(self.db)
+        moved = await summaries.set_watermarks([(chat_id, username, seq)])
+        watermark = moved.get((chat_id, username))
+        if watermark is None:
+            watermark = await summaries.get_watermark(chat_id, username) or 0
+        await self.db.commit()
+        return watermark
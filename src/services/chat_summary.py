@@ -0,0 +1,250 @@
+from typing import Dict, Iterable, List, Optional, Tuple
+from datetime import datetime
+from sqlalchemy import (
+    Column, Integer, MetaData, String, Table,
+    and_, bindparam, case, delete, desc, func, insert, select, tuple_, update
+)
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..models.associations import chat_users
+from ..models.chat import Chat as ChatModel
+from ..models.chat_summary import ChatSummary
+from ..models.message import Message as MessageModel
+
+PREVIEW_LENGTH = 100
+
+
+def make_preview(content: Optional[str]) -> Optional[str]:
+    return content[:PREVIEW_LENGTH] if content is not None else None
+
+
+class ChatSummaryService:
+    """
+    Keeps chat_summaries in step with messages and membership.
+
+    Methods only stage changes on the given session; the caller commits them
+    together with the write they belong to.
+    """
+
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    async def add_members(self, chat_id: int, usernames: Iterable[str], activity_at: Optional[datetime] = None):
+        usernames = list(usernames)
+        existing = set(
+            (await self.db.execute(
+                select(ChatSummary.username).where(
+                    and_(ChatSummary.chat_id == chat_id, ChatSummary.username.in_(usernames))
+                )
+            )).scalars()
+        )
+        usernames = [username for username in usernames if username not in existing]
+        if not usernames:
+            return
+        # New members start with nothing unread
+        last_seq = await self.db.scalar(select(ChatModel.last_seq).where(ChatModel.id == chat_id))
+        await self.db.execute(insert(ChatSummary), [
+            {
+                "chat_id": chat_id,
+                "username": username,
+                "last_activity_at": activity_at or datetime.utcnow(),
+                "last_read_seq": last_seq or 0
+            }
+            for username in usernames
+        ])
+
+    async def remove_member(self, chat_id: int, username: str):
+        await self.db.execute(
+            delete(ChatSummary).where(
+                and_(ChatSummary.chat_id == chat_id, ChatSummary.username == username)
+            )
+        )
+
+    async def record_messages(self, messages: List[MessageModel]):
+        """Apply newly inserted (flushed) messages to every member's summary row"""
+        by_chat: Dict[int, List[MessageModel]] = {}
+        for message in messages:
+            by_chat.setdefault(message.chat_id, []).append(message)
+
+        for chat_id, chat_messages in by_chat.items():
+            latest = max(chat_messages, key=lambda m: (m.created_at, m.id))
+            sent_by: Dict[str, int] = {}
+            for message in chat_messages:
+                sent_by[message.sender_user] = max(sent_by.get(message.sender_user, 0), message.seq)
+
+            # Sending a message marks the chat read up to it; everyone else's
+            # unread count grows through chats.last_seq alone
+            await self.db.execute(
+                update(ChatSummary)
+                .where(ChatSummary.chat_id == chat_id)
+                .values(
+                    last_message_id=latest.id,
+                    last_message_preview=make_preview(latest.content),
+                    last_message_sender=latest.sender_user,
+                    last_activity_at=latest.created_at,
+                    last_read_seq=case(
+                        sent_by, value=ChatSummary.username, else_=ChatSummary.last_read_seq
+                    )
+                )
+                .execution_options(synchronize_session=False)
+            )
+
+    async def set_watermarks(self, receipts: Iterable[Tuple[int, str, int]]) -> Dict[Tuple[int, str], int]:
+        """
+        Move members' read watermarks forward; returns {(chat_id, username): watermark} for those that moved.
+
+        receipts are (chat_id, username, seq). A watermark never moves back
+        and never passes the chat's last_seq. One SELECT reads where members
+        stand and one executemany UPDATE moves them all.
+        """
+        wanted: Dict[Tuple[int, str], int] = {}
+        for chat_id, username, seq in receipts:
+            wanted[(chat_id, username)] = max(seq, wanted.get((chat_id, username), seq))
+        if not wanted:
+            return {}
+        summaries = ChatSummary.__table__
+        current = await self.db.execute(
+            select(summaries.c.chat_id, summaries.c.username, summaries.c.last_read_seq, ChatModel.last_seq)
+            .join(ChatModel, ChatModel.id == summaries.c.chat_id)
+            .where(tuple_(summaries.c.chat_id, summaries.c.username).in_(list(wanted)))
+        )
+        moved = {}
+        for chat_id, username, last_read_seq, last_seq in current:
+            watermark = min(wanted[(chat_id, username)], last_seq)
+            if watermark > last_read_seq:
+                moved[(chat_id, username)] = watermark
+        if not moved:
+            return {}
+        seq = bindparam("b_seq")
+        # Still guarded, in case another writer moved a watermark further since the SELECT
+        await self.db.execute(
+            update(summaries)
+            .where(
+                and_(
+                    summaries.c.chat_id == bindparam("b_chat_id"),
+                    summaries.c.username == bindparam("b_username"),
+                    summaries.c.last_read_seq < seq
+                )
+            )
+            .values(last_read_seq=seq),
+            [
+                {"b_chat_id": chat_id, "b_username": username, "b_seq": watermark}
+                for (chat_id, username), watermark in moved.items()
+            ]
+        )
+        return moved
+
+    async def get_watermark(self, chat_id: int, username: str) -> Optional[int]:
+        return await self.db.scalar(
+            select(ChatSummary.last_read_seq).where(
+                and_(ChatSummary.chat_id == chat_id, ChatSummary.username == username)
+            )
+        )
+
+    async def rebuild(self) -> int:
+        """
+        Recompute every summary row from chats, chat_users and messages.
+
+        Read watermarks are carried over. Members without a row yet start
+        just below the first message from someone else without read_at, as
+        the migration that introduced watermarks did.
+        """
+        ranked = (
+            select(
+                MessageModel.chat_id,
+                MessageModel.id,
+                MessageModel.content,
+                MessageModel.sender_user,
+                MessageModel.created_at,
+                func.row_number().over(
+                    partition_by=MessageModel.chat_id,
+                    order_by=(desc(MessageModel.created_at), desc(MessageModel.id))
+                ).label("position")
+            )
+            .subquery()
+        )
+        last = select(ranked).where(ranked.c.position == 1).subquery()
+
+        first_unread = (
+            select(
+                chat_users.c.chat_id,
+                chat_users.c.username,
+                (func.min(MessageModel.seq) - 1).label("last_read_seq")
+            )
+            .join(
+                MessageModel,
+                and_(
+                    MessageModel.chat_id == chat_users.c.chat_id,
+                    MessageModel.sender_user != chat_users.c.username,
+                    MessageModel.read_at.is_(None)
+                )
+            )
+            .group_by(chat_users.c.chat_id, chat_users.c.username)
+            .subquery()
+        )
+
+        # The old rows are deleted before the new ones go in; keep their watermarks aside
+        previous = Table(
+            "previous_watermarks",
+            MetaData(),
+            Column("chat_id", Integer, primary_key=True),
+            Column("username", String, primary_key=True),
+            Column("last_read_seq", Integer),
+            prefixes=["TEMPORARY"]
+        )
+        await self.db.run_sync(lambda session: previous.create(session.connection()))
+        await self.db.execute(
+            insert(previous).from_select(
+                ["chat_id", "username", "last_read_seq"],
+                select(ChatSummary.chat_id, ChatSummary.username, ChatSummary.last_read_seq)
+            )
+        )
+
+        source = (
+            select(
+                chat_users.c.chat_id,
+                chat_users.c.username,
+                last.c.id,
+                func.substr(last.c.content, 1, PREVIEW_LENGTH),
+                last.c.sender_user,
+                func.coalesce(last.c.created_at, ChatModel.created_at),
+                func.coalesce(
+                    previous.c.last_read_seq, first_unread.c.last_read_seq, ChatModel.last_seq
+                )
+            )
+            .select_from(chat_users)
+            .join(ChatModel, ChatModel.id == chat_users.c.chat_id)
+            .outerjoin(last, last.c.chat_id == chat_users.c.chat_id)
+            .outerjoin(
+                previous,
+                and_(
+                    previous.c.chat_id == chat_users.c.chat_id,
+                    previous.c.username == chat_users.c.username
+                )
+            )
+            .outerjoin(
+                first_unread,
+                and_(
+                    first_unread.c.chat_id == chat_users.c.chat_id,
+                    first_unread.c.username == chat_users.c.username
+                )
+            )
+        )
+
+        await self.db.execute(delete(ChatSummary))
+        result = await self.db.execute(
+            insert(ChatSummary).from_select(
+                [
+                    "chat_id",
+                    "username",
+                    "last_message_id",
+                    "last_message_preview",
+                    "last_message_sender",
+                    "last_activity_at",
+                    "last_read_seq"
+                ],
+                source
+            )
+        )
+        await self.db.run_sync(lambda session: previous.drop(session.connection()))
+        return result.rowcount
@@ -0,0 +1,190 @@
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import and_, delete, insert, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..core.cache import recent_messages
+from ..core.codecs import PreparedFrame
+from ..core.config import settings
+from ..core.events import ClientConnection
+from ..core.flusher import DebouncedFlusher
+from ..db.base import AsyncSessionLocal
+from ..models.message import Message as MessageModel
+from ..models.pending_delivery import PendingDelivery
+from .message_writer import message_payload
+
+
+class DeliveryService:
+    """Pending-delivery index and delivered_at stamps; callers commit"""
+
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    async def enqueue(self, entries: Iterable[Tuple[str, int]]):
+        """Record (username, message_id) pairs with one executemany INSERT"""
+        rows = [{"username": username, "message_id": message_id} for username, message_id in entries]
+        if rows:
+            await self.db.execute(insert(PendingDelivery), rows)
+
+    async def mark_delivered(self, message_ids: Iterable[int], delivered_at: Optional[datetime] = None):
+        """Stamp delivered_at on the messages that don't have it yet"""
+        message_ids = list(message_ids)
+        if not message_ids:
+            return
+        await self.db.execute(
+            update(MessageModel)
+            .where(and_(MessageModel.id.in_(message_ids), MessageModel.delivered_at.is_(None)))
+            .values(delivered_at=delivered_at or datetime.utcnow())
+            .execution_options(synchronize_session=False)
+        )
+
+    async def peek(self, username: str, limit: int) -> List[MessageModel]:
+        """Up to limit of username's oldest pending messages, by chat and seq; they stay queued"""
+        message_ids = list(
+            (await self.db.scalars(
+                select(PendingDelivery.message_id)
+                .where(PendingDelivery.username == username)
+                .order_by(PendingDelivery.message_id)
+                .limit(limit)
+            )).all()
+        )
+        if not message_ids:
+            return []
+        return list(
+            (await self.db.scalars(
+                select(MessageModel)
+                .where(MessageModel.id.in_(message_ids))
+                .order_by(MessageModel.chat_id, MessageModel.seq)
+            )).all()
+        )
+
+    async def acknowledge(
+        self, username: str, message_ids: Iterable[int], delivered_at: Optional[datetime] = None
+    ):
+        """Remove messages that reached username from the index and stamp them delivered"""
+        message_ids = list(message_ids)
+        await self.db.execute(
+            delete(PendingDelivery).where(
+                and_(PendingDelivery.username == username, PendingDelivery.message_id.in_(message_ids))
+            )
+        )
+        await self.mark_delivered(message_ids, delivered_at)
+
+
+class DeliveryQueue(DebouncedFlusher):
+    """
+    Keeps messages for members who were offline and hands them over on connect.
+
+    When a message has been broadcast, members connected to this worker
+    have received it and it is stamped delivered; every other member gets a
+    (username, message_id) entry in the pending-delivery index. Both are
+    buffered and written once per interval. When a user connects, their
+    entries are sent in "pending_messages" frames of up to batch_size
+    messages; each batch is removed from the index and stamped delivered
+    once its frame has been written to the socket. With several
+    workers, members connected elsewhere are queued too and receive those
+    messages twice; clients drop duplicates by seq, as with resume.
+    """
+
+    def __init__(
+        self,
+        connection_manager,
+        session_factory=AsyncSessionLocal,
+        interval_ms: int = settings.PENDING_DELIVERY_FLUSH_INTERVAL_MS,
+        batch_size: int = settings.PENDING_DELIVERY_BATCH_SIZE
+    ):
+        super().__init__(interval_ms)
+        self.connection_manager = connection_manager
+        self.session_factory = session_factory
+        self.batch_size = batch_size
+        self.flushes = 0
+        self._queued: List[Tuple[str, int]] = []
+        # message id -> chat id
+        self._delivered: Dict[int, int] = {}
+
+    def message_sent(self, message: dict, recipients: Iterable[str]):
+        """
+        Record who got a broadcast message live and who has to wait for it.
+
+        Members connected here who haven't joined the chat's room were passed
+        over by the room broadcast, so they are sent the frame directly.
+        """
+        in_room = self.connection_manager.room_members.get(message["chat_id"], ())
+        frame = None
+        for username in recipients:
+            connections = self.connection_manager.active_connections.get(username, ())
+            delivered = bool(connections)
+            if connections and username not in in_room:
+                if frame is None:
+                    frame = PreparedFrame({"type": "new_message", "message": message})
+                # Queue it for next time unless at least one of their devices took it
+                delivered = any([connection.enqueue(frame) for connection in connections])
+            if not delivered:
+                self._queued.append((username, message["id"]))
+            else:
+                self._delivered[message["id"]] = message["chat_id"]
+        self.schedule()
+
+    async def flush(self):
+        if not self._queued and not self._delivered:
+            return
+        queued, self._queued = self._queued, []
+        delivered, self._delivered = self._delivered, {}
+        delivered_at = datetime.utcnow()
+        try:
+            async with self.session_factory() as db:
+                deliveries = DeliveryService(db)
+                await deliveries.enqueue(queued)
+                await deliveries.mark_delivered(delivered, delivered_at)
+                await db.commit()
+        except Exception:
+            # Keep them for the next flush
+            self._queued[:0] = queued
+            self._delivered.update(delivered)
+            raise
+        by_chat: Dict[int, List[int]] = {}
+        for message_id, chat_id in delivered.items():
+            by_chat.setdefault(chat_id, []).append(message_id)
+        for chat_id, message_ids in by_chat.items():
+            recent_messages.mark_delivered(chat_id, message_ids, delivered_at)
+        self.flushes += 1
+
+    async def deliver_pending(self, username: str, connection: Optional[ClientConnection] = None) -> int:
+        """
+        Send a connecting user everything queued for them; returns how many messages.
+
+        The messages go to connection, by default the user's newest one.
+        """
+        if connection is None:
+            connections = self.connection_manager.active_connections.get(username)
+            if not connections:
+                return 0
+            connection = connections[-1]
+        # Entries still buffered here must be in the index before it is read
+        await self.flush()
+        sent = 0
+        async with self.session_factory() as db:
+            deliveries = DeliveryService(db)
+            while True:
+                messages = await deliveries.peek(username, self.batch_size)
+                if not messages:
+                    break
+                frame = {
+                    "type": "pending_messages",
+                    "messages": [message_payload(message) for message in messages]
+                }
+                # Entries only leave the index once their frame is on the socket; a
+                # frame that was dropped or cut off by a close is sent again next time
+                if not await connection.send(frame):
+                    break
+                delivered_at = datetime.utcnow()
+                await deliveries.acknowledge(username, [message.id for message in messages], delivered_at)
+                await db.commit()
+                by_chat: Dict[int, List[int]] = {}
+                for message in messages:
+                    by_chat.setdefault(message.chat_id, []).append(message.id)
+                for chat_id, message_ids in by_chat.items():
+                    recent_messages.mark_delivered(chat_id, message_ids, delivered_at)
+                sent += len(messages)
+        return sent
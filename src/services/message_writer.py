@@ -0,0 +1,198 @@
+import asyncio
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from ..core.cache import recent_messages
+from ..core.config import settings
+from ..db.base import AsyncSessionLocal
+from ..models.message import Message as MessageModel, MessageType as MessageTypeModel
+from ..schemas.message import MessageResponse
+from .chat import advance_chat
+from .chat_summary import ChatSummaryService
+
+
+def message_payload(message: MessageModel) -> dict:
+    """The message as sent to WebSocket clients"""
+    return {
+        "id": message.id,
+        "seq": message.seq,
+        "chat_id": message.chat_id,
+        "sender": message.sender_user,
+        "content": message.content,
+        "message_type": message.message_type.value,
+        "media_url": message.media_url,
+        "timestamp": message.created_at.isoformat()
+    }
+
+
+@dataclass
+class PendingMessage:
+    chat_id: int
+    sender_username: str
+    content: str
+    message_type: str = "text"
+    media_url: Optional[str] = None
+    # Submission time until the batch is written, then the time its seq was reserved
+    created_at: datetime = field(default_factory=datetime.utcnow)
+    seq: Optional[int] = None
+    future: Optional[asyncio.Future] = None
+
+
+class MessageWriter:
+    """
+    Background writer that persists WebSocket messages in batches.
+
+    Messages are collected until MESSAGE_BATCH_MAX_SIZE is reached or
+    MESSAGE_BATCH_MAX_DELAY_MS has passed since the first one arrived, then
+    the inserts, the per-chat sequence numbers and updated_at bumps and the
+    inbox summaries are committed in a single transaction. Each submitter gets a future that resolves to the stored
+    message once it is durable.
+    """
+
+    def __init__(
+        self,
+        session_factory=AsyncSessionLocal,
+        max_batch_size: int = settings.MESSAGE_BATCH_MAX_SIZE,
+        max_delay_ms: int = settings.MESSAGE_BATCH_MAX_DELAY_MS
+    ):
+        self.session_factory = session_factory
+        self.max_batch_size = max_batch_size
+        self.max_delay = max_delay_ms / 1000
+        self.messages_written = 0
+        self.commits = 0
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._queue = asyncio.Queue()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Flush whatever is queued and stop the writer task"""
+        if self._task is None:
+            return
+        await self._queue.put(None)
+        await self._task
+        self._task = None
+
+    def submit(
+        self,
+        chat_id: int,
+        sender_username: str,
+        content: str,
+        message_type: str = "text",
+        media_url: Optional[str] = None
+    ) -> asyncio.Future:
+        """Queue a message for persistence; the future resolves to its stored fields"""
+        self.start()
+        pending = PendingMessage(
+            chat_id=chat_id,
+            sender_username=sender_username,
+            content=content,
+            message_type=message_type,
+            media_url=media_url,
+            future=asyncio.get_running_loop().create_future()
+        )
+        self._queue.put_nowait(pending)
+        return pending.future
+
+    @property
+    def commits_per_message(self) -> float:
+        return self.commits / self.messages_written if self.messages_written else 0.0
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        stopping = False
+        while not stopping:
+            first = await self._queue.get()
+            if first is None:
+                break
+            batch = [first]
+            deadline = loop.time() + self.max_delay
+            while len(batch) < self.max_batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    pending = await asyncio.wait_for(self._queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                if pending is None:
+                    stopping = True
+                    break
+                batch.append(pending)
+            await self._flush(batch)
+
+    async def _flush(self, batch: List[PendingMessage]):
+        try:
+            results = await self._write_batch(batch)
+        except Exception as e:
+            # One bad row fails the whole transaction; retry individually to isolate it
+            print(f"Batch write failed, retrying one by one: {str(e)}")
+            results = []
+            for pending in batch:
+                try:
+                    results.extend(await self._write_batch([pending]))
+                except Exception as row_error:
+                    results.append(row_error)
+
+        for pending, result in zip(batch, results):
+            if pending.future.done():
+                continue
+            if isinstance(result, Exception):
+                pending.future.set_exception(result)
+            else:
+                pending.future.set_result(result)
+
+    async def _write_batch(self, batch: List[PendingMessage]) -> List[dict]:
+        async with self.session_factory() as db:
+            try:
+                by_chat: Dict[int, List[PendingMessage]] = {}
+                for pending in batch:
+                    by_chat.setdefault(pending.chat_id, []).append(pending)
+
+                # Number each chat's messages in arrival order from its reserved range
+                for chat_id, chat_batch in by_chat.items():
+                    last_seq = await advance_chat(
+                        db, chat_id, len(chat_batch), chat_batch[-1].created_at
+                    )
+                    # Stamped under the chat's lock, so created_at order agrees with seq order
+                    stored_at = datetime.utcnow()
+                    for offset, pending in enumerate(chat_batch):
+                        pending.seq = last_seq - len(chat_batch) + 1 + offset
+                        pending.created_at = stored_at
+
+                messages = [
+                    MessageModel(
+                        seq=pending.seq,
+                        content=pending.content,
+                        chat_id=pending.chat_id,
+                        sender_user=pending.sender_username,
+                        message_type=MessageTypeModel(pending.message_type),
+                        media_url=pending.media_url,
+                        created_at=pending.created_at
+                    )
+                    for pending in batch
+                ]
+                db.add_all(messages)
+                await db.flush()
+                await ChatSummaryService(db).record_messages(messages)
+
+                # Build results before commit so expiry doesn't reload every row
+                results = [message_payload(message) for message in messages]
+                responses = [MessageResponse.from_orm(message) for message in messages]
+                await db.commit()
+            except Exception:
+                await db.rollback()
+                raise
+
+        for response in responses:
+            recent_messages.append(response)
+        self.commits += 1
+        self.messages_written += len(messages)
+        return results
+
+
+message_writer = MessageWriter()
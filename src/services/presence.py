@@ -0,0 +1,271 @@
+import asyncio
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Set
+
+from sqlalchemy import and_, select
+from sqlalchemy.orm import aliased
+
+from ..core.config import settings
+from ..core.flusher import DebouncedFlusher
+from ..db.base import AsyncSessionLocal
+from ..models.associations import chat_users
+from ..models.user import User as UserModel
+from .user import UserService
+
+PRESENCE_CHANNEL = "presence"
+OFFLINE = "offline"
+
+
+class PresenceBatcher(DebouncedFlusher):
+    """
+    Collects presence changes and sends them as periodic diffs.
+
+    Within one interval only a user's latest status counts, and a status that
+    ends up where it started is not sent at all. Only users last published as
+    something other than offline are remembered. Each flush publishes the diff
+    on the presence channel; every worker then sends each of its connected
+    users one frame with just the changes of people they share a chat with.
+    """
+
+    def __init__(
+        self,
+        connection_manager,
+        session_factory=AsyncSessionLocal,
+        interval_ms: int = settings.PRESENCE_BATCH_INTERVAL_MS
+    ):
+        super().__init__(interval_ms)
+        self.connection_manager = connection_manager
+        self.session_factory = session_factory
+        self.flushes = 0
+        self._published: Dict[str, str] = {}
+        self._pending: Dict[str, str] = {}
+        self._listening = False
+
+    async def listen(self):
+        """Start delivering the diffs published by every worker"""
+        if not self._listening:
+            self._listening = True
+            await self.connection_manager.add_channel_handler(PRESENCE_CHANNEL, self._deliver)
+
+    async def update(self, username: str, status: str):
+        await self.listen()
+        if self._published.get(username, OFFLINE) == status:
+            self._pending.pop(username, None)
+        else:
+            self._pending[username] = status
+            self.schedule()
+
+    async def flush(self):
+        if not self._pending:
+            return
+        changes, self._pending = self._pending, {}
+        for username, status in changes.items():
+            if status == OFFLINE:
+                self._published.pop(username, None)
+            else:
+                self._published[username] = status
+        self.flushes += 1
+        await self.connection_manager.backend.publish(PRESENCE_CHANNEL, {"changes": changes})
+
+    async def _deliver(self, message: dict):
+        changes: Dict[str, str] = message["changes"]
+        if not self.connection_manager.active_connections:
+            return
+        contacts = await self._contacts(changes)
+        for recipient, usernames in contacts.items():
+            await self.connection_manager.send_personal_message(recipient, {
+                "type": "presence",
+                "changes": {username: changes[username] for username in usernames}
+            })
+
+    async def _contacts(self, changed: Iterable[str]) -> Dict[str, Set[str]]:
+        """For each user connected here, which of the changed users they share a chat with"""
+        theirs = aliased(chat_users)
+        mine = aliased(chat_users)
+        async with self.session_factory() as db:
+            rows = await db.execute(
+                select(mine.c.username, theirs.c.username)
+                .join(mine, mine.c.chat_id == theirs.c.chat_id)
+                .where(
+                    and_(
+                        theirs.c.username.in_(list(changed)),
+                        mine.c.username != theirs.c.username
+                    )
+                )
+                .distinct()
+            )
+        connected = self.connection_manager.active_connections
+        contacts: Dict[str, Set[str]] = {}
+        for recipient, username in rows:
+            if recipient in connected:
+                contacts.setdefault(recipient, set()).add(username)
+        return contacts
+
+
+@dataclass
+class PresenceState:
+    devices: int = 0
+    online: bool = False
+    last_heartbeat: float = 0.0
+    last_seen: Optional[datetime] = None
+
+
+class PresenceRegistry:
+    """
+    Who is online on this worker, kept in memory.
+
+    A user is online while at least one of their connections is open and
+    heartbeats keep arriving; a connection that goes quiet for longer than the
+    heartbeat timeout counts as gone until it speaks again. Transitions are
+    written to users.is_online/last_seen in one bulk UPDATE per flush
+    interval instead of one commit per event.
+    """
+
+    def __init__(
+        self,
+        session_factory=AsyncSessionLocal,
+        flush_interval_ms: int = settings.PRESENCE_FLUSH_INTERVAL_MS,
+        heartbeat_timeout: float = settings.PRESENCE_HEARTBEAT_TIMEOUT_SECONDS,
+        on_change: Optional[Callable[[str, str], Awaitable[None]]] = None,
+        clock=time.monotonic
+    ):
+        self.session_factory = session_factory
+        self.interval = flush_interval_ms / 1000
+        self.heartbeat_timeout = heartbeat_timeout
+        self.on_change = on_change
+        self.clock = clock
+        self.flushes = 0
+        self._states: Dict[str, PresenceState] = {}
+        self._dirty: Set[str] = set()
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Flush and stop; everyone still connected is recorded as offline"""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        now = datetime.utcnow()
+        for username, state in self._states.items():
+            if state.online:
+                state.online = False
+                state.last_seen = now
+                self._dirty.add(username)
+        await self.flush()
+
+    async def connected(self, username: str):
+        self.start()
+        state = self._states.setdefault(username, PresenceState())
+        state.devices += 1
+        state.last_heartbeat = self.clock()
+        if not state.online:
+            await self._transition(username, state, True)
+
+    async def disconnected(self, username: str):
+        state = self._states.get(username)
+        if state is None or state.devices == 0:
+            return
+        state.devices -= 1
+        if state.devices == 0 and state.online:
+            await self._transition(username, state, False)
+
+    async def heartbeat(self, username: str):
+        state = self._states.get(username)
+        if state is None or state.devices == 0:
+            return
+        state.last_heartbeat = self.clock()
+        if not state.online:
+            await self._transition(username, state, True)
+
+    def is_online(self, username: str) -> bool:
+        state = self._states.get(username)
+        return state is not None and state.online
+
+    async def lookup(self, usernames: Iterable[str]) -> Dict[str, dict]:
+        """
+        is_online/last_seen for many users at once.
+
+        Users this worker tracks are answered from memory; only the rest are
+        read from the users table, in a single query.
+        """
+        result: Dict[str, dict] = {}
+        missing: List[str] = []
+        for username in set(usernames):
+            state = self._states.get(username)
+            if state is None:
+                missing.append(username)
+            else:
+                result[username] = {
+                    "is_online": state.online,
+                    # An online user was last seen at their latest heartbeat
+                    "last_seen": datetime.utcnow() if state.online else state.last_seen
+                }
+        if missing:
+            async with self.session_factory() as db:
+                rows = await db.execute(
+                    select(UserModel.username, UserModel.is_online, UserModel.last_seen)
+                    .where(UserModel.username.in_(missing))
+                )
+                for username, is_online, last_seen in rows:
+                    result[username] = {"is_online": bool(is_online), "last_seen": last_seen}
+        return result
+
+    async def expire(self) -> List[str]:
+        """Mark users whose connections have all gone quiet as offline"""
+        deadline = self.clock() - self.heartbeat_timeout
+        expired = [
+            username for username, state in self._states.items()
+            if state.online and state.last_heartbeat < deadline
+        ]
+        for username in expired:
+            await self._transition(username, self._states[username], False)
+        return expired
+
+    async def flush(self) -> int:
+        """Persist pending transitions with one bulk UPDATE"""
+        if not self._dirty:
+            return 0
+        dirty, self._dirty = self._dirty, set()
+        rows = [
+            {
+                "username": username,
+                "is_online": self._states[username].online,
+                "last_seen": self._states[username].last_seen
+            }
+            for username in dirty
+        ]
+        try:
+            async with self.session_factory() as db:
+                await UserService(db).save_presence(rows)
+        except Exception:
+            self._dirty |= dirty
+            raise
+        self.flushes += 1
+        # Offline users are now correct in the database; stop tracking them
+        for username in dirty:
+            state = self._states.get(username)
+            if state is not None and state.devices == 0 and not state.online:
+                del self._states[username]
+        return len(rows)
+
+    async def _transition(self, username: str, state: PresenceState, online: bool):
+        state.online = online
+        state.last_seen = datetime.utcnow()
+        self._dirty.add(username)
+        if self.on_change is not None:
+            await self.on_change(username, "online" if online else OFFLINE)
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.expire()
+                await self.flush()
+            except Exception as e:
+                print(f"Presence persistence error: {str(e)}")
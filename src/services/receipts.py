@@ -0,0 +1,77 @@
+from typing import Dict, Set, Tuple
+
+from ..core.config import settings
+from ..core.flusher import DebouncedFlusher
+from ..db.base import AsyncSessionLocal
+from .chat_summary import ChatSummaryService
+
+
+class ReadReceiptBatcher(DebouncedFlusher):
+    """
+    Debounces read receipts into watermark writes and one broadcast per chat.
+
+    A receipt means "read everything up to seq", so within one interval only
+    each member's highest seq matters. Every flush writes all of them with a
+    single executemany UPDATE and then sends each chat one "read_receipts"
+    frame with the stored watermarks of everyone who moved.
+    """
+
+    def __init__(
+        self,
+        connection_manager,
+        session_factory=AsyncSessionLocal,
+        interval_ms: int = settings.READ_RECEIPT_FLUSH_INTERVAL_MS
+    ):
+        super().__init__(interval_ms)
+        self.connection_manager = connection_manager
+        self.session_factory = session_factory
+        self.received = 0
+        self.flushes = 0
+        self._pending: Dict[int, Dict[str, int]] = {}
+        # Receipts already stored elsewhere (REST) that only need announcing
+        self._persisted: Set[Tuple[int, str, int]] = set()
+
+    def update(self, chat_id: int, username: str, seq: int, persisted: bool = False):
+        self.received += 1
+        readers = self._pending.setdefault(chat_id, {})
+        if seq > readers.get(username, 0):
+            readers[username] = seq
+            if persisted:
+                self._persisted.add((chat_id, username, seq))
+            self.schedule()
+
+    async def flush(self):
+        if not self._pending:
+            return
+        pending, self._pending = self._pending, {}
+        persisted, self._persisted = self._persisted, set()
+        receipts = []
+        announce: Dict[int, Dict[str, int]] = {}
+        for chat_id, readers in pending.items():
+            for username, seq in readers.items():
+                if (chat_id, username, seq) in persisted:
+                    announce.setdefault(chat_id, {})[username] = seq
+                else:
+                    receipts.append((chat_id, username, seq))
+        if receipts:
+            try:
+                async with self.session_factory() as db:
+                    moved = await ChatSummaryService(db).set_watermarks(receipts)
+                    await db.commit()
+            except Exception:
+                # Keep them for the next flush; a later receipt may supersede them
+                for chat_id, readers in pending.items():
+                    for username, seq in readers.items():
+                        current = self._pending.setdefault(chat_id, {})
+                        current[username] = max(current.get(username, 0), seq)
+                raise
+            # Receipts beyond last_seq are announced clamped, stale ones not at all
+            for (chat_id, username), watermark in moved.items():
+                announce.setdefault(chat_id, {})[username] = watermark
+        self.flushes += 1
+        for chat_id, watermarks in announce.items():
+            await self.connection_manager.broadcast_to_room(chat_id, {
+                "type": "read_receipts",
+                "chat_id": chat_id,
+                "watermarks": watermarks
+            })
@@ -0,0 +1,121 @@
+import html
+import re
+from abc import ABC, abstractmethod
+from typing import Optional
+
+from sqlalchemy import func, literal_column, select
+from sqlalchemy.sql import ColumnElement, Subquery
+
+from ..core.config import settings
+from ..models.chat import Chat as ChatModel
+from ..models.search_index import chats_fts, messages_fts
+
+# The engine brackets matched terms with control characters, which can't be
+# confused with markup; highlight() escapes the text and swaps in these tags
+MATCH_START = "\x02"
+MATCH_END = "\x03"
+HIGHLIGHT_START = "<mark>"
+HIGHLIGHT_END = "</mark>"
+
+MAX_QUERY_TERMS = 16
+
+
+class SearchBackend(ABC):
+    """
+    Full-text search over message content and chat names.
+
+    A backend turns user input into its engine's query syntax and supplies
+    the matching, ranking and highlighting SQL; ChatService adds membership
+    filtering and pagination on top. Lower rank is a better match. A
+    Postgres backend would map the same interface onto tsvector columns with
+    GIN indexes: websearch_to_tsquery for the match, -ts_rank_cd for rank and
+    ts_headline for snippets.
+    """
+
+    @abstractmethod
+    def message_matches(self, query: str) -> Optional[Subquery]:
+        """
+        (id, rank, snippet) of every message matching query, or None if query has no terms.
+
+        Snippets mark matches with MATCH_START/MATCH_END; pass them through highlight().
+        """
+
+    @abstractmethod
+    def chat_filter(self, query: str) -> Optional[ColumnElement]:
+        """Condition on chats matching query by name or description, or None if query has no terms"""
+
+    @staticmethod
+    def highlight(snippet: str) -> str:
+        """
+        HTML-escaped snippet with matches wrapped in <mark>.
+
+        Marker characters stored in the message itself can at worst shift a
+        highlight: the tags always come out balanced and nothing else is markup.
+        """
+        parts = []
+        inside = False
+        for piece in re.split(f"([{MATCH_START}{MATCH_END}])", snippet):
+            if piece == MATCH_START:
+                if not inside:
+                    parts.append(HIGHLIGHT_START)
+                    inside = True
+            elif piece == MATCH_END:
+                if inside:
+                    parts.append(HIGHLIGHT_END)
+                    inside = False
+            else:
+                parts.append(html.escape(piece))
+        if inside:
+            parts.append(HIGHLIGHT_END)
+        return "".join(parts)
+
+
+class SQLiteFTSBackend(SearchBackend):
+    """FTS5 with bm25 ranking; every term must appear, the last one as a prefix"""
+
+    def __init__(self, snippet_tokens: int = settings.SEARCH_SNIPPET_TOKENS):
+        self.snippet_tokens = snippet_tokens
+
+    @staticmethod
+    def match_expression(query: str) -> Optional[str]:
+        # Only word characters reach FTS5, so user input can't use its query syntax
+        terms = re.findall(r"\w+", query)[:MAX_QUERY_TERMS]
+        if not terms:
+            return None
+        quoted = [f'"{term}"' for term in terms]
+        quoted[-1] += "*"
+        return " ".join(quoted)
+
+    def message_matches(self, query: str) -> Optional[Subquery]:
+        expression = self.match_expression(query)
+        if expression is None:
+            return None
+        index = literal_column("messages_fts")
+        return (
+            select(
+                messages_fts.c.rowid.label("id"),
+                messages_fts.c.rank.label("rank"),
+                func.snippet(
+                    index, 0, MATCH_START, MATCH_END, "…", self.snippet_tokens
+                ).label("snippet")
+            )
+            .where(index.op("MATCH")(expression))
+            .subquery()
+        )
+
+    def chat_filter(self, query: str) -> Optional[ColumnElement]:
+        expression = self.match_expression(query)
+        if expression is None:
+            return None
+        return ChatModel.id.in_(
+            select(chats_fts.c.rowid).where(literal_column("chats_fts").op("MATCH")(expression))
+        )
+
+
+def create_search_backend(name: str = settings.SEARCH_BACKEND) -> SearchBackend:
+    if name == "fts5":
+        return SQLiteFTSBackend()
+    raise ValueError(f"Unknown search backend: {name}")
+
+
+search_backend = create_search_backend()
@@ -1,33 +1,35 @@
 from typing import List, Optional
-from sqlalchemy.orm import Session
+from sqlalchemy import bindparam, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
 from fastapi import HTTPException
 from datetime import datetime
 
 from ..models.user import User as UserModel
 from ..schemas.user import UserCreate, UserUpdate
-from ..core.security import get_password_hash
+from ..core.cache import token_cache
+from ..core.security import password_hasher
 
 class UserService:
-    def __init__(self, db: Session):
+    def __init__(self, db: AsyncSession):
         self.db = db
 
-    def get_user(self, user_id: int) -> UserModel:
-        user = self.db.query(UserModel).filter(UserModel.id == user_id).first()
+    async def get_user(self, username: str) -> UserModel:
+        user = await self.db.scalar(select(UserModel).where(UserModel.username == username))
         if not user:
             raise HTTPException(status_code=404, detail="User not found")
         return user
 
-    def get_user_by_email(self, email: str) -> Optional[UserModel]:
-        return self.db.query(UserModel).filter(UserModel.email == email).first()
+    async def get_user_by_email(self, email: str) -> Optional[UserModel]:
+        return await self.db.scalar(select(UserModel).where(UserModel.email == email))
 
-    def get_users(self, skip: int = 0, limit: int = 100) -> List[UserModel]:
-        return self.db.query(UserModel).offset(skip).limit(limit).all()
+    async def get_users(self, skip: int = 0, limit: int = 100) -> List[UserModel]:
+        return (await self.db.scalars(select(UserModel).offset(skip).limit(limit))).all()
 
-    def create_user(self, user_data: UserCreate) -> UserModel:
-        if self.get_user_by_email(user_data.email):
+    async def create_user(self, user_data: UserCreate) -> UserModel:
+        if await self.get_user_by_email(user_data.email):
             raise HTTPException(status_code=400, detail="Email already registered")
 
-        hashed_password = get_password_hash(user_data.password)
+        hashed_password = await password_hasher.hash(user_data.password)
         user = UserModel(
             email=user_data.email,
             username=user_data.username,
@@ -40,33 +42,47 @@ class UserService:
         )
         
         self.db.add(user)
-        self.db.commit()
-        self.db.refresh(user)
+        await self.db.commit()
+        await self.db.refresh(user)
         return user
 
-    def update_user(self, user_id: int, user_data: UserUpdate) -> UserModel:
-        user = self.get_user(user_id)
+    async def update_user(self, username: str, user_data: UserUpdate) -> UserModel:
+        user = await self.get_user(username)
         
         update_data = user_data.dict(exclude_unset=True)
         if "password" in update_data:
-            update_data["hashed_password"] = get_password_hash(update_data.pop("password"))
+            update_data["hashed_password"] = await password_hasher.hash(update_data.pop("password"))
             
         for field, value in update_data.items():
             setattr(user, field, value)
             
-        self.db.commit()
-        self.db.refresh(user)
+        await self.db.commit()
+        token_cache.invalidate_user(username)
+        await self.db.refresh(user)
         return user
 
-    def update_last_seen(self, user_id: int) -> UserModel:
-        user = self.get_user(user_id)
-        user.last_seen = datetime.utcnow()
-        self.db.commit()
+    async def deactivate_user(self, username: str) -> UserModel:
+        user = await self.get_user(username)
+        user.is_active = False
+        await self.db.commit()
+        # Cached tokens would otherwise keep working until they expire from the cache
+        token_cache.invalidate_user(username)
         return user
 
-    def set_online_status(self, user_id: int, is_online: bool) -> UserModel:
-        user = self.get_user(user_id)
-        user.is_online = is_online
-        user.last_seen = datetime.utcnow()
-        self.db.commit()
-        return user
\ No newline at end of file
+    async def save_presence(self, rows: List[dict]):
+        """Write is_online/last_seen for many users in one executemany UPDATE"""
+        if not rows:
+            return
+        # Core executemany rather than ORM bulk UPDATE, which fails the whole
+        # batch when one of the users has been deleted in the meantime
+        users = UserModel.__table__
+        await self.db.execute(
+            update(users)
+            .where(users.c.username == bindparam("b_username"))
+            .values(is_online=bindparam("b_is_online"), last_seen=bindparam("b_last_seen")),
+            [
+                {"b_username": row["username"], "b_is_online": row["is_online"], "b_last_seen": row["last_seen"]}
+                for row in rows
+            ]
+        )
+        await self.db.commit()
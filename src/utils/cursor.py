@@ -0,0 +1,36 @@
+import base64
+import json
+from datetime import datetime
+from typing import Tuple
+
+from fastapi import HTTPException
+
+
+def encode_cursor(created_at: datetime, message_id: int) -> str:
+    """Opaque keyset cursor for a (created_at, id) position"""
+    raw = json.dumps([created_at.isoformat(), message_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, message_id = json.loads(base64.urlsafe_b64decode(padded))
+        return datetime.fromisoformat(created_at), int(message_id)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def encode_rank_cursor(rank: float, message_id: int, through_id: int) -> str:
+    """Opaque keyset cursor for a (search rank, id) position in results up to message through_id"""
+    raw = json.dumps([rank, message_id, through_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_rank_cursor(cursor: str) -> Tuple[float, int, int]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        rank, message_id, through_id = json.loads(base64.urlsafe_b64decode(padded))
+        return float(rank), int(message_id), int(through_id)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
@@ -1,45 +1,146 @@
+import asyncio
+import json
 import pytest
 from fastapi.testclient import TestClient
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker
-from sqlalchemy.pool import StaticPool
+from sqlalchemy.pool import NullPool
 
-from src.db..db.base import Base
-from src.db.session import get_db
+from src.db.base import Base, to_async_url
+from src.api.dependencies import get_async_db
 from src.main import app
+from src.core.cache import membership_cache, recent_messages
 from src.core.security import get_password_hash
 from src.models.user import User
 from src.models.chat import Chat
 
-# Create test database
-SQLALCHEMY_DATABASE_URL = "sqlite://"
-engine = create_engine(
-    SQLALCHEMY_DATABASE_URL,
-    connect_args={"check_same_thread": False},
-    poolclass=StaticPool,
-)
-TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+class FakeWebSocket:
+    """Stands in for a Starlette WebSocket and records the JSON frames sent to it"""
+
+    def __init__(self, headers=None, query_params=None):
+        self.headers = headers or {}
+        self.query_params = query_params or {}
+        self.sent = []
+        self.subprotocol = None
+        self.closed = False
+
+    async def accept(self, subprotocol=None):
+        self.subprotocol = subprotocol
+
+    async def send_text(self, data):
+        self.sent.append(json.loads(data))
+
+    async def close(self, code=1000, reason=None):
+        self.closed = True
+
+    def of_type(self, message_type):
+        return [message for message in self.sent if message["type"] == message_type]
+
+class FakeClock:
+    """Stands in for time.monotonic in components that take a clock; tests move now by hand"""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+class StatementCounter:
+    """Records the SQL an async session factory's engine executes inside a with block"""
+
+    def __init__(self, session_factory):
+        self.engine = session_factory.kw["bind"].sync_engine
+        # (statement, parameters, executemany)
+        self.executed = []
+
+    @property
+    def statements(self):
+        return [statement for statement, _, _ in self.executed]
+
+    @property
+    def count(self):
+        return len(self.executed)
+
+    def starting_with(self, *verbs):
+        return [statement for statement in self.statements if statement.lstrip().upper().startswith(verbs)]
+
+    def __enter__(self):
+        self.executed = []
+        event.listen(self.engine, "before_cursor_execute", self._record)
+        return self
+
+    def __exit__(self, *exc):
+        event.remove(self.engine, "before_cursor_execute", self._record)
+
+    def _record(self, conn, cursor, statement, parameters, context, executemany):
+        self.executed.append((statement, parameters, executemany))
+
+async def wait_for(predicate, timeout=2.0):
+    """Yield to the event loop until predicate() holds; fails after timeout seconds"""
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    while not predicate():
+        assert loop.time() < deadline, "timed out"
+        await asyncio.sleep(0.005)
+
+@pytest.fixture(autouse=True)
+def clear_membership_cache():
+    # Chat ids repeat across the per-test databases
+    membership_cache.clear()
+    recent_messages.clear()
 
 @pytest.fixture
-def db_session():
+def db_url(tmp_path):
+    """File-backed SQLite so sync and async engines see the same data"""
+    url = f"sqlite:///{tmp_path / 'test.db'}"
+    engine = create_engine(url)
     Base.metadata.create_all(bind=engine)
-    db = TestingSessionLocal()
+    engine.dispose()
+    return url
+
+@pytest.fixture
+def async_session_factory(db_url):
+    # NullPool: every asyncio.run() gets fresh connections bound to its own loop
+    engine = create_async_engine(to_async_url(db_url), poolclass=NullPool)
+    try:
+        yield async_sessionmaker(bind=engine, autoflush=False, expire_on_commit=False)
+    finally:
+        asyncio.run(engine.dispose())
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+@pytest.fixture
+def sql_statements(async_session_factory):
+    """StatementCounter on the test database; enter it around the code to measure"""
+    return StatementCounter(async_session_factory)
+
+@pytest.fixture
+def db_session(db_url):
+    # The same file the client's async sessions use, so seeded rows are visible to requests
+    engine = create_engine(db_url)
+    db = sessionmaker(autocommit=False, autoflush=False, bind=engine)()
     try:
         yield db
     finally:
         db.close()
-        Base.metadata.drop_all(bind=engine)
+        engine.dispose()
 
 @pytest.fixture
-def client(db_session):
-    def override_get_db():
-        try:
-            yield db_session
-        finally:
-            db_session.close()
-    
-    app.dependency_overrides[get_db] = override_get_db
-    return TestClient(app)
+def client(async_session_factory, monkeypatch):
+    async def override_get_async_db():
+        async with async_session_factory() as db:
+            yield db
+
+    app.dependency_overrides[get_async_db] = override_get_async_db
+    # The WebSocket endpoint opens its own session to authenticate
+    monkeypatch.setattr("src.api.endpoints.ws.AsyncSessionLocal", async_session_factory)
+    try:
+        yield TestClient(app)
+    finally:
+        app.dependency_overrides.pop(get_async_db, None)
 
 @pytest.fixture
 def test_user(db_session):
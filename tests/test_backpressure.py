@@ -0,0 +1,120 @@
+import asyncio
+
+from src.core.events import BackpressurePolicy, ClientConnection, ConnectionManager
+from src.core.pubsub import MemoryBackend
+
+from conftest import FakeWebSocket
+
+
+class StalledWebSocket(FakeWebSocket):
+    """Never finishes a send, so frames pile up in the queue"""
+
+    async def send_text(self, data):
+        await asyncio.Event().wait()
+
+
+def message(frame_type, **fields):
+    return {"type": frame_type, **fields}
+
+
+def queued_types(connection):
+    return [frame.message["type"] for frame in connection.queue]
+
+
+def test_drop_oldest_sheds_ephemeral_frames_first():
+    async def scenario():
+        # No writer task: everything stays queued
+        connection = ClientConnection(
+            StalledWebSocket(), "alice", max_queue_size=3, policy=BackpressurePolicy.DROP_OLDEST
+        )
+        results = [
+            connection.enqueue(message("new_message", id=1)),
+            connection.enqueue(message("typing", username="bob", chat_id=1)),
+            connection.enqueue(message("new_message", id=2)),
+            # Full: the typing frame makes way
+            connection.enqueue(message("new_message", id=3)),
+            # Full of durable frames: a new ephemeral one is the one dropped
+            connection.enqueue(message("presence", username="bob")),
+        ]
+        return results, queued_types(connection), connection.dropped_count, connection.closed
+
+    results, types, dropped, closed = asyncio.run(scenario())
+
+    assert results == [True, True, True, True, False]
+    assert types == ["new_message"] * 3
+    assert dropped == 2
+    assert not closed
+
+
+def test_coalesce_replaces_the_queued_frame_with_the_same_key():
+    async def scenario():
+        connection = ClientConnection(
+            StalledWebSocket(), "alice", max_queue_size=3, policy=BackpressurePolicy.COALESCE
+        )
+        connection.enqueue(message("typing", username="bob", chat_id=1, is_typing=True))
+        connection.enqueue(message("typing", username="carol", chat_id=1, is_typing=True))
+        connection.enqueue(message("new_message", id=1))
+        # Same (type, username, chat_id) as the first frame: it takes its place, even with the queue full
+        replaced = connection.enqueue(message("typing", username="bob", chat_id=1, is_typing=False))
+        return replaced, [frame.message for frame in connection.queue], connection.dropped_count
+
+    replaced, queued, dropped = asyncio.run(scenario())
+
+    assert replaced
+    assert queued == [
+        message("typing", username="bob", chat_id=1, is_typing=False),
+        message("typing", username="carol", chat_id=1, is_typing=True),
+        message("new_message", id=1),
+    ]
+    assert dropped == 0
+
+
+def test_full_queue_of_durable_frames_disconnects():
+    async def scenario():
+        closed = []
+
+        async def on_close(connection):
+            closed.append(connection.username)
+
+        socket = StalledWebSocket()
+        connection = ClientConnection(
+            socket, "alice", max_queue_size=2, policy=BackpressurePolicy.DROP_OLDEST, on_close=on_close
+        )
+        connection.enqueue(message("new_message", id=1))
+        connection.enqueue(message("new_message", id=2))
+        accepted = connection.enqueue(message("new_message", id=3))
+        await asyncio.sleep(0)
+        after_close = connection.enqueue(message("new_message", id=4))
+        return accepted, after_close, connection.closed, socket.closed, closed, connection.queue_depth
+
+    accepted, after_close, closed, socket_closed, on_close_calls, depth = asyncio.run(scenario())
+
+    assert not accepted and not after_close
+    assert closed and socket_closed
+    assert on_close_calls == ["alice"]
+    assert depth == 0
+
+
+def test_queue_depths_and_drops_are_reported_per_connection():
+    async def scenario():
+        manager = ConnectionManager(MemoryBackend())
+        connections = {}
+        for username in ("alice", "bob"):
+            connections[username] = await manager.connect(StalledWebSocket(), username)
+            connections[username].max_queue_size = 2
+        # The writer task takes the first frame and stalls on it; the rest queue up
+        await manager.send_personal_message("alice", message("new_message", id=1))
+        await asyncio.sleep(0)
+        await manager.send_personal_message("alice", message("typing", username="bob", chat_id=1))
+        await manager.send_personal_message("alice", message("new_message", id=2))
+        await manager.send_personal_message("alice", message("new_message", id=3))
+        depths = manager.queue_depths()
+        dropped = {username: connection.dropped_count for username, connection in connections.items()}
+        for username in ("alice", "bob"):
+            await manager.disconnect(username)
+        return depths, dropped
+
+    depths, dropped = asyncio.run(scenario())
+
+    assert depths == {"alice": 2, "bob": 0}
+    assert dropped == {"alice": 1, "bob": 0}
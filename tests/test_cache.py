@@ -0,0 +1,69 @@
+import asyncio
+from datetime import timedelta
+
+import pytest
+from fastapi import HTTPException
+
+from src.api.dependencies import get_current_user
+from src.core.cache import TTLCache, token_cache
+from src.core.security import create_access_token
+from src.models.user import User
+from src.services.user import UserService
+
+
+def test_ttl_cache_evicts_least_recently_used_and_expired(clock):
+    evicted = []
+    cache = TTLCache(maxsize=2, ttl=10, clock=clock, on_evict=lambda key, value: evicted.append(key))
+
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    assert evicted == ["b"]
+
+    clock.now = 10
+    assert cache.get("a") is None
+    assert cache.get("c") is None
+    assert evicted == ["b", "a", "c"]
+    assert (cache.hits, cache.misses) == (1, 3)
+
+
+@pytest.fixture
+def fresh_token_cache():
+    token_cache.clear()
+    yield token_cache
+    token_cache.clear()
+
+
+def test_get_current_user_served_from_cache_until_deactivated(async_session_factory, fresh_token_cache, sql_statements):
+    token = create_access_token({"sub": "alice"}, expires_delta=timedelta(minutes=5))
+
+    async def scenario():
+        async with async_session_factory() as db:
+            db.add(User(username="alice", email="alice@example.com", full_name="Alice", hashed_password="x"))
+            await db.commit()
+
+        with sql_statements:
+            async with async_session_factory() as db:
+                first = await get_current_user(db=db, token=token)
+                queries_after_first = sql_statements.count
+                second = await get_current_user(db=db, token=token)
+                queries_after_second = sql_statements.count
+
+        async with async_session_factory() as db:
+            await UserService(db).deactivate_user("alice")
+            with pytest.raises(HTTPException) as rejected:
+                await get_current_user(db=db, token=token)
+
+        return first, second, queries_after_first, queries_after_second, rejected.value
+
+    first, second, queries_after_first, queries_after_second, rejected = asyncio.run(scenario())
+
+    assert first == second
+    assert first.username == "alice"
+    assert queries_after_first == 1
+    assert queries_after_second == 1
+    assert fresh_token_cache.hits == 1
+    assert rejected.status_code == 401
+    assert rejected.detail == "User is inactive"
@@ -1,12 +1,24 @@
+import asyncio
+from datetime import datetime, timedelta
+
 import pytest
 from fastapi import status
+
 from src.core.security import create_access_token
+from src.models.chat import Chat
+from src.models.chat_summary import ChatSummary
+from src.models.message import Message
+from src.models.user import User
+from src.services.chat import ChatService
+from src.services.chat_summary import ChatSummaryService
+
 
 @pytest.fixture
 def auth_headers(test_user):
     access_token = create_access_token({"sub": str(test_user.id)})
     return {"Authorization": f"Bearer {access_token}"}
 
+
 def test_create_chat(client, test_user, auth_headers):
     response = client.post(
         "/chats/",
@@ -21,6 +33,7 @@ def test_create_chat(client, test_user, auth_headers):
     assert response.status_code == status.HTTP_201_CREATED
     assert response.json()["name"] == "New Chat"
 
+
 def test_get_chat(client, test_chat, auth_headers):
     response = client.get(
         f"/chats/{test_chat.id}",
@@ -29,6 +42,7 @@ def test_get_chat(client, test_chat, auth_headers):
     assert response.status_code == status.HTTP_200_OK
     assert response.json()["id"] == test_chat.id
 
+
 def test_update_chat(client, test_chat, auth_headers):
     response = client.patch(
         f"/chats/{test_chat.id}",
@@ -38,6 +52,7 @@ def test_update_chat(client, test_chat, auth_headers):
     assert response.status_code == status.HTTP_200_OK
     assert response.json()["name"] == "Updated Chat Name"
 
+
 def test_delete_chat(client, test_chat, auth_headers):
     response = client.delete(
         f"/chats/{test_chat.id}",
@@ -45,10 +60,126 @@ def test_delete_chat(client, test_chat, auth_headers):
     )
     assert response.status_code == status.HTTP_204_NO_CONTENT
 
+
 def test_get_user_chats(client, test_chat, auth_headers):
     response = client.get(
         "/chats/",
         headers=auth_headers
     )
     assert response.status_code == status.HTTP_200_OK
-    assert len(response.json()) >= 1
\ No newline at end of file
+    assert len(response.json()) >= 1
+
+
+async def _seed_inbox(db, chat_count, unread_every=1):
+    owner = User(username="owner", email="owner@example.com", full_name="Owner", hashed_password="x")
+    friend = User(username="friend", email="friend@example.com", full_name="Friend", hashed_password="x")
+    db.add_all([owner, friend])
+    start = datetime(2025, 1, 1)
+    for i in range(chat_count):
+        chat = Chat(
+            name=f"chat{i}", is_group=True, updated_at=start + timedelta(minutes=i), last_seq=2, users=[owner, friend]
+        )
+        db.add(chat)
+        await db.flush()
+        db.add_all([
+            Message(chat_id=chat.id, seq=1, sender_user="owner", content=f"hello {i}", created_at=start),
+            Message(
+                chat_id=chat.id,
+                seq=2,
+                sender_user="friend",
+                content=f"latest {i}",
+                created_at=start + timedelta(seconds=1),
+                read_at=None if i % unread_every == 0 else start
+            ),
+        ])
+    await db.commit()
+    await ChatSummaryService(db).rebuild()
+    await db.commit()
+
+
+@pytest.mark.parametrize("chat_count", [5, 60])
+def test_get_user_chats_constant_query_count(async_session_factory, sql_statements, chat_count):
+    async def scenario():
+        async with async_session_factory() as db:
+            await _seed_inbox(db, chat_count)
+        async with async_session_factory() as db:
+            with sql_statements:
+                return await ChatService(db).get_user_chats(username="owner", limit=100)
+
+    chats = asyncio.run(scenario())
+
+    assert len(chats) == chat_count
+    assert sql_statements.count <= 2
+    assert chats[0].name == f"chat{chat_count - 1}"
+    assert chats[0].last_message["content"] == f"latest {chat_count - 1}"
+    assert chats[0].unread_count == 1
+    assert sorted(chats[0].members) == ["friend", "owner"]
+
+
+def test_get_user_chats_unread_only_fills_page(async_session_factory):
+    async def scenario():
+        async with async_session_factory() as db:
+            # Only every third chat has an unread message
+            await _seed_inbox(db, 30, unread_every=3)
+            return await ChatService(db).get_user_chats(username="owner", limit=5, unread_only=True)
+
+    chats = asyncio.run(scenario())
+
+    assert len(chats) == 5
+    assert all(chat.unread_count == 1 for chat in chats)
+
+
+def test_send_message_and_read_update_summary(async_session_factory):
+    async def scenario():
+        async with async_session_factory() as db:
+            await _seed_inbox(db, 1)
+            service = ChatService(db)
+            chat_id = (await service.get_user_chats(username="owner"))[0].id
+
+            message = await service.send_message(chat_id, "new one", "friend")
+
+            owner_row = await db.get(ChatSummary, (chat_id, "owner"))
+            await db.refresh(owner_row)
+            assert owner_row.last_message_id == message.id
+            assert owner_row.last_message_preview == "new one"
+            assert (await service.get_user_chats(username="owner"))[0].unread_count == 2
+            # Sending marks the chat read for the sender
+            assert (await service.get_user_chats(username="friend"))[0].unread_count == 0
+
+            assert await service.mark_as_read(chat_id, "owner") == message.seq
+            assert (await service.get_user_chats(username="owner"))[0].unread_count == 0
+
+    asyncio.run(scenario())
+
+
+def test_get_messages_page_keyset_handles_equal_timestamps(async_session_factory):
+    async def scenario():
+        async with async_session_factory() as db:
+            await _seed_inbox(db, 1)
+            service = ChatService(db)
+            chat_id = (await service.get_user_chats(username="owner"))[0].id
+            same_time = datetime(2025, 2, 1)
+            db.add_all([
+                Message(chat_id=chat_id, sender_user="friend", content=f"burst {i}", created_at=same_time)
+                for i in range(7)
+            ])
+            await db.commit()
+
+            seen = []
+            page = await service.get_messages_page(chat_id, "owner", limit=3)
+            first_prev = page.prev_cursor
+            while True:
+                seen.extend(message.id for message in page.messages)
+                if not page.next_cursor:
+                    break
+                page = await service.get_messages_page(chat_id, "owner", cursor=page.next_cursor, limit=3)
+
+            newer = await service.get_messages_page(chat_id, "owner", cursor=first_prev, direction="newer")
+            return seen, first_prev, newer
+
+    seen, first_prev, newer = asyncio.run(scenario())
+
+    assert len(seen) == len(set(seen)) == 9
+    assert seen == sorted(seen, reverse=True)
+    assert newer.messages == []
+    assert newer.prev_cursor == first_prev
@@ -0,0 +1,112 @@
+import asyncio
+
+from src.core.coalescer import TypingCoalescer
+from src.core.events import ConnectionManager
+from src.models.chat import Chat
+from src.models.user import User
+from src.services.presence import PresenceBatcher
+
+from conftest import FakeWebSocket
+
+
+async def connect_all(manager, usernames, chat_id=None):
+    sockets = {}
+    for username in usernames:
+        sockets[username] = FakeWebSocket()
+        await manager.connect(sockets[username], username)
+        if chat_id is not None:
+            await manager.join_room(username, chat_id)
+    return sockets
+
+
+def test_typing_is_throttled_and_expires():
+    async def scenario():
+        manager = ConnectionManager()
+        sockets = await connect_all(manager, ("alice", "bob"), chat_id=1)
+        typing = TypingCoalescer(manager, throttle_ms=100, timeout_ms=150)
+
+        # A burst of keystrokes forwards one "started"
+        for _ in range(10):
+            await typing.update("alice", 1, True)
+        await asyncio.sleep(0.11)
+        # Past the throttle window one refresh goes out
+        await typing.update("alice", 1, True)
+        await typing.update("alice", 1, True)
+        # No stop event: the indicator expires on its own
+        await asyncio.sleep(0.2)
+        expired = not typing.is_typing("alice", 1)
+        # A stop with nothing to stop is dropped
+        await typing.update("alice", 1, False)
+        await asyncio.sleep(0.01)
+        return sockets, typing, expired
+
+    sockets, typing, expired = asyncio.run(scenario())
+
+    assert [frame["is_typing"] for frame in sockets["bob"].sent] == [True, True, False]
+    assert sockets["alice"].sent == []
+    assert expired
+    assert (typing.received, typing.forwarded) == (13, 3)
+
+
+def test_presence_changes_are_batched_to_contacts(async_session_factory):
+    async def scenario():
+        async with async_session_factory() as db:
+            users = {
+                name: User(username=name, email=f"{name}@example.com", full_name=name, hashed_password="x")
+                for name in ("alice", "bob", "carol", "dave")
+            }
+            db.add_all([
+                Chat(name="ab", is_group=True, users=[users["alice"], users["bob"]]),
+                Chat(name="bc", is_group=True, users=[users["bob"], users["carol"]]),
+                users["dave"],
+            ])
+            await db.commit()
+
+        manager = ConnectionManager()
+        sockets = await connect_all(manager, ("alice", "bob", "carol", "dave"))
+        presence = PresenceBatcher(manager, async_session_factory, interval_ms=50)
+        try:
+            await presence.update("alice", "away")
+            await presence.update("alice", "online")
+            await presence.update("carol", "busy")
+            # Flips back within the window: nothing to report
+            await presence.update("dave", "away")
+            await presence.update("dave", "online")
+            await presence.update("dave", "online")
+            await asyncio.sleep(0.15)
+        finally:
+            await presence.stop()
+        return sockets, presence
+
+    sockets, presence = asyncio.run(scenario())
+
+    assert presence.flushes == 1
+    assert sockets["bob"].sent == [{"type": "presence", "changes": {"alice": "online", "carol": "busy"}}]
+    assert sockets["alice"].sent == []
+    assert sockets["carol"].sent == []
+    assert sockets["dave"].sent == []
+
+
+def test_presence_forgets_users_once_they_are_published_offline():
+    async def scenario():
+        manager = ConnectionManager()
+        presence = PresenceBatcher(manager, interval_ms=10_000)
+        try:
+            await presence.update("alice", "online")
+            await presence.update("bob", "away")
+            await presence.flush()
+            remembered = dict(presence._published)
+            await presence.update("alice", "offline")
+            await presence.flush()
+            # Already offline as far as anyone was told
+            await presence.update("alice", "offline")
+            await presence.flush()
+        finally:
+            await presence.stop()
+        return remembered, presence
+
+    remembered, presence = asyncio.run(scenario())
+
+    assert remembered == {"alice": "online", "bob": "away"}
+    assert presence._published == {"bob": "away"}
+    assert presence.flushes == 2
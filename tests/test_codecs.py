@@ -0,0 +1,102 @@
+import asyncio
+import json
+
+import msgpack
+import pytest
+
+from src.core.codecs import CODECS, JSON, FrameDecodeError, PreparedFrame, negotiate
+from src.core.events import ConnectionManager
+
+from conftest import FakeWebSocket
+
+
+class MsgpackWebSocket(FakeWebSocket):
+    async def send_bytes(self, data):
+        self.sent.append(msgpack.unpackb(data, raw=False))
+
+
+class CountingCodec:
+    def __init__(self, codec):
+        self.codec = codec
+        self.name = codec.name
+        self.binary = codec.binary
+        self.calls = 0
+
+    def encode(self, message):
+        self.calls += 1
+        return self.codec.encode(message)
+
+
+def test_negotiation_prefers_subprotocol_then_query():
+    assert negotiate(FakeWebSocket({"sec-websocket-protocol": "v2, msgpack"})) == (CODECS["msgpack"], "msgpack")
+    assert negotiate(FakeWebSocket(query_params={"format": "msgpack"})) == (CODECS["msgpack"], None)
+    assert negotiate(FakeWebSocket(query_params={"format": "xml"})) == (JSON, None)
+    assert negotiate(FakeWebSocket()) == (JSON, None)
+
+
+def test_decode_errors_are_reported_uniformly():
+    for codec in CODECS.values():
+        with pytest.raises(FrameDecodeError):
+            codec.decode(b"\xc1" if codec.binary else "{not json")
+
+
+def test_broadcast_encodes_once_per_codec():
+    json_codec, msgpack_codec = CountingCodec(CODECS["json"]), CountingCodec(CODECS["msgpack"])
+
+    async def scenario():
+        manager = ConnectionManager()
+        sockets = {}
+        for i in range(6):
+            username = f"user{i}"
+            codec = msgpack_codec if i % 2 else json_codec
+            sockets[username] = MsgpackWebSocket()
+            await manager.connect(sockets[username], username, codec=codec, subprotocol=codec.name)
+            await manager.join_room(username, 1)
+        message = {"type": "new_message", "message": {"content": "héllo", "seq": 1}}
+        await manager.broadcast_to_room(1, message)
+        await asyncio.sleep(0.01)
+        return sockets, message
+
+    sockets, message = asyncio.run(scenario())
+
+    assert (json_codec.calls, msgpack_codec.calls) == (1, 1)
+    # Same schema on both wire formats
+    assert all(socket.sent == [message] for socket in sockets.values())
+    assert sockets["user1"].subprotocol == "msgpack"
+
+
+def test_prepared_frame_caches_each_encoding():
+    frame = PreparedFrame({"type": "presence", "changes": {"alice": "online"}})
+    assert frame.encode(JSON) is frame.encode(JSON)
+    assert msgpack.unpackb(frame.encode(CODECS["msgpack"]), raw=False) == frame.message
+
+
+@pytest.mark.parametrize("size", [1, 15, 16, 70_000])
+def test_personal_overlay_splices_into_shared_frame(size):
+    frame = PreparedFrame({f"k{i}": i for i in range(size)})
+    personal = frame.personalize({"client_id": "c1", "own": True})
+    for codec in CODECS.values():
+        data = personal.encode(codec)
+        decoded = msgpack.unpackb(data, raw=False) if codec.binary else json.loads(data)
+        assert decoded == {**frame.message, "client_id": "c1", "own": True}
+    assert frame.personalize(None) is frame
+
+
+def test_broadcast_overlays_personal_fields():
+    async def scenario():
+        manager = ConnectionManager()
+        sockets = {}
+        for username, codec in (("alice", CODECS["msgpack"]), ("bob", JSON)):
+            sockets[username] = MsgpackWebSocket()
+            await manager.connect(sockets[username], username, codec=codec)
+            await manager.join_room(username, 1)
+        await manager.broadcast_to_room(
+            1, {"type": "new_message", "message": {"seq": 1}}, personal={"alice": {"client_id": "c1"}}
+        )
+        await asyncio.sleep(0.01)
+        return sockets
+
+    sockets = asyncio.run(scenario())
+
+    assert sockets["alice"].sent == [{"type": "new_message", "message": {"seq": 1}, "client_id": "c1"}]
+    assert sockets["bob"].sent == [{"type": "new_message", "message": {"seq": 1}}]
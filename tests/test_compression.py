@@ -0,0 +1,78 @@
+import asyncio
+import json
+import zlib
+
+from src.core.codecs import CODECS, JSON, PreparedFrame
+from src.core.compression import MARKER, CompressionStats, FrameCompressor, inflate
+from src.core.events import ConnectionManager
+
+from conftest import FakeWebSocket
+
+
+class RawWebSocket(FakeWebSocket):
+    """Keeps frames as sent so the tests can inflate them"""
+
+    async def send_text(self, data):
+        self.sent.append(data)
+
+    async def send_bytes(self, data):
+        self.sent.append(data)
+
+
+def replay_frame(count=50):
+    return {
+        "type": "replay",
+        "chat_id": 1,
+        "messages": [{"seq": i, "sender": "alice", "content": f"message number {i}"} for i in range(count)]
+    }
+
+
+def test_only_large_frames_are_compressed():
+    stats = CompressionStats()
+    compressor = FrameCompressor(min_bytes=512, stats=stats, context_takeover=False)
+
+    small = compressor.prepare(PreparedFrame({"type": "typing", "chat_id": 1}), JSON)
+    large = compressor.prepare(PreparedFrame(replay_frame()), JSON)
+
+    assert isinstance(small, str)
+    assert large.startswith(MARKER)
+    assert json.loads(inflate(large)) == replay_frame()
+    assert (stats.compressed, stats.skipped) == (1, 1)
+    assert stats.ratio < 0.5
+
+
+def test_shared_context_frames_are_compressed_once_per_broadcast():
+    stats = CompressionStats()
+
+    async def scenario():
+        manager = ConnectionManager()
+        sockets = {}
+        for i in range(5):
+            username = f"user{i}"
+            sockets[username] = RawWebSocket()
+            compressor = FrameCompressor(min_bytes=512, stats=stats, context_takeover=False)
+            await manager.connect(sockets[username], username, codec=CODECS["msgpack"], compressor=compressor)
+            await manager.join_room(username, 1)
+        await manager.broadcast_to_room(1, replay_frame())
+        await asyncio.sleep(0.01)
+        return sockets
+
+    sockets = asyncio.run(scenario())
+
+    payloads = {socket.sent[0] for socket in sockets.values()}
+    assert len(payloads) == 1
+    assert CODECS["msgpack"].decode(inflate(payloads.pop())) == replay_frame()
+    assert (stats.compressed, stats.shared) == (1, 4)
+
+
+def test_context_takeover_reuses_the_window():
+    stats = CompressionStats()
+    compressor = FrameCompressor(min_bytes=0, stats=stats, context_takeover=True)
+    first = compressor.prepare(PreparedFrame(replay_frame()), JSON)
+    second = compressor.prepare(PreparedFrame(replay_frame()), JSON)
+
+    # One client-side stream inflates the whole connection
+    decompressor = zlib.decompressobj(-15)
+    assert json.loads(inflate(first, decompressor)) == replay_frame()
+    assert json.loads(inflate(second, decompressor)) == replay_frame()
+    assert len(second) < len(first) / 4
@@ -0,0 +1,194 @@
+import asyncio
+
+from sqlalchemy import func, select
+
+from src.api.websockets.chat import ChatWebSocket
+from src.models.chat import Chat
+from src.models.message import Message
+from src.models.pending_delivery import PendingDelivery
+from src.models.user import User
+from src.services.delivery import DeliveryService
+from src.services.message_writer import MessageWriter
+
+from conftest import FakeWebSocket, wait_for
+
+
+async def seed_chat(session_factory, *usernames):
+    async with session_factory() as db:
+        users = [
+            User(username=name, email=f"{name}@example.com", full_name=name, hashed_password="x")
+            for name in usernames
+        ]
+        chat = Chat(name="team", is_group=True, users=users)
+        db.add(chat)
+        await db.commit()
+        return chat.id
+
+
+async def delivery_state(session_factory):
+    async with session_factory() as db:
+        pending = (await db.execute(
+            select(PendingDelivery.username, func.count()).group_by(PendingDelivery.username)
+        )).all()
+        delivered = (await db.execute(
+            select(Message.seq, Message.delivered_at.is_not(None)).order_by(Message.seq)
+        )).all()
+        return dict(pending), dict(delivered)
+
+
+def test_offline_members_get_queued_messages_on_connect(async_session_factory, sql_statements):
+    async def scenario():
+        chat_id = await seed_chat(async_session_factory, "alice", "bob", "carol")
+        writer = MessageWriter(session_factory=async_session_factory, max_delay_ms=1)
+        chat_ws = ChatWebSocket(session_factory=async_session_factory, writer=writer)
+        chat_ws.deliveries.batch_size = 3
+        sockets = {username: FakeWebSocket() for username in ("alice", "bob", "carol")}
+        try:
+            await chat_ws.connection_manager.connect(sockets["alice"], "alice")
+            await chat_ws.connection_manager.join_room("alice", chat_id)
+            for i in range(4):
+                await chat_ws.handle_new_message({"chat_id": chat_id, "content": f"m{i}"}, "alice")
+            await wait_for(lambda: len(sockets["alice"].of_type("message_ack")) == 4)
+
+            # Carol is in the room for the last one
+            await chat_ws.connection_manager.connect(sockets["carol"], "carol")
+            await chat_ws.connection_manager.join_room("carol", chat_id)
+            await chat_ws.handle_new_message({"chat_id": chat_id, "content": "m4"}, "alice")
+            await wait_for(lambda: len(sockets["alice"].of_type("message_ack")) == 5)
+            await chat_ws.deliveries.flush()
+            while_away = await delivery_state(async_session_factory)
+
+            await chat_ws.connection_manager.connect(sockets["bob"], "bob")
+            with sql_statements:
+                sent = await chat_ws.deliveries.deliver_pending("bob")
+            await wait_for(lambda: len(sockets["bob"].of_type("pending_messages")) == 2)
+            again = await chat_ws.deliveries.deliver_pending("bob")
+            return while_away, sent, again, sockets, await delivery_state(async_session_factory)
+        finally:
+            await chat_ws.deliveries.stop()
+            await writer.stop()
+
+    while_away, sent, again, sockets, after = asyncio.run(scenario())
+
+    assert while_away == (
+        {"bob": 5, "carol": 4},
+        {1: False, 2: False, 3: False, 4: False, 5: True}
+    )
+    assert (sent, again) == (5, 0)
+    frames = sockets["bob"].of_type("pending_messages")
+    assert [[m["seq"] for m in frame["messages"]] for frame in frames] == [[1, 2, 3], [4, 5]]
+    assert frames[1]["messages"][1]["content"] == "m4"
+    # Two batches of select ids, select messages, delete, update, plus the empty read
+    assert sql_statements.count == 9
+    assert after == ({"carol": 4}, {seq: True for seq in range(1, 6)})
+
+
+class FailingWebSocket(FakeWebSocket):
+    """Accepts the first sends_ok frames, then the peer is gone"""
+
+    def __init__(self, sends_ok):
+        super().__init__()
+        self.sends_ok = sends_ok
+
+    async def send_text(self, data):
+        if len(self.sent) >= self.sends_ok:
+            raise ConnectionResetError("peer went away")
+        await super().send_text(data)
+
+
+class StalledWebSocket(FakeWebSocket):
+    """Never finishes sending, so everything queued behind the first frame stays queued"""
+
+    def __init__(self):
+        super().__init__()
+        self.release = asyncio.Event()
+
+    async def send_text(self, data):
+        await self.release.wait()
+
+
+def test_connected_members_outside_the_room_get_messages_live(async_session_factory):
+    async def scenario():
+        chat_id = await seed_chat(async_session_factory, "alice", "bob", "carol")
+        writer = MessageWriter(session_factory=async_session_factory, max_delay_ms=1)
+        chat_ws = ChatWebSocket(session_factory=async_session_factory, writer=writer)
+        sockets = {username: FakeWebSocket() for username in ("alice", "bob")}
+        try:
+            await chat_ws.connection_manager.connect(sockets["alice"], "alice")
+            await chat_ws.connection_manager.join_room("alice", chat_id)
+            # Bob is online but has not opened the chat
+            await chat_ws.connection_manager.connect(sockets["bob"], "bob")
+            await chat_ws.handle_new_message({"chat_id": chat_id, "content": "hi"}, "alice")
+            await wait_for(lambda: sockets["alice"].of_type("message_ack"))
+            await wait_for(lambda: sockets["bob"].of_type("new_message"))
+            await chat_ws.deliveries.flush()
+            return sockets["bob"], await delivery_state(async_session_factory)
+        finally:
+            await chat_ws.deliveries.stop()
+            await writer.stop()
+
+    bob, state = asyncio.run(scenario())
+
+    [frame] = bob.of_type("new_message")
+    assert frame["message"]["content"] == "hi"
+    # Only carol, who is offline, waits for it
+    assert state == ({"carol": 1}, {1: True})
+
+
+async def queue_for(session_factory, chat_id, username, count):
+    async with session_factory() as db:
+        messages = [Message(chat_id=chat_id, seq=i + 1, sender_user="alice", content=f"m{i}") for i in range(count)]
+        db.add_all(messages)
+        await db.flush()
+        await DeliveryService(db).enqueue((username, message.id) for message in messages)
+        await db.commit()
+
+
+def test_batches_cut_off_by_a_disconnect_stay_queued(async_session_factory):
+    async def scenario():
+        chat_id = await seed_chat(async_session_factory, "alice", "bob")
+        await queue_for(async_session_factory, chat_id, "bob", 5)
+        chat_ws = ChatWebSocket(session_factory=async_session_factory)
+        chat_ws.deliveries.batch_size = 2
+        # The second frame fails on the wire and closes the connection
+        await chat_ws.connection_manager.connect(FailingWebSocket(sends_ok=1), "bob")
+        cut_off = await chat_ws.deliveries.deliver_pending("bob")
+        after_cut_off = await delivery_state(async_session_factory)
+
+        socket = FakeWebSocket()
+        await chat_ws.connection_manager.connect(socket, "bob")
+        resent = await chat_ws.deliveries.deliver_pending("bob")
+        await chat_ws.connection_manager.disconnect("bob")
+        return cut_off, after_cut_off, resent, socket, await delivery_state(async_session_factory)
+
+    cut_off, after_cut_off, resent, socket, after = asyncio.run(scenario())
+
+    assert cut_off == 2
+    assert after_cut_off == ({"bob": 3}, {1: True, 2: True, 3: False, 4: False, 5: False})
+    assert resent == 3
+    assert [[m["seq"] for m in frame["messages"]] for frame in socket.of_type("pending_messages")] == [[3, 4], [5]]
+    assert after == ({}, {seq: True for seq in range(1, 6)})
+
+
+def test_overflowing_send_queue_leaves_entries_queued(async_session_factory):
+    async def scenario():
+        chat_id = await seed_chat(async_session_factory, "alice", "bob")
+        await queue_for(async_session_factory, chat_id, "bob", 2)
+        chat_ws = ChatWebSocket(session_factory=async_session_factory)
+        socket = StalledWebSocket()
+        connection = await chat_ws.connection_manager.connect(socket, "bob")
+        connection.max_queue_size = 1
+        # One frame is stuck on the wire and another fills the queue
+        connection.enqueue({"type": "new_message", "message": {}})
+        await asyncio.sleep(0)
+        connection.enqueue({"type": "new_message", "message": {}})
+        sent = await chat_ws.deliveries.deliver_pending("bob")
+        socket.release.set()
+        await chat_ws.connection_manager.disconnect("bob")
+        return sent, connection.closed, await delivery_state(async_session_factory)
+
+    sent, closed, state = asyncio.run(scenario())
+
+    assert sent == 0
+    assert closed
+    assert state == ({"bob": 2}, {1: False, 2: False})
@@ -0,0 +1,89 @@
+import asyncio
+
+from src.core.events import ConnectionManager
+from src.core.fanout import FanoutScheduler
+
+from conftest import FakeWebSocket
+
+
+def recorder(log, chat_id):
+    def deliver(usernames):
+        log.append((chat_id, list(usernames)))
+    return deliver
+
+
+def test_big_rooms_take_turns_and_small_rooms_skip_the_queue():
+    async def scenario():
+        scheduler = FanoutScheduler(chunk_size=10, workers=2)
+        log = []
+        scheduler.submit(1, [f"a{i}" for i in range(35)], recorder(log, 1))
+        scheduler.submit(2, [f"b{i}" for i in range(15)], recorder(log, 2))
+        # A DM is delivered before the big rooms have had a single chunk
+        scheduler.submit(3, ["alice", "bob"], recorder(log, 3))
+        # Room 1 already has queued work, so even a small send waits its turn
+        scheduler.submit(1, ["a0"], recorder(log, "1-late"))
+        backlog = scheduler.backlog
+        while scheduler.run_chunk():
+            pass
+        await scheduler.stop()
+        return scheduler, log, backlog
+
+    scheduler, log, backlog = asyncio.run(scenario())
+
+    assert backlog == 51
+    assert [(chat_id, len(usernames)) for chat_id, usernames in log] == [
+        (3, 2), (1, 10), (2, 10), (1, 10), (2, 5), (1, 10), (1, 5), ("1-late", 1)
+    ]
+    assert sorted(u for chat_id, usernames in log if chat_id == 1 for u in usernames) == sorted(
+        f"a{i}" for i in range(35)
+    )
+    assert (scheduler.inline, scheduler.queued, scheduler.chunks) == (1, 3, 7)
+
+
+def test_latency_percentiles_per_room(clock):
+    async def scenario():
+        scheduler = FanoutScheduler(chunk_size=2, workers=1, clock=clock)
+        for i in range(100):
+            scheduler.submit(7, ["a"], lambda usernames: None)
+            clock.now += 0.001
+        scheduler.submit(8, ["a", "b", "c", "d", "e"], lambda usernames: None)
+        while scheduler.run_chunk():
+            clock.now += 0.010
+        await scheduler.stop()
+        return scheduler
+
+    scheduler = asyncio.run(scenario())
+
+    assert scheduler.latency(7) == {"count": 100, "p50": 0.0, "p95": 0.0, "p99": 0.0, "max": 0.0}
+    # Three chunks, recorded after the third was delivered
+    assert scheduler.latency(8)["p99"] == 20.0
+    assert scheduler.latency()["count"] == 101
+    assert scheduler.latency(9) == {"count": 0}
+
+
+def test_workers_deliver_chunked_room_broadcasts():
+    async def scenario():
+        manager = ConnectionManager(fanout=FanoutScheduler(chunk_size=3, workers=2))
+        sockets = {f"user{i}": FakeWebSocket() for i in range(10)}
+        for username, websocket in sockets.items():
+            await manager.connect(websocket, username)
+            await manager.join_room(username, 1)
+        for i in range(3):
+            await manager.broadcast_to_room(
+                1, {"type": "new_message", "n": i}, exclude_user="user0", personal={"user1": {"client_id": "c"}}
+            )
+        for _ in range(100):
+            if all(len(ws.sent) == 3 for name, ws in sockets.items() if name != "user0"):
+                break
+            await asyncio.sleep(0.005)
+        await manager.fanout.stop()
+        for username in list(sockets):
+            await manager.disconnect(username)
+        return sockets, manager.fanout
+
+    sockets, fanout = asyncio.run(scenario())
+
+    assert sockets["user0"].sent == []
+    assert all([frame["n"] for frame in ws.sent] == [0, 1, 2] for name, ws in sockets.items() if name != "user0")
+    assert sockets["user1"].sent[0]["client_id"] == "c"
+    assert (fanout.queued, fanout.chunks) == (3, 12)
@@ -0,0 +1,54 @@
+import asyncio
+
+from src.core.events import ConnectionManager
+from src.core.heartbeat import HeartbeatWheel
+
+from conftest import FakeWebSocket
+
+
+def test_silent_connections_are_reaped():
+    async def scenario():
+        wheel = HeartbeatWheel(interval=0.05, max_missed=2, slots=5)
+        manager = ConnectionManager(heartbeat=wheel)
+        sockets = {}
+        connections = {}
+        for username in ("alive", "dead"):
+            sockets[username] = FakeWebSocket()
+            connections[username] = await manager.connect(sockets[username], username)
+            await manager.join_room(username, 1)
+
+        # "alive" answers every ping, "dead" never says anything
+        for _ in range(20):
+            await asyncio.sleep(0.01)
+            connections["alive"].mark_alive()
+        await wheel.stop()
+        return manager, wheel, sockets
+
+    manager, wheel, sockets = asyncio.run(scenario())
+
+    assert sockets["dead"].closed and not sockets["alive"].closed
+    assert list(manager.active_connections) == ["alive"]
+    assert manager.room_members == {1: {"alive"}}
+    assert "dead" not in manager.user_rooms
+    assert wheel.reaped == 1
+    assert len(wheel) == 1
+    assert {"type": "ping"} in sockets["alive"].sent
+
+
+def test_closed_connections_leave_the_wheel():
+    async def scenario():
+        wheel = HeartbeatWheel(interval=10, slots=4)
+        manager = ConnectionManager(heartbeat=wheel)
+        phone, laptop = FakeWebSocket(), FakeWebSocket()
+        await manager.connect(phone, "alice")
+        # Each of a user's devices is watched on its own
+        await manager.connect(laptop, "alice")
+        sizes = [len(wheel)]
+        await manager.disconnect("alice", phone)
+        sizes.append(len(wheel))
+        await manager.disconnect("alice")
+        sizes.append(len(wheel))
+        await wheel.stop()
+        return sizes
+
+    assert asyncio.run(scenario()) == [2, 1, 0]
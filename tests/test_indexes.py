@@ -0,0 +1,179 @@
+import asyncio
+import re
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import create_engine, select
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import NullPool
+
+from src.db.base import to_async_url
+from src.db.migrations import run_migrations
+from src.models.call import Call
+from src.models.chat import Chat
+from src.models.message import Message
+from src.models.user import User
+from src.services.chat import ChatService
+from src.services.chat_summary import ChatSummaryService
+from src.services.delivery import DeliveryService
+
+from conftest import StatementCounter
+
+# Tables that grow with usage; a full scan of any of them is a regression
+HOT_TABLES = ("messages", "chat_users", "chat_summaries", "calls", "pending_deliveries")
+FULL_SCAN = re.compile(r"^SCAN (%s)\b(?! USING)" % "|".join(HOT_TABLES))
+
+
+@pytest.fixture
+def migrated_url(tmp_path):
+    url = f"sqlite:///{tmp_path / 'explain.db'}"
+    run_migrations(url)
+    return url
+
+
+@pytest.fixture
+def session_factory(migrated_url):
+    engine = create_async_engine(to_async_url(migrated_url), poolclass=NullPool)
+    factory = async_sessionmaker(bind=engine, autoflush=False, expire_on_commit=False)
+
+    async def seed():
+        start = datetime(2025, 1, 1)
+        async with factory() as db:
+            owner = User(username="owner", email="owner@example.com", full_name="Owner", hashed_password="x")
+            friend = User(username="friend", email="friend@example.com", full_name="Friend", hashed_password="x")
+            db.add_all([owner, friend])
+            chat = Chat(name="chat", is_group=True, last_seq=20, users=[owner, friend])
+            db.add(chat)
+            await db.flush()
+            db.add_all([
+                Message(
+                    chat_id=chat.id,
+                    seq=i + 1,
+                    sender_user="friend",
+                    content=f"m{i}",
+                    created_at=start + timedelta(seconds=i)
+                )
+                for i in range(20)
+            ])
+            await db.commit()
+            await ChatSummaryService(db).rebuild()
+            await db.commit()
+
+    asyncio.run(seed())
+    try:
+        yield factory
+    finally:
+        asyncio.run(engine.dispose())
+
+
+@pytest.fixture
+def db(migrated_url):
+    """Sync connection used to EXPLAIN the captured statements"""
+    engine = create_engine(migrated_url)
+    session = sessionmaker(bind=engine)()
+    try:
+        yield session
+    finally:
+        session.close()
+        engine.dispose()
+
+
+def capture_statements(session_factory, scenario):
+    """Run scenario(session) on an AsyncSession and collect the single-row statements it issues"""
+    async def run():
+        async with session_factory() as session:
+            await scenario(session)
+
+    with StatementCounter(session_factory) as counter:
+        asyncio.run(run())
+    return [
+        (statement, parameters)
+        for statement, parameters, executemany in counter.executed
+        if not executemany and statement.lstrip().upper().startswith(("SELECT", "UPDATE", "DELETE"))
+    ]
+
+
+def full_scans(db, statements):
+    scans = []
+    connection = db.connection()
+    for statement, parameters in statements:
+        plan = connection.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters).all()
+        for row in plan:
+            if FULL_SCAN.match(row[-1]):
+                scans.append((row[-1], statement))
+    return scans
+
+
+def chat_id_of(db):
+    return db.execute(select(Chat.id)).scalar_one()
+
+
+def test_inbox_uses_indexes(db, session_factory):
+    async def inbox(session):
+        await ChatService(session).get_user_chats(username="owner", unread_only=True)
+
+    statements = capture_statements(session_factory, inbox)
+    assert statements
+    assert full_scans(db, statements) == []
+
+
+def test_message_history_uses_indexes(db, session_factory):
+    chat_id = chat_id_of(db)
+
+    async def page_twice(session):
+        service = ChatService(session)
+        page = await service.get_messages_page(chat_id, "owner", limit=5)
+        await service.get_messages_page(chat_id, "owner", cursor=page.next_cursor, limit=5)
+        await service.get_messages_page(chat_id, "owner", cursor=page.prev_cursor, direction="newer")
+
+    statements = capture_statements(session_factory, page_twice)
+    assert full_scans(db, statements) == []
+
+
+def test_send_and_read_use_indexes(db, session_factory):
+    chat_id = chat_id_of(db)
+
+    async def send_and_read(session):
+        service = ChatService(session)
+        message = await service.send_message(chat_id, "hello", "friend")
+        await service.mark_as_read(chat_id, "owner", message.id - 1)
+        await service.mark_as_read(chat_id, "owner")
+
+    statements = capture_statements(session_factory, send_and_read)
+    assert full_scans(db, statements) == []
+
+
+def test_pending_delivery_uses_indexes(db, session_factory):
+    message_ids = db.execute(select(Message.id)).scalars().all()
+
+    async def queue_and_deliver(session):
+        deliveries = DeliveryService(session)
+        await deliveries.enqueue(("owner", message_id) for message_id in message_ids)
+        messages = await deliveries.peek("owner", 5)
+        await deliveries.acknowledge("owner", [message.id for message in messages])
+        await deliveries.mark_delivered(message_ids[-3:])
+
+    statements = capture_statements(session_factory, queue_and_deliver)
+    assert statements
+    assert full_scans(db, statements) == []
+
+
+def test_search_uses_indexes(db, session_factory):
+    async def search(session):
+        service = ChatService(session)
+        page = await service.search_messages("owner", "m1", limit=3)
+        assert page.results and page.next_cursor
+        await service.search_messages("owner", "m1", cursor=page.next_cursor, limit=3)
+        await service.get_user_chats(username="owner", search="chat")
+
+    statements = capture_statements(session_factory, search)
+    assert full_scans(db, statements) == []
+
+
+def test_call_history_uses_indexes(db):
+    statements = [
+        (str(select(Call).where(Call.caller_user == "owner").compile(db.get_bind())), ("owner",)),
+        (str(select(Call).where(Call.receiver_user == "owner").compile(db.get_bind())), ("owner",)),
+    ]
+    assert full_scans(db, statements) == []
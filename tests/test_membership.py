@@ -0,0 +1,124 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+from src.api.websockets.chat import ChatWebSocket
+from src.core.cache import membership_cache
+from src.core.pubsub import SQLiteBackend
+from src.models.chat import Chat
+from src.models.user import User
+from src.services.chat import ChatService
+
+from conftest import FakeWebSocket, wait_for
+
+
+async def seed(session_factory):
+    async with session_factory() as db:
+        users = {
+            name: User(username=name, email=f"{name}@example.com", full_name=name, hashed_password="x")
+            for name in ("alice", "bob", "carol")
+        }
+        group = Chat(name="group", is_group=True, admin_user="alice", users=[users["alice"], users["bob"]])
+        other = Chat(name="other", is_group=True, admin_user="carol", users=[users["carol"]])
+        db.add_all([group, other])
+        await db.commit()
+        return group.id, other.id
+
+
+def test_membership_checks_are_cached_until_members_change(async_session_factory, sql_statements):
+    async def scenario():
+        group_id, _ = await seed(async_session_factory)
+        async with async_session_factory() as db:
+            service = ChatService(db)
+            await service.require_member(group_id, "alice")
+            with sql_statements:
+                await service.require_member(group_id, "bob")
+                with pytest.raises(HTTPException) as forbidden:
+                    await service.require_member(group_id, "carol")
+            cached_queries = sql_statements.count
+
+            await service.add_members(group_id, ["carol"])
+            await service.require_member(group_id, "carol")
+            await service.remove_member(group_id, "bob")
+            with pytest.raises(HTTPException) as removed:
+                await service.require_member(group_id, "bob")
+            with pytest.raises(HTTPException) as missing:
+                await service.require_member(12345, "alice")
+        return cached_queries, forbidden.value, removed.value, missing.value
+
+    cached_queries, forbidden, removed, missing = asyncio.run(scenario())
+
+    assert cached_queries == 0
+    assert (forbidden.status_code, removed.status_code, missing.status_code) == (403, 403, 404)
+    assert membership_cache.stats()["members"]["hits"] >= 2
+
+
+def test_websocket_joins_only_members(async_session_factory, sql_statements):
+    async def scenario():
+        group_id, other_id = await seed(async_session_factory)
+        chat_ws = ChatWebSocket(session_factory=async_session_factory)
+        await chat_ws.connection_manager.connect(FakeWebSocket(), "bob")
+        try:
+            with sql_statements:
+                joined = await chat_ws.join_chat("bob", group_id)
+                refused = not await chat_ws.join_chat("bob", other_id)
+                # Already in the room: no lookup at all
+                rejoined = await chat_ws.join_chat("bob", group_id)
+
+            async with async_session_factory() as db:
+                await ChatService(db).add_members(other_id, ["bob"])
+            joined_after_add = await chat_ws.join_chat("bob", other_id)
+        finally:
+            await chat_ws.connection_manager.disconnect("bob")
+        return joined, refused, rejoined, joined_after_add
+
+    joined, refused, rejoined, joined_after_add = asyncio.run(scenario())
+
+    assert joined and refused and rejoined and joined_after_add
+    # One chat-list load, plus one re-read before the refusal
+    assert sql_statements.count == 2
+
+
+class RecordingWriter:
+    def __init__(self):
+        self.submitted = []
+
+    def submit(self, **message):
+        self.submitted.append(message)
+        return asyncio.get_running_loop().create_future()
+
+
+def test_removal_on_one_worker_revokes_rooms_on_the_others(async_session_factory, tmp_path):
+    path = str(tmp_path / "bus.db")
+
+    async def scenario():
+        group_id, _ = await seed(async_session_factory)
+        writer = RecordingWriter()
+        workers = [
+            ChatWebSocket(session_factory=async_session_factory, writer=writer,
+                          backend=SQLiteBackend(path, poll_interval_ms=5))
+            for _ in range(2)
+        ]
+        for worker in workers:
+            await worker.start()
+        rest_worker, socket_worker = workers
+        try:
+            await socket_worker.connection_manager.connect(FakeWebSocket(), "bob")
+            assert await socket_worker.join_chat("bob", group_id)
+            await socket_worker.handle_new_message({"chat_id": group_id, "content": "before"}, "bob")
+
+            # The REST call lands on the other worker
+            async with async_session_factory() as db:
+                await ChatService(db).remove_member(group_id, "bob")
+            await rest_worker.membership_changed(group_id, removed=["bob"])
+
+            await wait_for(lambda: group_id not in socket_worker.connection_manager.room_members)
+            await socket_worker.handle_new_message({"chat_id": group_id, "content": "after"}, "bob")
+        finally:
+            for worker in workers:
+                await worker.connection_manager.disconnect("bob")
+                await worker.connection_manager.backend.stop()
+        return [message["content"] for message in writer.submitted]
+
+    assert asyncio.run(scenario()) == ["before"]
@@ -0,0 +1,157 @@
+import asyncio
+from datetime import datetime, timedelta
+
+from sqlalchemy import select
+
+from src.core.cache import RecentMessageCache, recent_messages
+from src.models.chat import Chat
+from src.models.message import Message
+from src.models.user import User
+from src.schemas.message import MessageResponse
+from src.services.chat import ChatService
+from src.services.delivery import DeliveryQueue
+from src.services.message_writer import MessageWriter
+
+
+def make_message(chat_id, seq, message_id=None):
+    return MessageResponse(
+        id=message_id or chat_id * 1000 + seq,
+        seq=seq,
+        chat_id=chat_id,
+        content=f"m{seq}",
+        sender_user="alice",
+        created_at=datetime(2025, 1, 1) + timedelta(seconds=seq),
+        message_type="text"
+    )
+
+
+def newest_first(chat_id, first, last):
+    return [make_message(chat_id, seq) for seq in range(last, first - 1, -1)]
+
+
+def test_ring_serves_first_pages_and_follows_writes(clock):
+    cache = RecentMessageCache(per_chat=5, max_messages=100, ttl=10, clock=clock)
+
+    assert cache.latest(1, 3) is None
+    cache.fill(1, newest_first(1, 3, 6))
+    page, more = cache.latest(1, 3)
+    assert ([m.seq for m in page], more) == ([6, 5, 4], True)
+    # Four cached messages don't make a page of ten unless they are the whole chat
+    assert cache.latest(1, 10) is None
+
+    cache.append(make_message(1, 7))
+    cache.append(make_message(1, 8))
+    page, _ = cache.latest(1, 5)
+    assert [m.seq for m in page] == [8, 7, 6, 5, 4]
+    # Capped at per_chat, oldest dropped first
+    cache.append(make_message(1, 9))
+    assert cache.stats()["messages"] == 5
+    # A stale page read before those writes doesn't roll the ring back
+    cache.fill(1, newest_first(1, 1, 6))
+    assert cache.latest(1, 1)[0][0].seq == 9
+
+    # seq 10 was written elsewhere: the ring restarts from 11
+    cache.append(make_message(1, 11))
+    assert cache.latest(1, 2) is None
+    assert cache.stats()["messages"] == 1
+
+    # A short chat is served whole
+    cache.fill(2, newest_first(2, 1, 2))
+    page, more = cache.latest(2, 50)
+    assert ([m.seq for m in page], more) == ([2, 1], False)
+
+    clock.now = 10
+    assert cache.latest(2, 50) is None
+    assert cache.stats()["chats"] == 1
+
+
+def test_least_recently_used_chats_are_evicted_over_the_global_cap(clock):
+    cache = RecentMessageCache(per_chat=10, max_messages=10, ttl=60, clock=clock)
+    for chat_id in (1, 2, 3):
+        cache.fill(chat_id, newest_first(chat_id, 1, 4))
+    # Chat 1 was evicted for chat 3; reading chat 2 keeps it over chat 3
+    assert cache.latest(1, 1) is None
+    assert cache.latest(2, 1) is not None
+    cache.fill(4, newest_first(4, 1, 4))
+
+    assert cache.latest(3, 1) is None
+    assert cache.latest(2, 1) is not None
+    assert cache.stats()["messages"] == 8
+
+
+async def seed(session_factory, count):
+    async with session_factory() as db:
+        alice = User(username="alice", email="alice@example.com", full_name="Alice", hashed_password="x")
+        bob = User(username="bob", email="bob@example.com", full_name="Bob", hashed_password="x")
+        chat = Chat(name="group", is_group=True, users=[alice, bob])
+        db.add(chat)
+        await db.flush()
+        start = datetime(2025, 1, 1)
+        db.add_all([
+            Message(chat_id=chat.id, seq=i + 1, sender_user="alice", content=f"m{i + 1}",
+                    created_at=start + timedelta(seconds=i))
+            for i in range(count)
+        ])
+        chat.last_seq = count
+        await db.commit()
+        return chat.id
+
+
+def test_first_page_is_served_from_memory_after_one_read(async_session_factory, sql_statements):
+    async def scenario():
+        chat_id = await seed(async_session_factory, 30)
+        async with async_session_factory() as db:
+            service = ChatService(db)
+            from_db = await service.get_messages_page(chat_id, "alice", limit=10)
+            with sql_statements:
+                from_memory = await service.get_messages_page(chat_id, "bob", limit=10)
+                legacy = await service.get_messages(chat_id, "bob", limit=10)
+            sent = await service.send_message(chat_id, "hello", "bob")
+            after_send = await service.get_messages_page(chat_id, "alice", limit=10)
+            older = await service.get_messages_page(chat_id, "alice", cursor=after_send.next_cursor, limit=10)
+
+        queue = DeliveryQueue(None, session_factory=async_session_factory)
+        queue._delivered[sent.id] = chat_id
+        await queue.flush()
+        async with async_session_factory() as db:
+            stored = await db.scalar(select(Message.delivered_at).where(Message.id == sent.id))
+        return from_db, from_memory, legacy, sent, after_send, older, stored
+
+    from_db, from_memory, legacy, sent, after_send, older, stored = asyncio.run(scenario())
+
+    assert sql_statements.statements == []
+    assert from_memory == from_db
+    assert [m.seq for m in legacy] == list(range(30, 20, -1))
+    assert [m.seq for m in after_send.messages] == list(range(31, 21, -1))
+    assert after_send.messages[0].id == sent.id
+    assert [m.seq for m in older.messages] == list(range(21, 11, -1))
+    assert stored is not None
+    assert recent_messages.latest(sent.chat_id, 1)[0][0].delivered_at == stored
+
+
+def test_cached_page_cursor_agrees_with_history_across_rest_and_batched_writes(async_session_factory):
+    async def scenario():
+        chat_id = await seed(async_session_factory, 0)
+        writer = MessageWriter(session_factory=async_session_factory, max_delay_ms=60_000)
+        batched = [writer.submit(chat_id=chat_id, sender_username="alice", content=f"ws{i}") for i in range(2)]
+        # Let the writer pick them up, then commit a REST message during the batch delay
+        await asyncio.sleep(0)
+        async with async_session_factory() as db:
+            await ChatService(db).send_message(chat_id, "rest", "bob")
+        await writer.stop()
+        await asyncio.gather(*batched)
+
+        async with async_session_factory() as db:
+            service = ChatService(db)
+            hits = recent_messages.hits
+            pages = [await service.get_messages_page(chat_id, "alice", limit=2)]
+            served_from_memory = recent_messages.hits == hits + 1
+            while pages[-1].next_cursor:
+                pages.append(await service.get_messages_page(chat_id, "alice", cursor=pages[-1].next_cursor, limit=2))
+        return served_from_memory, pages
+
+    served_from_memory, pages = asyncio.run(scenario())
+
+    assert served_from_memory
+    assert [[m.content for m in page.messages] for page in pages] == [["ws1", "ws0"], ["rest"]]
+    assert [m.seq for page in pages for m in page.messages] == [3, 2, 1]
@@ -0,0 +1,73 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import func, select
+
+from src.models.chat import Chat
+from src.models.message import Message
+from src.models.user import User
+from src.services.message_writer import MessageWriter
+
+
+async def seed_chat(session_factory):
+    async with session_factory() as db:
+        alice = User(username="alice", email="alice@example.com", full_name="Alice", hashed_password="x")
+        chat = Chat(name="team", is_group=True, users=[alice])
+        db.add(chat)
+        await db.commit()
+        return chat.id
+
+
+def test_messages_are_committed_in_full_batches(async_session_factory):
+    async def scenario():
+        chat_id = await seed_chat(async_session_factory)
+        # A long delay: only the batch size ends a batch
+        writer = MessageWriter(session_factory=async_session_factory, max_batch_size=100, max_delay_ms=1000)
+        try:
+            futures = [writer.submit(chat_id, "alice", f"m{i}") for i in range(250)]
+            results = await asyncio.gather(*futures)
+        finally:
+            await writer.stop()
+        async with async_session_factory() as db:
+            stored = await db.scalar(select(func.count()).select_from(Message))
+            last_seq = await db.scalar(select(Chat.last_seq).where(Chat.id == chat_id))
+        return writer, results, stored, last_seq
+
+    writer, results, stored, last_seq = asyncio.run(scenario())
+
+    assert writer.commits == 3
+    assert writer.messages_written == 250
+    assert writer.commits_per_message == pytest.approx(3 / 250)
+    assert [result["seq"] for result in results] == list(range(1, 251))
+    assert stored == 250
+    assert last_seq == 250
+
+
+def test_bad_row_fails_only_its_own_future(async_session_factory):
+    async def scenario():
+        chat_id = await seed_chat(async_session_factory)
+        writer = MessageWriter(session_factory=async_session_factory, max_batch_size=10, max_delay_ms=1000)
+        try:
+            futures = [
+                writer.submit(chat_id, "alice", "before"),
+                writer.submit(chat_id + 1, "alice", "no such chat"),
+                writer.submit(chat_id, "alice", "after"),
+            ]
+            results = await asyncio.gather(*futures, return_exceptions=True)
+        finally:
+            await writer.stop()
+        async with async_session_factory() as db:
+            stored = (await db.execute(select(Message.content, Message.seq).order_by(Message.seq))).all()
+        return writer, results, stored
+
+    writer, results, stored = asyncio.run(scenario())
+
+    before, failed, after = results
+    assert isinstance(failed, HTTPException) and failed.status_code == 404
+    assert (before["content"], before["seq"]) == ("before", 1)
+    assert (after["content"], after["seq"]) == ("after", 2)
+    assert stored == [("before", 1), ("after", 2)]
+    # The failed batch was rolled back; the two good rows were retried on their own
+    assert writer.commits == 2
+    assert writer.messages_written == 2
@@ -0,0 +1,74 @@
+from datetime import datetime
+
+from alembic import command
+from alembic.autogenerate import compare_metadata
+from alembic.migration import MigrationContext
+from alembic.script import ScriptDirectory
+from sqlalchemy import create_engine, inspect, text
+
+from src.db.base import Base
+from src.db.migrations import INITIAL_REVISION, get_alembic_config, run_migrations
+
+
+def build_baseline_database(url):
+    """A database as create_all built it before migrations existed, with some history"""
+    command.upgrade(get_alembic_config(url), INITIAL_REVISION)
+    engine = create_engine(url)
+    with engine.begin() as connection:
+        connection.execute(text("DROP TABLE alembic_version"))
+        connection.execute(text(
+            "INSERT INTO users (username, email, full_name, hashed_password) VALUES "
+            "('alice', 'alice@example.com', 'Alice', 'x'), ('bob', 'bob@example.com', 'Bob', 'x')"
+        ))
+        connection.execute(
+            text("INSERT INTO chats (id, name, is_group, created_at) VALUES (1, 'trip', 1, :at), (2, 'quiet', 1, :at)"),
+            {"at": datetime(2024, 1, 1)}
+        )
+        connection.execute(text(
+            "INSERT INTO chat_users (username, chat_id) VALUES ('alice', 1), ('bob', 1), ('alice', 2)"
+        ))
+        connection.execute(
+            text(
+                "INSERT INTO messages (id, chat_id, sender_user, content, message_type, created_at, read_at) VALUES "
+                "(1, 1, 'bob', 'first', 'TEXT', :t1, :t2), "
+                "(2, 1, 'alice', 'second', 'TEXT', :t2, NULL), "
+                "(3, 1, 'bob', 'third', 'TEXT', :t3, NULL)"
+            ),
+            {"t1": datetime(2024, 1, 2), "t2": datetime(2024, 1, 3), "t3": datetime(2024, 1, 4)}
+        )
+    return engine
+
+
+def test_baseline_database_upgrades_to_head(tmp_path):
+    url = f"sqlite:///{tmp_path / 'baseline.db'}"
+    engine = build_baseline_database(url)
+    try:
+        run_migrations(url)
+
+        head = ScriptDirectory.from_config(get_alembic_config(url)).get_current_head()
+        with engine.connect() as connection:
+            revision = connection.execute(text("SELECT version_num FROM alembic_version")).scalar()
+            summaries = connection.execute(text(
+                "SELECT chat_id, username, last_message_id, last_message_preview, last_read_seq "
+                "FROM chat_summaries ORDER BY chat_id, username"
+            )).all()
+            seqs = connection.execute(text("SELECT id, seq FROM messages ORDER BY id")).all()
+            drift = [
+                diff for diff in compare_metadata(MigrationContext.configure(connection), Base.metadata)
+                # FTS5 tables live outside the models
+                if not (diff[0] == "remove_table" and "_fts" in diff[1].name)
+            ]
+        indexes = {index["name"] for index in inspect(engine).get_indexes("messages")}
+    finally:
+        engine.dispose()
+
+    assert revision == head
+    assert seqs == [(1, 1), (2, 2), (3, 3)]
+    # Alice hadn't read bob's third message; bob hadn't marked any of alice's
+    assert summaries == [
+        (1, "alice", 3, "third", 2),
+        (1, "bob", 3, "third", 1),
+        (2, "alice", None, None, 0),
+    ]
+    assert "ix_messages_chat_created_id" in indexes
+    assert drift == []
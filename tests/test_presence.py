@@ -0,0 +1,93 @@
+import asyncio
+
+from sqlalchemy import select
+
+from src.core.events import ConnectionManager
+from src.models.user import User
+from src.services.presence import PresenceRegistry
+
+from conftest import FakeWebSocket
+
+
+async def seed_users(session_factory, *usernames):
+    async with session_factory() as db:
+        db.add_all([
+            User(username=name, email=f"{name}@example.com", full_name=name, hashed_password="x")
+            for name in usernames
+        ])
+        await db.commit()
+
+
+async def stored_presence(session_factory):
+    async with session_factory() as db:
+        rows = await db.execute(select(User.username, User.is_online))
+        return dict(rows.all())
+
+
+def test_presence_follows_the_last_open_connection(async_session_factory):
+    async def scenario():
+        await seed_users(async_session_factory, "alice", "bob")
+        changes = []
+
+        async def on_change(username, status):
+            changes.append((username, status))
+
+        registry = PresenceRegistry(async_session_factory, flush_interval_ms=60_000, on_change=on_change)
+        manager = ConnectionManager(presence=registry)
+        try:
+            phone, laptop = FakeWebSocket(), FakeWebSocket()
+            await manager.connect(phone, "alice")
+            await manager.connect(laptop, "alice")
+            # Closing one of two devices is no offline blip
+            await manager.disconnect("alice", phone)
+            online_with_one = registry.is_online("alice")
+            await manager.disconnect("alice", laptop)
+            offline_after_last = not registry.is_online("alice")
+            lookup = await registry.lookup(["alice", "bob"])
+        finally:
+            await registry.stop()
+        return changes, online_with_one, offline_after_last, lookup
+
+    changes, online_with_one, offline_after_last, lookup = asyncio.run(scenario())
+
+    assert changes == [("alice", "online"), ("alice", "offline")]
+    assert online_with_one and offline_after_last
+    assert lookup["alice"]["is_online"] is False
+    assert lookup["bob"]["is_online"] is False
+
+
+def test_presence_expires_and_flushes_in_one_statement(async_session_factory, clock, sql_statements):
+    async def scenario():
+        await seed_users(async_session_factory, "alice", "bob", "carol")
+        registry = PresenceRegistry(
+            async_session_factory, flush_interval_ms=60_000, heartbeat_timeout=30, clock=clock
+        )
+        try:
+            for username in ("alice", "bob", "carol"):
+                await registry.connected(username)
+
+            with sql_statements:
+                await registry.flush()
+            after_connect = await stored_presence(async_session_factory)
+
+            clock.now = 20
+            await registry.heartbeat("alice")
+            clock.now = 40
+            expired = await registry.expire()
+            await registry.flush()
+            after_expiry = await stored_presence(async_session_factory)
+
+            # A quiet connection that speaks again is back online
+            await registry.heartbeat("bob")
+            back_online = registry.is_online("bob")
+        finally:
+            await registry.stop()
+        return after_connect, sorted(expired), after_expiry, back_online
+
+    after_connect, expired, after_expiry, back_online = asyncio.run(scenario())
+
+    assert len(sql_statements.starting_with("UPDATE")) == 1
+    assert after_connect == {"alice": True, "bob": True, "carol": True}
+    assert expired == ["bob", "carol"]
+    assert after_expiry == {"alice": True, "bob": False, "carol": False}
+    assert back_online
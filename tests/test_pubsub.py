@@ -0,0 +1,96 @@
+import asyncio
+
+from src.core.events import ConnectionManager
+from src.core.pubsub import MemoryBackend, SQLiteBackend, room_channel, user_channel
+
+from conftest import FakeWebSocket, wait_for
+
+
+def test_room_subscriptions_are_reference_counted():
+    async def scenario():
+        backend = MemoryBackend()
+        manager = ConnectionManager(backend)
+        for username in ("alice", "bob"):
+            await manager.connect(FakeWebSocket(), username)
+            await manager.join_room(username, 7)
+        await manager.join_room("alice", 7)
+        counts = [backend._refcounts[room_channel(7)]]
+
+        await manager.leave_room("alice", 7)
+        counts.append(backend.subscribed(room_channel(7)))
+        await manager.disconnect("bob")
+        counts.append(backend.subscribed(room_channel(7)))
+        return counts
+
+    assert asyncio.run(scenario()) == [2, True, False]
+
+
+def test_every_connection_of_a_user_receives_the_broadcast():
+    async def scenario():
+        backend = MemoryBackend()
+        manager = ConnectionManager(backend)
+        phone, laptop = FakeWebSocket(), FakeWebSocket()
+        await manager.connect(phone, "alice")
+        await manager.connect(laptop, "alice")
+        await manager.join_room("alice", 7)
+        await manager.broadcast_to_room(7, {"type": "new_message", "n": 1})
+        await manager.send_personal_message("alice", {"type": "direct"})
+        await wait_for(lambda: len(phone.sent) == 2 and len(laptop.sent) == 2)
+
+        # The laptop keeps the user's room and channel subscriptions after the phone goes
+        await manager.disconnect("alice", phone)
+        subscribed = [backend.subscribed(room_channel(7)), backend.subscribed(user_channel("alice"))]
+        await manager.broadcast_to_room(7, {"type": "new_message", "n": 2})
+        await wait_for(lambda: len(laptop.sent) == 3)
+        await manager.disconnect("alice", laptop)
+        subscribed += [backend.subscribed(room_channel(7)), backend.subscribed(user_channel("alice"))]
+        return phone.sent, laptop.sent, subscribed, manager.active_connections
+
+    phone, laptop, subscribed, active = asyncio.run(scenario())
+
+    both = [{"type": "new_message", "n": 1}, {"type": "direct"}]
+    assert phone == both
+    assert laptop == both + [{"type": "new_message", "n": 2}]
+    assert subscribed == [True, True, False, False]
+    assert active == {}
+
+
+def test_sqlite_backend_fans_out_across_workers(tmp_path):
+    path = str(tmp_path / "bus.db")
+
+    async def scenario():
+        nodes = [
+            ConnectionManager(SQLiteBackend(path, poll_interval_ms=5)),
+            ConnectionManager(SQLiteBackend(path, poll_interval_ms=5)),
+            ConnectionManager(SQLiteBackend(path, poll_interval_ms=5)),
+        ]
+        sockets = {}
+        try:
+            # alice on the first worker, bob and carol on the second; dave's worker is not in the room
+            for node, username in ((0, "alice"), (1, "bob"), (1, "carol"), (2, "dave")):
+                sockets[username] = FakeWebSocket()
+                await nodes[node].connect(sockets[username], username)
+            for node, username in ((0, "alice"), (1, "bob"), (1, "carol")):
+                await nodes[node].join_room(username, 1)
+
+            for i in range(3):
+                await nodes[0].broadcast_to_room(1, {"type": "new_message", "n": i})
+            await nodes[2].send_personal_message("bob", {"type": "direct"})
+            await wait_for(lambda: len(sockets["carol"].sent) == 3 and len(sockets["bob"].sent) == 4)
+            await asyncio.sleep(0.05)
+            return sockets, [node.backend.received for node in nodes]
+        finally:
+            for node in nodes:
+                for username in list(node.active_connections):
+                    await node.disconnect(username)
+                await node.backend.stop()
+
+    sockets, received = asyncio.run(scenario())
+
+    expected = [{"type": "new_message", "n": i} for i in range(3)]
+    assert sockets["alice"].sent == expected
+    assert sockets["carol"].sent == expected
+    assert sockets["bob"].sent == expected + [{"type": "direct"}]
+    assert sockets["dave"].sent == []
+    # Worker two hosts two room members but pulls each room message once
+    assert received == [0, 4, 0]
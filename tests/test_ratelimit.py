@@ -0,0 +1,75 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+from src.api.dependencies import rate_limited_user
+from src.api.websockets.chat import ChatWebSocket
+from src.core.cache import CachedUser
+from src.core.ratelimit import RateLimiter, TokenBucket, parse_quota, rate_limiter
+
+from conftest import FakeWebSocket
+
+
+def test_token_bucket_refills_at_rate_up_to_burst():
+    bucket = TokenBucket(burst=2, now=0)
+    assert [bucket.take(1, 2, 0) for _ in range(3)] == [0, 0, 1.0]
+    assert bucket.take(1, 2, 0.5) == pytest.approx(0.5)
+    # A long pause never refills past the burst
+    assert [bucket.take(1, 2, 100) for _ in range(3)] == [0, 0, 1.0]
+    assert parse_quota("5/20") == (5.0, 20.0)
+    assert parse_quota("3") == (3.0, 3.0)
+
+
+def test_limiter_keys_are_independent_and_bounded(clock):
+    limiter = RateLimiter({"ws_message": (1, 1)}, max_keys=2, clock=clock)
+
+    assert limiter.check("ws_message", "alice") is None
+    assert limiter.check("ws_message", "alice") == pytest.approx(1.0)
+    assert limiter.check("ws_message", "bob") is None
+    assert limiter.check("unlimited", "alice") is None
+    limiter.check("ws_message", "carol")
+    assert len(limiter._buckets) == 2
+    assert limiter.limited == {"ws_message": 1}
+
+
+def test_flooded_frames_get_a_rate_limited_error(async_session_factory, clock):
+    limiter = RateLimiter({"ws_typing": (1, 3)}, clock=clock)
+
+    async def scenario():
+        chat_ws = ChatWebSocket(session_factory=async_session_factory, limiter=limiter)
+        socket = FakeWebSocket()
+        await chat_ws.connection_manager.connect(socket, "alice")
+        for _ in range(5):
+            await chat_ws.handle_message({"type": "typing", "chat_id": 1}, socket, "alice")
+        await asyncio.sleep(0.01)
+        await chat_ws.shutdown()
+        return socket.sent, chat_ws.typing.received
+
+    sent, received = asyncio.run(scenario())
+
+    errors = [frame for frame in sent if frame["type"] == "error"]
+    assert received == 3
+    assert len(errors) == 2
+    assert errors[0]["code"] == "rate_limited"
+    assert errors[0]["frame_type"] == "typing"
+    assert errors[0]["retry_after"] == pytest.approx(1.0)
+
+
+def test_rest_writes_over_quota_get_429(monkeypatch):
+    monkeypatch.setitem(rate_limiter.quotas, "rest_write", (0.001, 2))
+    user = CachedUser(
+        username="ratelimit-test", email="r@example.com", full_name="R",
+        avatar=None, is_active=True, is_verified=True
+    )
+    dependency = rate_limited_user("rest_write")
+
+    async def scenario():
+        for _ in range(2):
+            assert await dependency(current_user=user) is user
+        await dependency(current_user=user)
+
+    with pytest.raises(HTTPException) as excinfo:
+        asyncio.run(scenario())
+    assert excinfo.value.status_code == 429
+    assert int(excinfo.value.headers["Retry-After"]) >= 1
@@ -0,0 +1,132 @@
+import asyncio
+
+from src.models.chat import Chat
+from src.models.user import User
+from src.services.chat import ChatService
+from src.services.chat_summary import ChatSummaryService
+from src.services.receipts import ReadReceiptBatcher
+
+
+class FakeConnectionManager:
+    def __init__(self):
+        self.broadcasts = []
+
+    async def broadcast_to_room(self, chat_id, message, exclude_user=None, personal=None):
+        self.broadcasts.append((chat_id, message))
+
+
+async def seed_chats(session_factory, chat_count, last_seq, *usernames):
+    async with session_factory() as db:
+        users = [
+            User(username=name, email=f"{name}@example.com", full_name=name, hashed_password="x")
+            for name in usernames
+        ]
+        db.add_all(users)
+        chats = [Chat(name=f"chat{i}", is_group=True, users=users) for i in range(chat_count)]
+        db.add_all(chats)
+        await db.flush()
+        for chat in chats:
+            await ChatSummaryService(db).add_members(chat.id, usernames)
+            chat.last_seq = last_seq
+        await db.commit()
+        return [chat.id for chat in chats]
+
+
+async def unread_counts(session_factory, username):
+    async with session_factory() as db:
+        chats = await ChatService(db).get_user_chats(username=username)
+        return {chat.id: chat.unread_count for chat in chats}
+
+
+def test_receipts_flush_in_one_update_and_one_broadcast_per_chat(async_session_factory, sql_statements):
+    async def scenario():
+        chat_ids = await seed_chats(async_session_factory, 3, 10, "alice", "bob", "carol")
+        manager = FakeConnectionManager()
+        batcher = ReadReceiptBatcher(manager, async_session_factory, interval_ms=60_000)
+        for chat_id in chat_ids:
+            for seq in range(1, 9):
+                batcher.update(chat_id, "alice", seq)
+                batcher.update(chat_id, "bob", seq // 2)
+        # Going back has no effect
+        batcher.update(chat_ids[0], "alice", 3)
+
+        with sql_statements:
+            await batcher.stop()
+        return chat_ids, manager.broadcasts, await unread_counts(async_session_factory, "alice")
+
+    chat_ids, broadcasts, alice_unread = asyncio.run(scenario())
+
+    assert len(sql_statements.starting_with("UPDATE")) == 1
+    assert [chat_id for chat_id, _ in broadcasts] == chat_ids
+    assert all(frame["watermarks"] == {"alice": 8, "bob": 4} for _, frame in broadcasts)
+    assert alice_unread == {chat_id: 2 for chat_id in chat_ids}
+
+
+def test_watermarks_never_move_back_or_past_last_seq(async_session_factory):
+    async def scenario():
+        [chat_id] = await seed_chats(async_session_factory, 1, 5, "alice", "bob")
+        before = await unread_counts(async_session_factory, "alice")
+        async with async_session_factory() as db:
+            summaries = ChatSummaryService(db)
+            moved = [
+                await summaries.set_watermarks([(chat_id, "alice", 3)]),
+                await summaries.set_watermarks([(chat_id, "alice", 2)]),
+                await summaries.set_watermarks([(chat_id, "bob", 99)]),
+            ]
+            await db.commit()
+            service = ChatService(db)
+            stored = [
+                await service.mark_as_read(chat_id, "alice", seq=1),
+                await service.mark_as_read(chat_id, "alice", seq=42),
+            ]
+        return (
+            before[chat_id],
+            (await unread_counts(async_session_factory, "alice"))[chat_id],
+            (await unread_counts(async_session_factory, "bob"))[chat_id],
+            chat_id,
+            moved,
+            stored
+        )
+
+    before, alice_unread, bob_unread, chat_id, moved, stored = asyncio.run(scenario())
+
+    assert (before, alice_unread, bob_unread) == (5, 0, 0)
+    assert moved == [{(chat_id, "alice"): 3}, {}, {(chat_id, "bob"): 5}]
+    # The stored watermark comes back, not the seq that was asked for
+    assert stored == [3, 5]
+
+
+def test_receipts_announce_stored_watermarks_only_when_they_move(async_session_factory):
+    async def scenario():
+        [chat_id] = await seed_chats(async_session_factory, 1, 10, "alice", "bob", "carol")
+        async with async_session_factory() as db:
+            await ChatSummaryService(db).set_watermarks([(chat_id, "alice", 6)])
+            await db.commit()
+        manager = FakeConnectionManager()
+        batcher = ReadReceiptBatcher(manager, async_session_factory, interval_ms=60_000)
+        batcher.update(chat_id, "alice", 4)
+        batcher.update(chat_id, "bob", 999999)
+        batcher.update(chat_id, "carol", 7, persisted=True)
+        await batcher.stop()
+        return manager.broadcasts
+
+    [(_, frame)] = asyncio.run(scenario())
+
+    assert frame["watermarks"] == {"bob": 10, "carol": 7}
+
+
+def test_unread_is_derived_from_last_seq(async_session_factory):
+    async def scenario():
+        [chat_id] = await seed_chats(async_session_factory, 1, 0, "alice", "bob")
+        async with async_session_factory() as db:
+            service = ChatService(db)
+            for i in range(4):
+                await service.send_message(chat_id, f"hi {i}", "bob")
+        before = await unread_counts(async_session_factory, "alice")
+
+        async with async_session_factory() as db:
+            await ChatService(db).mark_as_read(chat_id, "alice", seq=3)
+        after = await unread_counts(async_session_factory, "alice")
+        return before[chat_id], after[chat_id], (await unread_counts(async_session_factory, "bob"))[chat_id]
+
+    assert asyncio.run(scenario()) == (4, 1, 0)
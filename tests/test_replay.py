@@ -0,0 +1,93 @@
+import asyncio
+
+from src.api.websockets.chat import ChatWebSocket
+from src.core.replay import ReplayBuffer
+from src.models.chat import Chat
+from src.models.user import User
+from src.services.message_writer import MessageWriter
+
+from conftest import FakeWebSocket, wait_for
+
+
+def test_replay_buffer_serves_only_complete_gaps():
+    buffer = ReplayBuffer(per_chat=3, max_chats=2)
+    for seq in range(1, 6):
+        buffer.append(1, {"seq": seq})
+
+    assert [m["seq"] for m in buffer.since(1, 2, 5)] == [3, 4, 5]
+    assert [m["seq"] for m in buffer.since(1, 3, 4)] == [4]
+    # seq 2 has been rotated out, and seq 6 was never seen here
+    assert buffer.since(1, 1, 5) is None
+    assert buffer.since(1, 3, 6) is None
+
+    # A message stored elsewhere leaves a hole; the ring restarts after it
+    buffer.append(1, {"seq": 7})
+    assert buffer.since(1, 5, 7) is None
+    assert buffer.since(1, 6, 7) == [{"seq": 7}]
+
+    buffer.append(2, {"seq": 1})
+    buffer.append(3, {"seq": 1})
+    assert buffer.since(1, 6, 7) is None
+    assert (buffer.hits, buffer.misses) == (3, 4)
+
+
+def test_resume_replays_gap_from_buffer_then_database(async_session_factory):
+    async def scenario():
+        async with async_session_factory() as db:
+            alice = User(username="alice", email="alice@example.com", full_name="Alice", hashed_password="x")
+            bob = User(username="bob", email="bob@example.com", full_name="Bob", hashed_password="x")
+            eve = User(username="eve", email="eve@example.com", full_name="Eve", hashed_password="x")
+            chat = Chat(name="team", is_group=True, users=[alice, bob])
+            db.add_all([eve, chat])
+            await db.commit()
+            chat_id = chat.id
+
+        writer = MessageWriter(session_factory=async_session_factory, max_delay_ms=1)
+        chat_ws = ChatWebSocket(session_factory=async_session_factory, writer=writer)
+        sockets = {username: FakeWebSocket() for username in ("alice", "bob", "eve")}
+        try:
+            await chat_ws.connection_manager.connect(sockets["alice"], "alice")
+            await chat_ws.connection_manager.join_room("alice", chat_id)
+            for i in range(5):
+                await chat_ws.handle_new_message({"chat_id": chat_id, "content": f"m{i}"}, "alice")
+            await wait_for(lambda: len(sockets["alice"].of_type("message_ack")) == 5)
+
+            # Bob saw up to seq 2 before his connection dropped
+            await chat_ws.connection_manager.connect(sockets["bob"], "bob")
+            await chat_ws.handle_resume({"type": "resume", "chats": {str(chat_id): 2}}, "bob")
+            await chat_ws.connection_manager.connect(sockets["eve"], "eve")
+            await chat_ws.handle_resume({"type": "resume", "chats": {str(chat_id): 0}}, "eve")
+
+            # A worker that never saw the messages answers from the database
+            cold = ChatWebSocket(session_factory=async_session_factory, writer=writer)
+            cold_socket = FakeWebSocket()
+            await cold.connection_manager.connect(cold_socket, "bob")
+            await cold.handle_resume({"type": "resume", "chats": {str(chat_id): 2}}, "bob")
+            await wait_for(lambda: cold_socket.of_type("resumed") and sockets["eve"].of_type("resumed"))
+
+            return chat_id, sockets, cold_socket, chat_ws.replay, cold.replay, chat_ws.connection_manager
+        finally:
+            await writer.stop()
+
+    chat_id, sockets, cold_socket, replay, cold_replay, manager = asyncio.run(scenario())
+
+    seqs = [ack["message"]["seq"] for ack in sockets["alice"].of_type("new_message")]
+    assert seqs == [1, 2, 3, 4, 5]
+
+    [frame] = sockets["bob"].of_type("replay")
+    assert frame["chat_id"] == chat_id
+    assert frame["last_seq"] == 5
+    assert [m["seq"] for m in frame["messages"]] == [3, 4, 5]
+    assert [m["content"] for m in frame["messages"]] == ["m2", "m3", "m4"]
+    assert sockets["bob"].of_type("resumed")[0]["chats"] == {str(chat_id): 5}
+    assert (replay.hits, replay.misses) == (1, 0)
+    assert "bob" in manager.room_members[chat_id]
+
+    [cold_frame] = cold_socket.of_type("replay")
+    assert cold_frame["messages"] == frame["messages"]
+    assert (cold_replay.hits, cold_replay.misses) == (0, 1)
+
+    # Not a member: nothing replayed, room not joined
+    assert sockets["eve"].of_type("replay") == []
+    assert sockets["eve"].of_type("resumed")[0]["chats"] == {}
+    assert "eve" not in manager.room_members[chat_id]
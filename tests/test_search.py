@@ -0,0 +1,142 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import update
+
+from src.models.chat import Chat
+from src.models.message import Message
+from src.models.user import User
+from src.services.chat import ChatService
+from src.services.chat_summary import ChatSummaryService
+
+
+async def seed(session_factory):
+    async with session_factory() as db:
+        alice, bob, eve = [
+            User(username=name, email=f"{name}@example.com", full_name=name, hashed_password="x")
+            for name in ("alice", "bob", "eve")
+        ]
+        trips = Chat(name="Weekend trips", description="Hiking and camping", is_group=True, users=[alice, bob])
+        work = Chat(name="Standup", description="Daily sync", is_group=True, users=[alice, bob])
+        secret = Chat(name="Surprise party", is_group=True, users=[bob, eve])
+        db.add_all([trips, work, secret])
+        await db.flush()
+        db.add_all([
+            Message(chat_id=trips.id, seq=1, sender_user="bob", content="Meet at the café near the station"),
+            Message(chat_id=trips.id, seq=2, sender_user="alice", content="Which station? The central station?"),
+            Message(chat_id=trips.id, seq=3, sender_user="bob", content="Bring the tent"),
+            Message(chat_id=work.id, seq=1, sender_user="alice", content="Station rollout is done"),
+            Message(chat_id=work.id, seq=2, sender_user="bob", content="Stationery order placed"),
+            Message(chat_id=secret.id, seq=1, sender_user="eve", content="Don't tell alice about the station"),
+        ])
+        await db.commit()
+        await ChatSummaryService(db).rebuild()
+        await db.commit()
+        return trips.id, work.id, secret.id
+
+
+def test_search_is_ranked_scoped_to_membership_and_paginated(async_session_factory):
+    async def scenario():
+        trips_id, work_id, secret_id = await seed(async_session_factory)
+        async with async_session_factory() as db:
+            service = ChatService(db)
+            first = await service.search_messages("alice", "station", limit=2)
+            pages = [first]
+            while pages[-1].next_cursor:
+                pages.append(await service.search_messages("alice", "station", cursor=pages[-1].next_cursor, limit=2))
+            only_work = await service.search_messages("alice", "station", chat_id=work_id)
+            accents = await service.search_messages("alice", "CAFE")
+            nothing = await service.search_messages("alice", '"*(:')
+            with pytest.raises(HTTPException) as denied:
+                await service.search_messages("alice", "station", chat_id=secret_id)
+            return work_id, pages, only_work, accents, nothing, denied.value.status_code
+
+    work_id, pages, only_work, accents, nothing, denied = asyncio.run(scenario())
+
+    hits = [hit for page in pages for hit in page.results]
+    contents = [hit.message.content for hit in hits]
+    # "station" as a prefix also finds "Stationery"; eve's chat is never searched
+    assert len(contents) == len(set(contents)) == 4
+    assert "Don't tell alice about the station" not in contents
+    assert "Stationery order placed" in contents
+    assert contents[0] == "Which station? The central station?"
+    assert [hit.rank for hit in hits] == sorted(hit.rank for hit in hits)
+    assert "<mark>station</mark>" in hits[0].snippet
+    assert [len(page.results) for page in pages] == [2, 2]
+
+    assert {hit.message.chat_id for hit in only_work.results} == {work_id}
+    assert [hit.message.content for hit in accents.results] == ["Meet at the café near the station"]
+    assert nothing.results == []
+    assert denied == 403
+
+
+def test_index_follows_edits_and_backs_chat_name_search(async_session_factory):
+    async def scenario():
+        trips_id, work_id, _ = await seed(async_session_factory)
+        async with async_session_factory() as db:
+            await db.execute(
+                update(Message).where(Message.content == "Bring the tent").values(content="Bring the hammock")
+            )
+            await db.execute(update(Chat).where(Chat.id == work_id).values(description="Morning sync"))
+            await db.commit()
+
+            service = ChatService(db)
+            tent = await service.search_messages("alice", "tent")
+            hammock = await service.search_messages("alice", "hammock")
+            by_description = await service.get_user_chats(username="alice", search="camp")
+            by_new_description = await service.get_user_chats(username="alice", search="morning")
+            by_old_description = await service.get_user_chats(username="alice", search="daily")
+            not_a_member = await service.get_user_chats(username="alice", search="surprise")
+            return trips_id, work_id, tent, hammock, by_description, by_new_description, by_old_description, not_a_member
+
+    trips_id, work_id, tent, hammock, by_description, by_new, by_old, not_a_member = asyncio.run(scenario())
+
+    assert tent.results == []
+    assert [hit.message.content for hit in hammock.results] == ["Bring the hammock"]
+    assert [chat.id for chat in by_description] == [trips_id]
+    assert [chat.id for chat in by_new] == [work_id]
+    assert by_old == []
+    assert not_a_member == []
+
+
+def test_snippets_escape_message_markup(async_session_factory):
+    async def scenario():
+        trips_id, _, _ = await seed(async_session_factory)
+        async with async_session_factory() as db:
+            db.add(Message(
+                chat_id=trips_id, seq=4, sender_user="bob",
+                content='<img src=x onerror="alert(1)"> hammock \x03 & \x02more'
+            ))
+            await db.commit()
+            return await ChatService(db).search_messages("alice", "hammock")
+
+    page = asyncio.run(scenario())
+
+    assert [hit.snippet for hit in page.results] == [
+        "&lt;img src=x onerror=&quot;alert(1)&quot;&gt; <mark>hammock</mark>  &amp; <mark>more</mark>"
+    ]
+
+
+def test_search_pages_are_stable_when_messages_arrive_between_requests(async_session_factory):
+    async def scenario():
+        trips_id, _, _ = await seed(async_session_factory)
+        async with async_session_factory() as db:
+            service = ChatService(db)
+            first = await service.search_messages("alice", "station", limit=2)
+            # A better match than anything on the first page, and it changes every bm25 score
+            db.add(Message(chat_id=trips_id, seq=4, sender_user="bob", content="station station station"))
+            await db.commit()
+            pages = [first]
+            while pages[-1].next_cursor:
+                pages.append(await service.search_messages("alice", "station", cursor=pages[-1].next_cursor, limit=2))
+            fresh = await service.search_messages("alice", "station", limit=1)
+        return pages, fresh
+
+    pages, fresh = asyncio.run(scenario())
+
+    contents = [hit.message.content for page in pages for hit in page.results]
+    assert len(contents) == len(set(contents)) == 4
+    assert "station station station" not in contents
+    # A new search sees it
+    assert fresh.results[0].message.content == "station station station"
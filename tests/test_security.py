@@ -0,0 +1,53 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+from src.core.security import PasswordHasher, get_password_hash, pwd_context
+from src.models.user import User
+from src.services.auth import AuthService
+
+
+def test_password_hasher_rejects_when_saturated():
+    hasher = PasswordHasher(max_workers=1, queue_timeout=0.01)
+    existing_hash = get_password_hash("second")
+
+    async def scenario():
+        # Holds the only worker for a full bcrypt round
+        busy = asyncio.create_task(hasher.hash("first"))
+        await asyncio.sleep(0)
+        try:
+            with pytest.raises(HTTPException) as rejected:
+                await hasher.verify("second", existing_hash)
+        finally:
+            await asyncio.gather(busy, return_exceptions=True)
+        return rejected.value, await hasher.verify("first", busy.result())
+
+    try:
+        error, verified = asyncio.run(scenario())
+    finally:
+        hasher.shutdown()
+
+    assert error.status_code == 503
+    assert error.headers["Retry-After"] == "1"
+    assert hasher.rejected == 1
+    assert verified
+
+
+def test_login_rehashes_outdated_cost_factor(async_session_factory):
+    weak_hash = pwd_context.handler("bcrypt").using(rounds=4).hash("password123")
+
+    async def scenario():
+        async with async_session_factory() as db:
+            db.add(User(username="alice", email="alice@example.com", full_name="Alice", hashed_password=weak_hash))
+            await db.commit()
+            user = await AuthService.authenticate_user(db, "alice@example.com", "password123")
+            rejected = await AuthService.authenticate_user(db, "alice@example.com", "wrong")
+            return user.hashed_password, rejected
+
+    new_hash, rejected = asyncio.run(scenario())
+
+    assert rejected is None
+    assert new_hash != weak_hash
+    assert not pwd_context.needs_update(new_hash)
+    assert pwd_context.verify("password123", new_hash)